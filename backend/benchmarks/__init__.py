@@ -0,0 +1,5 @@
+"""
+Offline benchmarks: synthetic corpora, a fake LM Studio server, and a
+runner that records ingestion throughput, query latency, recall and
+memory as JSON (see benchmarks.run / benchmarks.compare).
+"""
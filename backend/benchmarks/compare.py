@@ -0,0 +1,84 @@
+# benchmarks/compare.py
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare results/old.json results/new.json --tolerance 0.1
+
+Prints every tracked metric with its relative change and exits with
+status 1 when any of them got worse by more than the tolerance.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# metric path -> True when higher is better
+METRICS = {
+    "ingest.docs_per_second": True,
+    "ingest.chunks_per_second": True,
+    "ingest.index_bytes": False,
+    "retrieval.recall@1": True,
+    "retrieval.recall@5": True,
+    "retrieval.doc_recall@5": True,
+    "retrieval.latency.p50_ms": False,
+    "retrieval.latency.p95_ms": False,
+    "warmup_seconds": False,
+    "peak_rss_mb": False,
+}
+QUERY_METRICS = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "qps": True}
+
+
+def flatten(result: Dict) -> Dict[str, Tuple[float, bool]]:
+    """
+    {metric: (value, higher is better)} for the metrics present in a result.
+    """
+    values = {}
+    for path, higher in METRICS.items():
+        node = result
+        for part in path.split("."):
+            node = node.get(part) if isinstance(node, dict) else None
+        if isinstance(node, (int, float)):
+            values[path] = (float(node), higher)
+    for level in result.get("query", []):
+        for name, higher in QUERY_METRICS.items():
+            values[f"query.c{level['concurrency']}.{name}"] = (float(level[name]), higher)
+    return values
+
+
+def compare(old: Dict, new: Dict, tolerance: float) -> List[Dict]:
+    before, after = flatten(old), flatten(new)
+    rows = []
+    for metric in before:
+        if metric not in after:
+            continue
+        (a, higher), (b, _) = before[metric], after[metric]
+        change = (b - a) / a if a else 0.0
+        worse = -change if higher else change
+        rows.append({
+            "metric": metric, "old": a, "new": b,
+            "change": change, "regression": worse > tolerance,
+        })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    old = json.loads(args.old.read_text(encoding="utf-8"))
+    new = json.loads(args.new.read_text(encoding="utf-8"))
+    print(f"{old['revision']['commit']} -> {new['revision']['commit']}")
+
+    rows = compare(old, new, args.tolerance)
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<32} {row['old']:>12.2f} {row['new']:>12.2f} {row['change']:>+8.1%}{flag}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
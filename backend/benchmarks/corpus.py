@@ -0,0 +1,142 @@
+# benchmarks/corpus.py
+"""
+Synthetic corpora and queries with known answers.
+
+Documents are written as TXT files under <data_dir>/txt, in the layout
+build_index.py reads. Words follow a Zipf distribution over a made-up
+vocabulary, and every document leans on its own topic words, so lexical
+and semantic search have something to separate. A share of documents
+can be near-copies of earlier ones (a few sentences changed, like a new
+version of a document) to exercise duplicate handling.
+
+Queries are sentences picked from the corpus with some words dropped;
+the sentence they came from is the ground truth for recall.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "ta", "vu", "sor", "pe", "dax", "li", "no", "qua", "zel", "fi", "tor", "um"]
+
+
+def make_vocabulary(size: int, rng: np.random.Generator) -> List[str]:
+    words = set()
+    while len(words) < size:
+        n = int(rng.integers(2, 5))
+        words.add("".join(rng.choice(SYLLABLES, n)))
+    return sorted(words)
+
+
+class CorpusGenerator:
+    def __init__(
+        self,
+        vocab_size: int = 20_000,
+        topic_words: int = 200,
+        topic_share: float = 0.3,
+        zipf_a: float = 1.1,
+        seed: int = 0
+    ):
+        self.rng = np.random.default_rng(seed)
+        self.vocab = np.array(make_vocabulary(vocab_size, self.rng))
+        ranks = np.arange(1, vocab_size + 1, dtype="float64")
+        self.probs = ranks ** -zipf_a
+        self.probs /= self.probs.sum()
+        self.topic_words = topic_words
+        self.topic_share = topic_share
+
+    def _sentence(self, topic: np.ndarray) -> str:
+        n = int(self.rng.integers(8, 21))
+        from_topic = self.rng.random(n) < self.topic_share
+        words = np.where(
+            from_topic,
+            self.rng.choice(topic, n),
+            self.rng.choice(self.vocab, n, p=self.probs)
+        )
+        return " ".join(words).capitalize() + "."
+
+    def document(self, n_words: int) -> List[List[str]]:
+        """
+        Paragraphs of sentences, about n_words long.
+        """
+        topic = self.rng.choice(self.vocab, self.topic_words, replace=False)
+        paragraphs, words = [], 0
+        while words < n_words:
+            paragraph = [self._sentence(topic) for _ in range(int(self.rng.integers(3, 7)))]
+            words += sum(len(s.split()) for s in paragraph)
+            paragraphs.append(paragraph)
+        return paragraphs
+
+    def near_copy(self, paragraphs: List[List[str]], edit_share: float = 0.1) -> List[List[str]]:
+        """
+        Copy with one sentence replaced in `edit_share` of the paragraphs (at least one).
+        """
+        topic = self.rng.choice(self.vocab, self.topic_words, replace=False)
+        copy = [list(p) for p in paragraphs]
+        n_edits = max(1, int(len(copy) * edit_share))
+        for i in self.rng.choice(len(copy), n_edits, replace=False):
+            paragraph = copy[int(i)]
+            paragraph[int(self.rng.integers(len(paragraph)))] = self._sentence(topic)
+        return copy
+
+
+def generate_corpus(
+    data_dir: Path,
+    n_docs: int = 200,
+    words_per_doc: int = 1500,
+    duplicate_share: float = 0.0,
+    sentences_per_doc: int = 5,
+    seed: int = 0
+) -> Dict:
+    """
+    Write n_docs TXT files and return a manifest:
+        {"docs", "words", "bytes", "samples": [{"doc_id", "sentence"}, ...]}
+    `samples` are candidate query sentences, a few per document.
+    """
+    gen = CorpusGenerator(seed=seed)
+    txt_dir = Path(data_dir) / "txt"
+    txt_dir.mkdir(parents=True, exist_ok=True)
+    (Path(data_dir) / "pdfs").mkdir(exist_ok=True)
+
+    originals: List[List[List[str]]] = []
+    samples, total_words, total_bytes = [], 0, 0
+    for i in range(n_docs):
+        if originals and gen.rng.random() < duplicate_share:
+            paragraphs = gen.near_copy(originals[int(gen.rng.integers(len(originals)))])
+        else:
+            paragraphs = gen.document(words_per_doc)
+            originals.append(paragraphs)
+
+        doc_id = f"doc{i:06d}.txt"
+        text = "\n\n".join(" ".join(p) for p in paragraphs)
+        (txt_dir / doc_id).write_text(text, encoding="utf-8")
+        total_words += len(text.split())
+        total_bytes += len(text.encode("utf-8"))
+
+        sentences = [s for p in paragraphs for s in p]
+        for j in gen.rng.choice(len(sentences), min(sentences_per_doc, len(sentences)), replace=False):
+            samples.append({"doc_id": doc_id, "sentence": sentences[int(j)]})
+
+    manifest = {"docs": n_docs, "words": total_words, "bytes": total_bytes, "samples": samples}
+    (Path(data_dir) / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    return manifest
+
+
+def make_queries(samples: List[Dict], n: int, keep: float = 0.6, seed: int = 1) -> List[Dict]:
+    """
+    n distinct queries: a sample sentence with (1 - keep) of its words dropped.
+    Each query carries the doc_id and sentence it was made from.
+    """
+    rng = np.random.default_rng(seed)
+    if n > len(samples):
+        raise ValueError(f"Corpus has {len(samples)} sample sentences, {n} queries requested")
+
+    queries = []
+    for i in rng.choice(len(samples), n, replace=False):
+        sample = samples[int(i)]
+        words = sample["sentence"].rstrip(".").split()
+        mask = rng.random(len(words)) < keep
+        mask[int(rng.integers(len(words)))] = True
+        queries.append({**sample, "query": " ".join(w for w, m in zip(words, mask) if m)})
+    return queries
@@ -0,0 +1,173 @@
+# benchmarks/fake_server.py
+"""
+Stand-in for LM Studio's OpenAI-compatible API, for offline benchmarks.
+
+    POST /v1/embeddings         hashed bag-of-words vectors (deterministic,
+                                similar texts get similar vectors)
+    POST /v1/chat/completions   canned answer, plain or streamed (SSE)
+    GET  /v1/models             the model names it answers to
+
+Latency is simulated per request and per item/token, so the benchmark can
+model a slow GPU box without one.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import numpy as np
+
+WORD_RE = re.compile(r"\w+")
+
+
+def hashed_embedding(text: str, dim: int) -> List[float]:
+    """
+    Feature-hashed word counts, L2-normalized: texts sharing words get
+    similar vectors, so retrieval quality can still be measured.
+    """
+    vector = np.zeros(dim, dtype="float32")
+    for word in WORD_RE.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "little")
+        vector[h % dim] += 1.0 if (h >> 63) else -1.0
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+
+class FakeLMServer:
+    """
+    Threaded HTTP server on 127.0.0.1 (port 0 = any free port).
+
+    embed_latency_ms     per /v1/embeddings request
+    embed_item_ms        added per input text
+    chat_latency_ms      time to first token
+    token_latency_ms     between streamed tokens (also added per token when not streaming)
+    answer_tokens        tokens in every answer
+    """
+    def __init__(
+        self,
+        port: int = 0,
+        embedding_dim: int = 256,
+        embed_latency_ms: float = 5.0,
+        embed_item_ms: float = 0.2,
+        chat_latency_ms: float = 50.0,
+        token_latency_ms: float = 5.0,
+        answer_tokens: int = 40
+    ):
+        self.embedding_dim = embedding_dim
+        self.embed_latency = embed_latency_ms / 1000.0
+        self.embed_item = embed_item_ms / 1000.0
+        self.chat_latency = chat_latency_ms / 1000.0
+        self.token_latency = token_latency_ms / 1000.0
+        self.answer_tokens = answer_tokens
+
+        self.requests: Dict[str, int] = {"embeddings": 0, "chat": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "FakeLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def _answer_tokens(self) -> List[str]:
+        return [f" token{i}" for i in range(self.answer_tokens)]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without this, Nagle +
+            # delayed ACK add ~40 ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: Dict, status: int = 200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/v1/models":
+                    self._send_json({"data": [{"id": "fake-embed"}, {"id": "fake-chat"}]})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if self.path.endswith("/embeddings"):
+                    server._count("embeddings")
+                    texts = body.get("input", [])
+                    texts = [texts] if isinstance(texts, str) else texts
+                    time.sleep(server.embed_latency + server.embed_item * len(texts))
+                    data = [
+                        {"index": i, "object": "embedding", "embedding": hashed_embedding(t, server.embedding_dim)}
+                        for i, t in enumerate(texts)
+                    ]
+                    self._send_json({"object": "list", "data": data, "model": body.get("model")})
+
+                elif self.path.endswith("/chat/completions"):
+                    server._count("chat")
+                    tokens = server._answer_tokens()
+                    time.sleep(server.chat_latency)
+                    if body.get("stream"):
+                        self._stream(tokens)
+                    else:
+                        time.sleep(server.token_latency * len(tokens))
+                        self._send_json({
+                            "choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}],
+                            "usage": {"completion_tokens": len(tokens)},
+                        })
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _stream(self, tokens: List[str]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i, token in enumerate(tokens):
+                    if i:
+                        time.sleep(server.token_latency)
+                    chunk = {"choices": [{"delta": {"content": token}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                usage = {"choices": [], "usage": {"completion_tokens": len(tokens)}}
+                self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
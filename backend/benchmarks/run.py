@@ -0,0 +1,349 @@
+# benchmarks/run.py
+"""
+Offline end-to-end benchmark.
+
+    python -m benchmarks.run --docs 200 --queries 100 --concurrency 1,8,32
+
+1. starts the fake LM Studio server (benchmarks.fake_server)
+2. writes a synthetic corpus to a scratch directory (benchmarks.corpus)
+3. builds the index with the streaming build   -> docs/s, chunks/s
+4. measures retrieval recall@k on queries with known source sentences
+5. loads the FastAPI app in-process and fires /ask at each concurrency
+   level                                        -> p50 / p95 / p99, QPS
+6. writes everything, plus peak RSS, to a JSON file named after the commit
+
+Results of two commits can be diffed with `python -m benchmarks.compare`.
+The SentenceTransformer model must already be in the local HF cache.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.corpus import generate_corpus, make_queries  # noqa: E402
+from benchmarks.fake_server import FakeLMServer  # noqa: E402
+
+RECALL_KS = (1, 3, 5)
+
+
+# -----------------------------
+# Environment
+# -----------------------------
+def git_revision() -> Dict:
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size of this process so far (None on Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def configure(work_dir: Path, server_url: str, args: argparse.Namespace):
+    """
+    Point src.utils.config at the scratch directory and the fake server.
+    Must run before anything under src/ is imported.
+    """
+    index_dir = work_dir / "index"
+    os.environ.update({
+        "INDEX_PATH": str(index_dir / "faiss.index"),
+        "METADATA_PATH": str(index_dir / "metadata.pkl"),
+        "CHUNK_STORE_PATH": str(index_dir / "chunks"),
+        "SPARSE_INDEX_PATH": str(index_dir / "bm25"),
+        "DEDUP_INDEX_PATH": str(index_dir / "dedup"),
+        "VECTOR_STORE_PATH": str(index_dir / "vectors"),
+        "EMBEDDING_CACHE_DIR": str(work_dir / "cache"),
+        "LMSTUDIO_URL": server_url,
+        "LMSTUDIO_EMBED_MODEL": "fake-embed",
+        "LLM_API_URL": f"{server_url}/v1/chat/completions",
+        "LLM_MODEL_NAME": "fake-chat",
+        "INDEX_TYPE": args.index_type,
+    })
+    if args.st_model:
+        os.environ["ST_MODEL_NAME"] = args.st_model
+
+
+def latency_stats(latencies: List[float], wall: float) -> Dict:
+    ms = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+        "qps": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+    }
+
+
+# -----------------------------
+# Phases
+# -----------------------------
+def bench_ingest(data_dir: Path, args: argparse.Namespace) -> Dict:
+    from src.embeddings.embed_hybrid import HybridEmbeddingStore
+    from src.ingestion.chunker import TokenChunker
+    from src.ingestion.loader import list_documents
+    from src.ingestion.pipeline import stream_build
+    from src.utils import config
+
+    store = HybridEmbeddingStore(
+        st_model_name=config.ST_MODEL_NAME,
+        lmstudio_url=config.LMSTUDIO_URL,
+        lmstudio_model=config.LMSTUDIO_EMBED_MODEL,
+        index_path=config.INDEX_PATH,
+        metadata_path=config.METADATA_PATH,
+        chunk_store_path=config.CHUNK_STORE_PATH,
+        sparse_index_path=config.SPARSE_INDEX_PATH,
+        dedup_index_path=config.DEDUP_INDEX_PATH,
+        vector_store_path=config.VECTOR_STORE_PATH,
+        dedup_threshold=config.DEDUP_THRESHOLD,
+        dedup_num_perm=config.DEDUP_NUM_PERM,
+        dedup_shingle=config.DEDUP_SHINGLE,
+        lmstudio_batch_size=config.LMSTUDIO_BATCH_SIZE,
+        lmstudio_max_in_flight=config.LMSTUDIO_MAX_IN_FLIGHT,
+        cache_dir=config.EMBEDDING_CACHE_DIR,
+        index_type=config.INDEX_TYPE,
+        rescore_factor=config.RESCORE_FACTOR,
+        recall_sample=0
+    )
+    chunker = None
+    if config.CHUNK_MODE == "tokens":
+        chunker = TokenChunker.for_store(store, config.CHUNK_MAX_TOKENS, config.LMSTUDIO_MAX_TOKENS)
+
+    files = list_documents(data_dir)
+    start = time.perf_counter()
+    stats = stream_build(
+        store,
+        files,
+        batch_size=config.BUILD_BATCH_SIZE,
+        checkpoint_every=config.BUILD_CHECKPOINT_EVERY,
+        train_size=config.IVF_TRAIN_SIZE,
+        resume=False,
+        extract_workers=args.extract_workers,
+        file_timeout=config.EXTRACT_FILE_TIMEOUT_SECONDS,
+        pages_per_task=config.EXTRACT_PAGES_PER_TASK,
+        chunker=chunker
+    )
+    seconds = time.perf_counter() - start
+
+    result = {
+        "docs": len(files),
+        "chunks": stats["chunks"],
+        "seconds": round(seconds, 2),
+        "docs_per_second": round(len(files) / seconds, 2),
+        "chunks_per_second": round(stats["chunks"] / seconds, 2),
+        "chunking": stats["chunking"],
+        "dedup": stats["dedup"],
+        "index_bytes": os.path.getsize(config.INDEX_PATH),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if store.lm_client is not None:
+        store.lm_client.close()
+    return result
+
+
+def bench_recall(retriever, queries: List[Dict]) -> Dict:
+    """
+    recall@k: share of queries whose source sentence is in a top-k chunk
+    (chunk level) / whose source document is among the top-k (doc level).
+    """
+    hits = {k: 0 for k in RECALL_KS}
+    doc_hits = {k: 0 for k in RECALL_KS}
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        results = retriever.retrieve(q["query"])
+        latencies.append(time.perf_counter() - start)
+
+        sentence_rank = doc_rank = None
+        for rank, r in enumerate(results):
+            docs = {r["metadata"]["doc_id"]} | {loc[0] for loc in r["metadata"].get("locations", [])}
+            if doc_rank is None and q["doc_id"] in docs:
+                doc_rank = rank
+            if sentence_rank is None and q["sentence"] in " ".join(r["text"].split()):
+                sentence_rank = rank
+        for k in RECALL_KS:
+            hits[k] += sentence_rank is not None and sentence_rank < k
+            doc_hits[k] += doc_rank is not None and doc_rank < k
+
+    n = len(queries)
+    return {
+        "queries": n,
+        **{f"recall@{k}": round(hits[k] / n, 4) for k in RECALL_KS},
+        **{f"doc_recall@{k}": round(doc_hits[k] / n, 4) for k in RECALL_KS},
+        "latency": latency_stats(latencies, sum(latencies)),
+    }
+
+
+async def bench_concurrency(app, queries: List[Dict], concurrency: int) -> Dict:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None
+    ) as client:
+        async def one(q: Dict):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/ask", json={"question": q["query"], "top_k": 3})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in queries))
+        wall = time.perf_counter() - start
+
+    return {"concurrency": concurrency, **latency_stats(latencies, wall), "errors": errors}
+
+
+async def bench_queries(api, batches: List[List[Dict]], levels: List[int]) -> List[Dict]:
+    # One event loop for every level: the app's pooled async clients are bound to it
+    results = []
+    try:
+        for batch, level in zip(batches, levels):
+            stats = await bench_concurrency(api.app, batch, level)
+            print(f"[INFO] /ask at concurrency {level}: {stats}")
+            results.append(stats)
+    finally:
+        await api.llm.aclose()
+        if api.embedding_store.lm_client is not None:
+            await api.embedding_store.lm_client.aclose()
+    return results
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline RAG benchmark against a fake LM Studio server")
+    parser.add_argument("--docs", type=int, default=200, help="synthetic documents")
+    parser.add_argument("--words-per-doc", type=int, default=1500)
+    parser.add_argument("--duplicate-share", type=float, default=0.1, help="share of near-copy documents")
+    parser.add_argument("--queries", type=int, default=100, help="/ask requests per concurrency level")
+    parser.add_argument("--recall-queries", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated levels")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--extract-workers", type=int, default=1)
+    parser.add_argument("--st-model", default=None, help="override ST_MODEL_NAME")
+    parser.add_argument("--embedding-dim", type=int, default=256, help="fake LM Studio embedding size")
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=50.0, help="fake time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=2.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="scratch directory (default: a new temp dir)")
+    parser.add_argument("--out", default=None, help="result file (default: benchmarks/results/<time>-<commit>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="rag-bench-")).resolve()
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "platform": {
+            "python": platform.python_version(),
+            "system": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "params": vars(args),
+    }
+
+    server = FakeLMServer(
+        embedding_dim=args.embedding_dim,
+        embed_latency_ms=args.embed_latency_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        token_latency_ms=args.token_latency_ms,
+        answer_tokens=args.answer_tokens
+    ).start()
+    try:
+        configure(work_dir, server.url, args)
+        # Relative paths in the app (upload dir) land in the scratch dir
+        os.chdir(work_dir)
+
+        print(f"[INFO] Writing {args.docs} documents to {work_dir / 'data'}")
+        corpus = generate_corpus(
+            work_dir / "data", args.docs, args.words_per_doc, args.duplicate_share, seed=args.seed
+        )
+        results["corpus"] = {k: corpus[k] for k in ("docs", "words", "bytes")}
+        queries = make_queries(
+            corpus["samples"], args.recall_queries + args.queries * len(levels), seed=args.seed + 1
+        )
+
+        print("[INFO] Building index")
+        results["ingest"] = bench_ingest(work_dir / "data", args)
+        print(f"[INFO] Ingest: {results['ingest']}")
+        gc.collect()
+
+        # The app loads the index we just built in its warm-up (run here, in the foreground)
+        from src.api import main as api
+        api.warmup.run()
+        if not api.warmup.ready:
+            raise RuntimeError(f"App warm-up failed: {api.warmup.error}")
+        results["warmup_seconds"] = api.warmup.seconds
+
+        results["retrieval"] = bench_recall(api.retriever, queries[:args.recall_queries])
+        print(f"[INFO] Retrieval: {results['retrieval']}")
+
+        batches = [
+            queries[args.recall_queries + i * args.queries:args.recall_queries + (i + 1) * args.queries]
+            for i in range(len(levels))
+        ]
+        results["query"] = asyncio.run(bench_queries(api, batches, levels))
+
+        results["fake_server_requests"] = dict(server.requests)
+        results["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        server.stop()
+
+    out = Path(args.out) if args.out else (
+        BACKEND_DIR / "benchmarks" / "results"
+        / f"{datetime.now():%Y%m%d-%H%M%S}-{results['revision']['commit'] or 'nogit'}.json"
+    )
+    if not out.is_absolute():
+        out = BACKEND_DIR / out
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"[INFO] Results written to {out}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,140 @@
 # build_index.py
+import argparse
+import logging
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from src.embeddings.embed_hybrid import HybridEmbeddingStore
-from src.ingestion.loader import load_documents
-from src.ingestion.chunker import chunk_documents  # <- import your chunker
-
-# 1️⃣ Load documents
-data_dir = Path("data")
-documents = load_documents(data_dir)
-print(f"Loaded {len(documents)} documents")
-
-# 2️⃣ Chunk documents
-chunked_documents = chunk_documents(documents)
-print(f"Total chunks after splitting: {len(chunked_documents)}")
-
-# 3️⃣ Initialize HYBRID embedding store
-store = HybridEmbeddingStore(
-    st_model_name="all-MiniLM-L6-v2",
-    lmstudio_url="http://127.0.0.1:1234",
-    lmstudio_model="text-embedding-nomic-embed-text-v1.5",
-    index_path="data/index/faiss.index",
-    metadata_path="data/index/metadata.pkl"
-)
-
-# 4️⃣ Build FAISS index (HYBRID)
-store.build(chunked_documents)
-print(f"Built FAISS index with {store.index.ntotal} vectors")
-print(f"Embedding dimension = {store.index.d}")
-
-# 5️⃣ Save index & metadata
-store.save()
-print("Hybrid FAISS index and metadata saved to disk")
+from src.embeddings.index_factory import INDEX_TYPES
+from src.ingestion.loader import list_documents, load_documents
+from src.ingestion.chunker import TokenChunker, chunk_documents  # <- import your chunker
+from src.ingestion.pipeline import stream_build
+from src.utils import config
+
+
+def main():
+    """
+    Entry point. Kept out of module scope so worker processes started with
+    the "spawn" method (macOS / Windows) can import this file safely.
+    """
+    parser = argparse.ArgumentParser(description="Build the hybrid FAISS index")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=config.INDEX_TYPE)
+    parser.add_argument("--nprobe", type=int, default=config.IVF_NPROBE, help="IVF lists probed per query")
+    parser.add_argument("--ef-search", type=int, default=config.HNSW_EF_SEARCH, help="HNSW search breadth")
+    parser.add_argument("--rescore-factor", type=int, default=config.RESCORE_FACTOR,
+                        help="sq8 / fp16 / ivf_pq: candidates per result rescored with float32 vectors (0 = off)")
+    parser.add_argument("--recall-sample", type=int, default=config.RECALL_SAMPLE,
+                        help="0 disables the recall report (--in-memory builds only)")
+    parser.add_argument("--batch-size", type=int, default=config.BUILD_BATCH_SIZE, help="chunks embedded per batch")
+    parser.add_argument("--checkpoint-every", type=int, default=config.BUILD_CHECKPOINT_EVERY,
+                        help="save + checkpoint after this many chunks")
+    parser.add_argument("--train-size", type=int, default=config.IVF_TRAIN_SIZE, help="IVF training sample (chunks)")
+    parser.add_argument("--extract-workers", type=int, default=config.EXTRACT_WORKERS,
+                        help="processes extracting PDF text (1 = in this process)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="load every chunk first and build in one go (old behaviour, with recall report)")
+    args = parser.parse_args()
+    # Progress, checkpoints and warnings from src/ go through logging
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    data_dir = Path("data")
+
+    # 3️⃣ Initialize HYBRID embedding store
+    store = HybridEmbeddingStore(
+        st_model_name=config.ST_MODEL_NAME,
+        lmstudio_url=config.LMSTUDIO_URL,
+        lmstudio_model=config.LMSTUDIO_EMBED_MODEL,
+        index_path=config.INDEX_PATH,
+        metadata_path=config.METADATA_PATH,
+        chunk_store_path=config.CHUNK_STORE_PATH,
+        sparse_index_path=config.SPARSE_INDEX_PATH,
+        dedup_index_path=config.DEDUP_INDEX_PATH,
+        vector_store_path=config.VECTOR_STORE_PATH,
+        dedup_threshold=config.DEDUP_THRESHOLD,
+        dedup_num_perm=config.DEDUP_NUM_PERM,
+        dedup_shingle=config.DEDUP_SHINGLE,
+        lmstudio_batch_size=config.LMSTUDIO_BATCH_SIZE,
+        lmstudio_max_in_flight=config.LMSTUDIO_MAX_IN_FLIGHT,
+        lmstudio_max_retries=config.LMSTUDIO_MAX_RETRIES,
+        lmstudio_timeout=(config.LMSTUDIO_CONNECT_TIMEOUT, config.LMSTUDIO_READ_TIMEOUT),
+        cache_dir=config.EMBEDDING_CACHE_DIR,
+        cache_max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES,
+        index_type=args.index_type,
+        index_options={
+            "hnsw_m": config.HNSW_M,
+            "hnsw_ef_construction": config.HNSW_EF_CONSTRUCTION,
+            "nlist": config.IVF_NLIST or None,
+            "pq_m": config.PQ_M,
+            "pq_nbits": config.PQ_NBITS,
+        },
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+        rescore_factor=args.rescore_factor,
+        recall_sample=args.recall_sample
+    )
+
+    # Chunks sized by the embedding models' tokenizer (CHUNK_MODE=chars: fixed windows)
+    chunker = None
+    if config.CHUNK_MODE == "tokens":
+        chunker = TokenChunker.for_store(store, config.CHUNK_MAX_TOKENS, config.LMSTUDIO_MAX_TOKENS)
+        print(f"Chunking: {chunker.describe()}")
+
+    if args.in_memory:
+        # 1️⃣ Load documents
+        documents = load_documents(data_dir, workers=args.extract_workers)
+        print(f"Loaded {len(documents)} documents")
+
+        # 2️⃣ Chunk documents
+        chunked_documents = chunk_documents(documents, chunker)
+        print(f"Total chunks after splitting: {len(chunked_documents)}")
+
+        # 4️⃣ Build FAISS index (HYBRID)
+        store.build(chunked_documents)
+    else:
+        # Pages -> chunks -> batches -> index, checkpointed (resumes after a crash)
+        files = list_documents(data_dir)
+        print(f"Found {len(files)} documents")
+        build_stats = stream_build(
+            store,
+            files,
+            batch_size=args.batch_size,
+            checkpoint_every=args.checkpoint_every,
+            train_size=args.train_size,
+            resume=not args.restart,
+            extract_workers=args.extract_workers,
+            file_timeout=config.EXTRACT_FILE_TIMEOUT_SECONDS,
+            pages_per_task=config.EXTRACT_PAGES_PER_TASK,
+            chunker=chunker
+        )
+        print(f"Streaming build: {build_stats}")
+
+    print(f"Built FAISS index with {store.index.ntotal} vectors")
+    print(f"Embedding dimension = {store.index.d}")
+    print(f"Memory per vector: {store.memory_report()}")
+    print(f"Built BM25 index over {len(store.sparse)} chunks ({len(store.sparse.vocab)} terms)")
+    if store.dedup is not None:
+        print(f"Near-duplicate chunks merged: {store.dedup.stats}")
+    if store.recall_report:
+        print(f"ANN recall vs exact search: {store.recall_report}")
+
+    if store.lm_client is not None:
+        print(f"LM Studio client stats: {store.lm_client.stats}")
+    if store.st_cache is not None:
+        print(f"Embedding cache: ST {store.st_cache.stats}, LM Studio {store.lm_cache and store.lm_cache.stats}")
+    if store.failed_chunk_ids:
+        print(
+            f"⚠️ {len(store.failed_chunk_ids)} chunks have no LM Studio embedding "
+            f"(zero-filled); re-run to retry them"
+        )
+
+    # 5️⃣ Save index, chunk store & BM25 index (streaming builds already did)
+    store.save()
+    print("Hybrid FAISS index, chunk store and BM25 index saved to disk")
+    print(f"Index manifest: {store.manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,55 @@
 # src/api/main.py
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import asyncio
+import json
 import logging
+import threading
 import time
 from fastapi.middleware.cors import CORSMiddleware
 from src.api.upload import router as upload_router
+from src.api.metrics import ServerTimingMiddleware, register_llm_gauges, register_store_gauges, router as metrics_router
+from src.api.warmup import Warmup, require_ready, router as warmup_router
 
 
 # -----------------------------
 # RAG components
 # -----------------------------
 from src.rag.rag import RAG
+from src.rag.context import ContextBuilder, TokenCounter
+from src.embeddings.chunk_store import ChunkFilter
 from src.embeddings.embed_hybrid import HybridEmbeddingStore
+from src.ingestion.extract import ExtractionPool
+from src.ingestion.jobs import IngestQueue
 from src.retrieval.retriever_hybrid import Retriever
+from src.retrieval.reranker import Reranker
 from src.llm.llm import LLM
+from src.llm.pool import LLMUnavailableError
+from src.utils import config
+from src.utils.aio import StageTimeoutError
+from src.utils.metrics import REGISTRY
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Index and models load in the background; /ready says when they are done
+    warmup.start()
+    yield
+    # Close pooled async HTTP clients on shutdown
+    ingest_queue.close()
+    extract_pool.close()
+    await llm.aclose()
+    if embedding_store.lm_client is not None:
+        await embedding_store.lm_client.aclose()
 
 # -----------------------------
 # FastAPI app (CREATE FIRST)
 # -----------------------------
-app = FastAPI(title="Hybrid RAG Chatbot")
+app = FastAPI(title="Hybrid RAG Chatbot", lifespan=lifespan)
 
 # -----------------------------
 # Middleware
@@ -30,99 +60,376 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Per-stage timings in a Server-Timing header, request latency in /metrics
+app.add_middleware(ServerTimingMiddleware)
 
 # -----------------------------
 # Logging
 # -----------------------------
 logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
+    level=config.LOG_LEVEL,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 )
+# httpx logs every request to LM Studio at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
 
 # -----------------------------
 # Request model
 # -----------------------------
+class AskFilters(BaseModel):
+    """
+    Limits retrieval to these documents / sources / pages (bounds inclusive).
+    """
+    doc_ids: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+
+
 class AskRequest(BaseModel):
     question: str
-    top_k: int = 3
+    top_k: int = Field(3, ge=1, le=config.ASK_MAX_TOP_K)
+    filters: Optional[AskFilters] = None
+
+    def chunk_filter(self) -> Optional[ChunkFilter]:
+        return to_chunk_filter(self.filters)
+
+
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    top_k: int = Field(3, ge=1, le=config.ASK_MAX_TOP_K)
+    filters: Optional[AskFilters] = None
+    # LLM calls in flight for this batch, capped at ASK_BATCH_CONCURRENCY
+    concurrency: Optional[int] = Field(None, ge=1)
+
+    def chunk_filter(self) -> Optional[ChunkFilter]:
+        return to_chunk_filter(self.filters)
+
+
+def to_chunk_filter(filters: Optional[AskFilters]) -> Optional[ChunkFilter]:
+    if filters is None:
+        return None
+    return ChunkFilter(filters.doc_ids, filters.sources, filters.page_from, filters.page_to)
 
 # -----------------------------
 # Initialize Hybrid Embeddings
 # -----------------------------
 embedding_store = HybridEmbeddingStore(
-    st_model_name="all-MiniLM-L6-v2",
-    lmstudio_url="http://127.0.0.1:1234",
-    lmstudio_model="text-embedding-nomic-embed-text-v1.5",
-    index_path="data/index/faiss.index",
-    metadata_path="data/index/metadata.pkl"
+    st_model_name=config.ST_MODEL_NAME,
+    lmstudio_url=config.LMSTUDIO_URL,
+    lmstudio_model=config.LMSTUDIO_EMBED_MODEL,
+    index_path=config.INDEX_PATH,
+    metadata_path=config.METADATA_PATH,
+    chunk_store_path=config.CHUNK_STORE_PATH,
+    sparse_index_path=config.SPARSE_INDEX_PATH,
+    dedup_index_path=config.DEDUP_INDEX_PATH,
+    vector_store_path=config.VECTOR_STORE_PATH,
+    dedup_threshold=config.DEDUP_THRESHOLD,
+    dedup_num_perm=config.DEDUP_NUM_PERM,
+    dedup_shingle=config.DEDUP_SHINGLE,
+    lmstudio_batch_size=config.LMSTUDIO_BATCH_SIZE,
+    lmstudio_max_in_flight=config.LMSTUDIO_MAX_IN_FLIGHT,
+    lmstudio_max_retries=config.LMSTUDIO_MAX_RETRIES,
+    lmstudio_timeout=(config.LMSTUDIO_CONNECT_TIMEOUT, config.LMSTUDIO_READ_TIMEOUT),
+    cache_dir=config.EMBEDDING_CACHE_DIR,
+    cache_max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES,
+    index_type=config.INDEX_TYPE,
+    rescore_factor=config.RESCORE_FACTOR,
+    filter_exact_max=config.FILTER_EXACT_MAX,
+    verify_checksums=config.INDEX_VERIFY_CHECKSUMS,
+    read_only=config.INDEX_READ_ONLY,
+    st_service=config.EMBED_SERVICE or None,
+    st_service_timeout=config.EMBED_SERVICE_TIMEOUT_SECONDS
+)
+
+llm = LLM(
+    api_url=config.LLM_API_URL,
+    model_name=config.LLM_MODEL_NAME,
+    timeout=config.LLM_TIMEOUT_SECONDS,
+    max_connections=config.LLM_MAX_CONNECTIONS,
+    api_urls=config.LLM_API_URLS,
+    hedge_percentile=config.LLM_HEDGE_PERCENTILE,
+    hedge_min_samples=config.LLM_HEDGE_MIN_SAMPLES,
+    breaker_failures=config.LLM_BREAKER_FAILURES,
+    breaker_cooldown=config.LLM_BREAKER_COOLDOWN_SECONDS
 )
+register_llm_gauges(llm)
 
 # -----------------------------
-# Load or fail fast
+# Warm-up (index, models, retriever + RAG)
 # -----------------------------
-try:
-    embedding_store.load()
-    print("✅ Hybrid FAISS index loaded")
-except FileNotFoundError:
-    raise RuntimeError(
-        "Hybrid FAISS index not found.\n"
-        "👉 Run ingestion first to build hybrid embeddings."
+# Built by warm_up(); routes that use them wait for /ready
+retriever: Retriever = None
+reranker: Reranker = None
+rag: RAG = None
+
+
+def warm_up():
+    """
+    Load the index (checked against its manifest) and the models, then
+    build the pipeline. Runs once, in a background thread; nothing here
+    calls LM Studio.
+    """
+    global retriever, reranker, rag
+    try:
+        embedding_store.load()
+    except FileNotFoundError:
+        raise RuntimeError(
+            "Hybrid FAISS index not found.\n"
+            "👉 Run ingestion first to build hybrid embeddings."
+        )
+    logger.info("Hybrid FAISS index loaded (%d vectors)", embedding_store.index.ntotal)
+
+    # 🔐 DIMENSION SAFETY CHECK (loads the ST model)
+    embedding_store.check_models()
+    logger.info("Hybrid embedding dimension OK (%d)", embedding_store.index.d)
+
+    # With a reranker the retriever over-fetches candidates for it to choose from
+    new_retriever = Retriever(
+        embedding_store,
+        top_k=config.RERANK_CANDIDATES if config.RERANK_MODEL else 5,
+        cache_size=config.QUERY_CACHE_SIZE,
+        cache_ttl=config.QUERY_CACHE_TTL_SECONDS,
+        cpu_workers=config.CPU_WORKERS,
+        embed_timeout=config.EMBED_TIMEOUT_SECONDS,
+        search_timeout=config.SEARCH_TIMEOUT_SECONDS,
+        batch_max_size=config.RETRIEVAL_BATCH_MAX_SIZE,
+        batch_max_wait_ms=config.RETRIEVAL_BATCH_MAX_WAIT_MS,
+        fusion=config.RETRIEVAL_FUSION,
+        fusion_candidates=config.FUSION_CANDIDATES,
+        rrf_k=config.RRF_K,
+        sparse_weight=config.SPARSE_WEIGHT
     )
+    new_retriever.warm_up()
 
-# -----------------------------
-# 🔐 DIMENSION SAFETY CHECK
-# -----------------------------
-dummy = embedding_store.embed_texts(["dimension check"])
-faiss_dim = embedding_store.index.d
-embed_dim = dummy.shape[1]
+    new_reranker = None
+    if config.RERANK_MODEL:
+        new_reranker = Reranker(
+            config.RERANK_MODEL,
+            batch_size=config.RERANK_BATCH_SIZE,
+            cache_size=config.RERANK_CACHE_SIZE,
+            cache_ttl=config.QUERY_CACHE_TTL_SECONDS
+        )
+        new_reranker.model.predict([("warm-up", "warm-up")])
+
+    context_builder = ContextBuilder(
+        TokenCounter(config.LLM_TOKENIZER),
+        max_tokens=config.CONTEXT_MAX_TOKENS,
+        mmr_lambda=config.CONTEXT_MMR_LAMBDA,
+        candidates=config.CONTEXT_CANDIDATES
+    )
 
-if faiss_dim != embed_dim:
-    raise RuntimeError(
-        f"Embedding dimension mismatch:\n"
-        f"  FAISS dim: {faiss_dim}\n"
-        f"  Embed dim: {embed_dim}\n"
-        f"Delete index and rebuild."
+    retriever, reranker = new_retriever, new_reranker
+    rag = RAG(
+        retriever,
+        llm,
+        cache_size=config.QUERY_CACHE_SIZE,
+        cache_ttl=config.QUERY_CACHE_TTL_SECONDS,
+        llm_timeout=config.LLM_TIMEOUT_SECONDS,
+        reranker=reranker,
+        rerank_budget=config.RERANK_BUDGET_SECONDS,
+        context_builder=context_builder
     )
 
-print(f"✅ Hybrid embedding dimension OK ({faiss_dim})")
+    if embedding_store.read_only and config.INDEX_RELOAD_SECONDS > 0:
+        threading.Thread(target=watch_index, name="index-reload", daemon=True).start()
+
+
+def watch_index():
+    """
+    Read-only workers: reload the index whenever a writer has saved a new one.
+    """
+    while True:
+        time.sleep(config.INDEX_RELOAD_SECONDS)
+        try:
+            embedding_store.reload_if_changed()
+        except Exception as e:
+            logger.warning("Index reload failed, still serving the previous index: %s", e)
+
+
+warmup = Warmup(warm_up)
+app.state.warmup = warmup
+REGISTRY.gauge("rag_ready", "1 once the index and models are loaded", lambda: int(warmup.ready))
+
+# Shared with routers (e.g. /upload adds to the live index)
+app.state.embedding_store = embedding_store
+register_store_gauges(embedding_store)
+
+# One set of extraction processes (spawn / forkserver) for every upload,
+# started on first use and stopped on shutdown
+extract_pool = ExtractionPool(config.EXTRACT_WORKERS)
+
+# Uploads are ingested in the background, several per index commit
+ingest_queue = IngestQueue(
+    embedding_store,
+    workers=config.UPLOAD_WORKERS,
+    max_pending=config.UPLOAD_MAX_PENDING,
+    coalesce_max_jobs=config.UPLOAD_COALESCE_MAX_JOBS,
+    coalesce_wait=config.UPLOAD_COALESCE_WAIT_MS / 1000.0,
+    job_ttl=config.UPLOAD_JOB_TTL_SECONDS,
+    extract_pool=extract_pool
+)
+app.state.ingest_queue = ingest_queue
+REGISTRY.gauge("rag_upload_jobs", "Upload ingestion jobs by status", ingest_queue.counts, ["status"])
 
 # -----------------------------
-# Retriever + LLM
+# Client disconnects
 # -----------------------------
-retriever = Retriever(embedding_store, top_k=5)
+class ClientDisconnected(Exception):
+    pass
 
-llm = LLM(
-    api_url="http://127.0.0.1:1234/v1/chat/completions",
-    model_name="mistral-3-3b"
-)
 
-rag = RAG(retriever, llm)
+async def run_until_disconnect(http_request: Request, coro, poll_interval: float = 0.1):
+    """
+    Await `coro`, cancelling it as soon as the client goes away so we stop
+    spending embedding / LLM time on an answer nobody will read.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
 
 # -----------------------------
 # API
 # -----------------------------
-@app.post("/ask")
-def ask_question(request: AskRequest):
+@app.post("/ask", dependencies=[Depends(require_ready)])
+async def ask_question(request: AskRequest, http_request: Request):
     start = time.time()
     try:
-        response = rag.ask(request.question, top_k=request.top_k)
+        response = await run_until_disconnect(
+            http_request,
+            rag.aask(request.question, top_k=request.top_k, chunk_filter=request.chunk_filter())
+        )
         latency = time.time() - start
 
         return {
             "question": request.question,
             "answer": response["answer"],
             "sources": response["sources"],
+            "context": response["context"],
             "latency_seconds": round(latency, 2)
         }
 
+    except ClientDisconnected:
+        logger.info("Client disconnected, /ask cancelled")
+        return Response(status_code=499)
+
+    except StageTimeoutError as e:
+        logger.warning("RAG timeout: %s", e)
+        raise HTTPException(status_code=504, detail=str(e))
+
+    except LLMUnavailableError as e:
+        logger.warning("RAG failure: %s", e)
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(int(config.LLM_BREAKER_COOLDOWN_SECONDS))}
+        )
+
     except Exception as e:
-        logging.exception("RAG failure")
+        logger.exception("RAG failure")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask/stream", dependencies=[Depends(require_ready)])
+async def ask_question_stream(request: AskRequest):
+    """
+    Server-sent events: `sources` as soon as retrieval is done, one `token`
+    event per LLM delta, then `done` with ttft / tokens per second and
+    the context stats.
+    Starlette cancels the generator when the client disconnects.
+    """
+    async def events():
+        try:
+            stream = rag.astream_ask(request.question, top_k=request.top_k, chunk_filter=request.chunk_filter())
+            async for event, data in stream:
+                yield sse_event(event, data)
+        except StageTimeoutError as e:
+            logger.warning("RAG stream timeout: %s", e)
+            yield sse_event("error", {"status": 504, "detail": str(e)})
+        except LLMUnavailableError as e:
+            logger.warning("RAG stream failure: %s", e)
+            yield sse_event("error", {"status": 503, "detail": str(e)})
+        except Exception as e:
+            logger.exception("RAG stream failure")
+            yield sse_event("error", {"status": 500, "detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/ask/batch", dependencies=[Depends(require_ready)])
+async def ask_batch(request: AskBatchRequest):
+    """
+    Many questions in one call, answered as newline-delimited JSON: one line
+    per question as soon as it is done ("index" is its position in
+    `questions`; a failed question has "error" instead of "answer"), then
+    {"done": {...}} with totals.
+    """
+    if not request.questions or len(request.questions) > config.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"questions must hold 1 to {config.ASK_BATCH_MAX_QUESTIONS} entries"
+        )
+    concurrency = min(request.concurrency or config.ASK_BATCH_CONCURRENCY, config.ASK_BATCH_CONCURRENCY)
+
+    async def lines():
+        start = time.perf_counter()
+        errors = 0
+        results = rag.aask_many(
+            request.questions,
+            top_k=request.top_k,
+            chunk_filter=request.chunk_filter(),
+            concurrency=concurrency,
+            batch_size=config.ASK_BATCH_RETRIEVAL_SIZE
+        )
+        try:
+            async for result in results:
+                errors += "error" in result
+                yield json.dumps(result) + "\n"
+        finally:
+            await results.aclose()
+        yield json.dumps({"done": {
+            "questions": len(request.questions),
+            "errors": errors,
+            "seconds": round(time.perf_counter() - start, 2),
+        }}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
 app.include_router(upload_router)
+app.include_router(metrics_router)
+app.include_router(warmup_router)
 
 
 @app.get("/health")
 def health():
+    # Liveness: a failed warm-up won't recover without a restart
+    if warmup.status == "failed":
+        return Response(status_code=503)
     return {"status": "ok"}
+
+
+@app.get("/cache/stats", dependencies=[Depends(require_ready)])
+def cache_stats():
+    return rag.cache_stats()
+
+
+@app.get("/llm/stats")
+def llm_stats():
+    return llm.stats()
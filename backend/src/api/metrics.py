@@ -0,0 +1,107 @@
+# src/api/metrics.py
+"""
+GET /metrics in the Prometheus text format, and the middleware that times
+every request and returns its stages in a Server-Timing header.
+
+Streaming responses send their headers before retrieval has run, so their
+Server-Timing only has what happened before the first byte; their stages
+still land in the rag_stage_seconds histogram.
+"""
+import time
+
+from fastapi import APIRouter, Response
+from starlette.datastructures import MutableHeaders
+
+from src.embeddings.embed_hybrid import HybridEmbeddingStore
+from src.llm.llm import LLM
+from src.utils.metrics import (
+    CONTENT_TYPE,
+    REGISTRY,
+    REQUEST_SECONDS,
+    REQUESTS_TOTAL,
+    begin_timings,
+    end_timings,
+    server_timing,
+)
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware (no response buffering, so SSE is unaffected).
+    Requests are labelled by route template, never by raw path, to keep
+    the number of series bounded.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings, token = begin_timings()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(timings, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            labels = {"path": route, "method": scope["method"], "status": str(status)}
+            REQUEST_SECONDS.observe(time.perf_counter() - start, **labels)
+            REQUESTS_TOTAL.inc(**labels)
+            end_timings(token)
+
+
+def register_store_gauges(store: HybridEmbeddingStore):
+    """
+    Index size gauges, read from the live store at scrape time.
+    """
+    REGISTRY.gauge(
+        "rag_index_vectors", "Vectors in the FAISS index (deleted HNSW vectors included)",
+        lambda: store.index.ntotal if store.index is not None else None
+    )
+    REGISTRY.gauge("rag_index_chunks", "Live chunks in the chunk store", lambda: len(store.chunks))
+    REGISTRY.gauge(
+        "rag_index_tombstones", "Deleted vectors still in the HNSW graph", lambda: store.tombstones
+    )
+    REGISTRY.gauge(
+        "rag_index_bytes", "Index size on disk per component",
+        lambda: {(component,): size for component, size in store.nbytes_on_disk().items()},
+        ["component"]
+    )
+    REGISTRY.gauge(
+        "rag_index_bytes_per_vector", "Approximate RAM per vector of the FAISS index",
+        lambda: store.memory_report()["bytes_per_vector"] if store.index is not None else None
+    )
+    REGISTRY.gauge("rag_index_version", "Increments on every index change", lambda: store.version)
+
+
+def register_llm_gauges(llm: LLM):
+    """
+    Per-backend gauges of the LLM pool (latency / errors are in
+    rag_llm_backend_seconds and rag_llm_backend_requests_total).
+    """
+    REGISTRY.gauge(
+        "rag_llm_backend_outstanding", "LLM requests in flight per backend",
+        lambda: llm.pool.gauges()["outstanding"], ["backend"]
+    )
+    REGISTRY.gauge(
+        "rag_llm_backend_up", "0 while a backend is ejected by its circuit breaker",
+        lambda: llm.pool.gauges()["up"], ["backend"]
+    )
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
-import shutil
 import uuid
 
-from src.ingestion.ingest import ingest_file
+from src.api.warmup import require_ready
+from src.embeddings.embed_hybrid import ReadOnlyIndexError
+from src.ingestion.jobs import QueueFullError
+from src.utils import config
 
 router = APIRouter()
 
@@ -11,19 +14,63 @@ UPLOAD_DIR = Path("data/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 
-@router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    file_id = str(uuid.uuid4())
-    file_path = UPLOAD_DIR / f"{file_id}_{file.filename}"
+async def save_upload(file: UploadFile, file_path: Path, chunk_size: int = 1 << 20) -> int:
+    """
+    Copy the upload to disk `chunk_size` bytes at a time, each read and
+    write off the event loop. Returns the number of bytes written; on any
+    failure (client gone, read error, disk full) the partial file is removed.
+    """
+    size = 0
+    buffer = await run_in_threadpool(open, file_path, "wb")
+    try:
+        try:
+            while True:
+                data = await file.read(chunk_size)
+                if not data:
+                    break
+                await run_in_threadpool(buffer.write, data)
+                size += len(data)
+        finally:
+            await run_in_threadpool(buffer.close)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+    return size
 
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
 
-    # 🔥 Ingest immediately
-    ingest_file(file_path)
+@router.post("/upload", status_code=202, dependencies=[Depends(require_ready)])
+async def upload_file(request: Request, file: UploadFile = File(...)):
+    """
+    Save the file and queue it for ingestion; poll GET /upload/{job_id}
+    for progress. Re-uploads replace the old version of the document.
+    """
+    if request.app.state.embedding_store.read_only:
+        raise HTTPException(status_code=409, detail=str(ReadOnlyIndexError("Index is read-only on this server")))
+
+    filename = Path(file.filename).name
+    file_path = UPLOAD_DIR / f"{uuid.uuid4()}_{filename}"
+    size = await save_upload(file, file_path, config.UPLOAD_CHUNK_BYTES)
+
+    try:
+        job = request.app.state.ingest_queue.submit(file_path, doc_id=filename, size=size)
+    except QueueFullError as e:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
 
     return {
-        "status": "success",
-        "filename": file.filename,
-        "chunks_added": "ok"
+        "status": job.status,
+        "job_id": job.id,
+        "filename": filename,
+        "status_url": f"/upload/{job.id}"
     }
+
+
+@router.get("/upload/{job_id}")
+def upload_status(request: Request, job_id: str):
+    """
+    Progress of an upload: status, pages extracted, chunks, vectors added.
+    """
+    job = request.app.state.ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown upload job {job_id}")
+    return job.as_dict()
@@ -0,0 +1,89 @@
+# src/api/warmup.py
+"""
+Background warm-up and the readiness probe.
+
+The app starts serving /health right away; loading the index and models
+runs once in a background thread. GET /ready answers 200 only when that
+finished, so an orchestrator routes traffic to a pod only once it can
+answer, while /health (liveness) stays cheap.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class Warmup:
+    """
+    Runs `load` once. status: pending -> loading -> ready | failed.
+    """
+    def __init__(self, load: Callable[[], None]):
+        self.load = load
+        self.status = "pending"
+        self.error = None
+        self.seconds = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def start(self):
+        """
+        Run in a daemon thread (no-op if already started).
+        """
+        with self._lock:
+            if self._thread is not None or self._done.is_set():
+                return
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def run(self):
+        """
+        Run in the calling thread; scripts and tests use this directly.
+        """
+        if self._done.is_set():
+            return
+        start = time.perf_counter()
+        self.status = "loading"
+        try:
+            self.load()
+            self.status = "ready"
+        except Exception as e:
+            logger.exception("Warm-up failed")
+            self.error = f"{type(e).__name__}: {e}"
+            self.status = "failed"
+        finally:
+            self.seconds = round(time.perf_counter() - start, 3)
+            self._done.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        self._done.wait(timeout)
+        return self.ready
+
+    def describe(self) -> Dict:
+        return {"status": self.status, "seconds": self.seconds, "error": self.error}
+
+
+def require_ready(request: Request):
+    """
+    Dependency for routes that need the index and models: 503 until warm.
+    """
+    warmup = getattr(request.app.state, "warmup", None)
+    if warmup is not None and not warmup.ready:
+        raise HTTPException(status_code=503, detail=warmup.describe(), headers={"Retry-After": "5"})
+
+
+@router.get("/ready")
+def ready(request: Request):
+    warmup = request.app.state.warmup
+    return JSONResponse(warmup.describe(), status_code=200 if warmup.ready else 503)
@@ -0,0 +1,218 @@
+# src/embeddings/cache.py
+import hashlib
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from src.utils.fileio import atomic_write
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 16
+INITIAL_CAPACITY = 1024
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed embedding cache for one model.
+
+    Layout in <cache_dir>/<model name>/:
+        vectors.f32   memory-mapped float32 matrix (capacity x dim)
+        keys.bin      memory-mapped text hash per row (capacity x 16 bytes)
+        last_used.npy LRU clock per row
+        meta.json     dim / capacity / used rows
+
+    Lookups are keyed by blake2b(text), so unchanged chunks are never
+    re-embedded. Once `max_entries` rows are used, the least recently used
+    rows are overwritten. Each row stores its own key, so a crash between
+    writing a row and saving meta.json can never return the wrong vector.
+    """
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 1_000_000):
+        safe_name = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+        self.dir = Path(cache_dir) / safe_name
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+
+        self.lock = threading.Lock()
+        self.dim = None
+        self.capacity = 0
+        self.used = 0
+        self.clock = 0
+        self.vectors = None
+        self.keys = None
+        self.last_used = np.zeros(0, dtype="int64")
+        self.rows = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        self._load()
+
+    # -----------------------------
+    # Files
+    # -----------------------------
+    @property
+    def _meta_path(self) -> Path:
+        return self.dir / "meta.json"
+
+    def _open_maps(self, mode: str):
+        self.vectors = np.memmap(
+            self.dir / "vectors.f32", dtype="float32", mode=mode, shape=(self.capacity, self.dim)
+        )
+        self.keys = np.memmap(
+            self.dir / "keys.bin", dtype="uint8", mode=mode, shape=(self.capacity, KEY_BYTES)
+        )
+
+    def _load(self):
+        if not self._meta_path.exists():
+            return
+
+        meta = json.loads(self._meta_path.read_text())
+        self.dim = meta["dim"]
+        self.capacity = meta["capacity"]
+        self.used = meta["used"]
+        self.clock = meta.get("clock", 0)
+        self._open_maps("r+")
+
+        last_used_path = self.dir / "last_used.npy"
+        self.last_used = np.zeros(self.capacity, dtype="int64")
+        if last_used_path.exists():
+            saved = np.load(last_used_path)
+            self.last_used[:len(saved)] = saved[:self.capacity]
+
+        raw = np.asarray(self.keys[:self.used]).tobytes()
+        self.rows = {
+            raw[row * KEY_BYTES:(row + 1) * KEY_BYTES]: row for row in range(self.used)
+        }
+
+    def _grow(self, needed: int):
+        new_capacity = max(self.capacity, INITIAL_CAPACITY)
+        while new_capacity < needed:
+            new_capacity *= 2
+        new_capacity = min(new_capacity, self.max_entries)
+        if new_capacity <= self.capacity:
+            return
+
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.keys.flush()
+            del self.vectors, self.keys
+
+        # Extending the files keeps existing rows in place
+        for name, row_bytes in (("vectors.f32", self.dim * 4), ("keys.bin", KEY_BYTES)):
+            with open(self.dir / name, "ab") as f:
+                f.truncate(new_capacity * row_bytes)
+
+        self.last_used = np.concatenate(
+            [self.last_used, np.zeros(new_capacity - self.capacity, dtype="int64")]
+        )
+        self.capacity = new_capacity
+        self._open_maps("r+")
+
+    # -----------------------------
+    # Lookup / insert
+    # -----------------------------
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Returns (embeddings, missing): rows for cached texts are filled,
+        `missing` lists the positions that still need to be computed.
+        Embeddings is None if the cache is empty.
+        """
+        hashes = [text_hash(t) for t in texts]
+
+        with self.lock:
+            if self.dim is None:
+                self.misses += len(texts)
+                return None, list(range(len(texts)))
+
+            out = np.zeros((len(texts), self.dim), dtype="float32")
+            missing, found, rows = [], [], []
+            for i, h in enumerate(hashes):
+                row = self.rows.get(h)
+                if row is None or bytes(self.keys[row]) != h:
+                    missing.append(i)
+                else:
+                    found.append(i)
+                    rows.append(row)
+
+            if rows:
+                self.clock += 1
+                out[found] = self.vectors[rows]
+                self.last_used[rows] = self.clock
+
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            return out, missing
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        if len(texts) == 0:
+            return
+        embeddings = np.asarray(embeddings, dtype="float32")
+
+        with self.lock:
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Cache dim {self.dim} != embedding dim {embeddings.shape[1]}")
+
+            self.clock += 1
+            new = [(text_hash(t), e) for t, e in zip(texts, embeddings)]
+            new = [(h, e) for h, e in dict(new).items() if h not in self.rows]
+            # Never insert more than the cache can hold
+            new = new[-self.max_entries:]
+            if not new:
+                return
+
+            self._grow(self.used + len(new))
+            rows = self._allocate_rows(len(new))
+
+            for (h, emb), row in zip(new, rows):
+                old_key = bytes(self.keys[row])
+                if self.rows.get(old_key) == row:
+                    del self.rows[old_key]
+                self.vectors[row] = emb
+                self.keys[row] = np.frombuffer(h, dtype="uint8")
+                self.last_used[row] = self.clock
+                self.rows[h] = row
+
+    def _allocate_rows(self, n: int) -> List[int]:
+        free = min(n, self.capacity - self.used)
+        rows = list(range(self.used, self.used + free))
+        self.used += free
+        # Claim fresh rows first so they are not picked for eviction below
+        self.last_used[rows] = self.clock
+
+        if len(rows) < n:
+            # Full: evict the least recently used rows
+            evict = n - len(rows)
+            lru = np.argpartition(self.last_used[:self.used], evict - 1)[:evict]
+            rows.extend(int(r) for r in lru)
+            logger.info("Embedding cache %s full, evicted %d rows", self.dir.name, evict)
+        return rows[:n]
+
+    def flush(self):
+        with self.lock:
+            if self.vectors is None:
+                return
+            self.vectors.flush()
+            self.keys.flush()
+            atomic_write(self.dir / "last_used.npy", self._write_last_used)
+            meta = {"dim": self.dim, "capacity": self.capacity, "used": self.used, "clock": self.clock}
+            atomic_write(self._meta_path, lambda p: p.write_text(json.dumps(meta)))
+
+    def _write_last_used(self, path: Path):
+        with open(path, "wb") as f:
+            np.save(f, self.last_used)
+
+    @property
+    def stats(self) -> dict:
+        return {"entries": len(self.rows), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,629 @@
+# src/embeddings/chunk_store.py
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.embeddings.sorted_runs import SortedRuns
+from src.utils.fileio import append_file, atomic_write, dir_nbytes, swap_dir
+
+# Metadata keys stored in dedicated columns; anything else goes to `extra`
+CORE_FIELDS = ("doc_id", "page", "source", "chunk_id")
+
+# name -> dtype of the fixed-width per-row columns
+COLUMNS = {
+    "keys": "int64",    # FAISS chunk key (see embed_hybrid.chunk_key)
+    "doc": "int32",     # index into tables.json "docs"
+    "page": "int32",    # -1 when the chunk has no page (TXT)
+    "source": "int16",  # index into tables.json "sources"
+    "live": "uint8",    # 0 once the chunk is deleted
+}
+
+# name -> (offsets column, blob file) for variable-width UTF-8 columns
+BLOBS = {
+    "text": ("text_off", "text.bin"),
+    "chunk_id": ("cid_off", "cid.bin"),
+    "extra": ("extra_off", "extra.bin"),  # JSON of non-core metadata, "" if none
+}
+
+# Locations table: one row per near-duplicate merged into an indexed chunk
+LOCATION_COLUMNS = {
+    "loc_keys": "int64",    # key of the chunk that stands for the duplicate
+    "loc_doc": "int32",     # the duplicate's doc, page, source (codes as above)
+    "loc_page": "int32",
+    "loc_source": "int16",
+    "loc_live": "uint8",    # 0 once the location is dropped
+}
+LOCATION_BLOBS = {
+    "loc_chunk_id": ("loc_cid_off", "loc_cid.bin"),  # the duplicate's own chunk_id
+}
+
+
+class ChunkFilter:
+    """
+    Restricts a search to chunks of the given doc_ids and sources whose page
+    lies in [page_from, page_to] (bounds inclusive). None leaves a field
+    unconstrained; a page bound excludes chunks without a page. A chunk
+    standing for merged near-duplicates matches if any of its locations
+    does. Hashable, so resolved filters and filtered results can be cached
+    on it.
+    """
+    def __init__(
+        self,
+        doc_ids: List[str] = None,
+        sources: List[str] = None,
+        page_from: int = None,
+        page_to: int = None
+    ):
+        self.doc_ids = tuple(sorted(set(doc_ids))) if doc_ids is not None else None
+        self.sources = tuple(sorted(set(sources))) if sources is not None else None
+        self.page_from = page_from
+        self.page_to = page_to
+
+    @property
+    def pages(self) -> bool:
+        return self.page_from is not None or self.page_to is not None
+
+    def is_empty(self) -> bool:
+        return self.doc_ids is None and self.sources is None and not self.pages
+
+    def matches(self, meta: Dict) -> bool:
+        if self.doc_ids is not None and meta["doc_id"] not in self.doc_ids:
+            return False
+        if self.sources is not None and (meta.get("source") or "") not in self.sources:
+            return False
+        if self.pages:
+            page = meta.get("page")
+            if page is None:
+                return False
+            if self.page_from is not None and page < self.page_from:
+                return False
+            if self.page_to is not None and page > self.page_to:
+                return False
+        return True
+
+    def _key(self) -> Tuple:
+        return self.doc_ids, self.sources, self.page_from, self.page_to
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ChunkFilter) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return "ChunkFilter(doc_ids={}, sources={}, page_from={}, page_to={})".format(*self._key())
+
+
+class ChunkStore:
+    """
+    Columnar, memory-mapped store for chunk text + metadata.
+
+    Every chunk is a row. Fixed-width fields (key, doc, page, source, live)
+    are packed arrays, text / chunk_id / extra metadata are UTF-8 blobs
+    addressed by int64 offsets. Rows are looked up by FAISS key through
+    sorted key -> row runs (see SortedRuns), and only the rows that are
+    actually asked for are decoded, so opening the store costs a few mmap() calls no matter
+    how big the corpus is.
+
+    Near-duplicates merged into a chunk (see HybridEmbeddingStore.dedupe)
+    are rows of a separate locations table (doc, page, source, chunk_id of
+    the duplicate, plus the key of the chunk standing for it), so merging
+    one never rewrites the chunk's row. get() lists them under "locations".
+
+    The store is append-only on disk: save() appends new rows, flips the
+    live flag of deleted ones and commits by rewriting the small meta.json.
+    Bytes past the committed lengths (an interrupted save) are ignored.
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._reset_state()
+
+    def _reset_state(self):
+        self.rows = 0
+        self.live_rows = 0
+        self.loc_rows = 0
+        self.blob_sizes = {name: 0 for name in {**BLOBS, **LOCATION_BLOBS}}
+        self.docs: List[str] = []
+        self.sources: List[str] = []
+        self._doc_index: Dict[str, int] = {}
+        self._source_index: Dict[str, int] = {}
+        self._maps: Dict[str, np.ndarray] = {}
+        self._key_runs = SortedRuns("key_run", "int64")
+        # column -> (rows sorted by that column, the sorted values); see _postings
+        self._inverted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+        # Changes not yet on disk
+        self._pending: List[Tuple[int, Dict]] = []
+        self._pending_rows: Dict[int, int] = {}  # key -> position in _pending
+        self._deleted_rows: set = set()
+        self._pending_locs: Dict[int, List[Dict]] = {}  # key -> locations added since the last save
+        self._deleted_locs: set = set()
+        self._rewrite = False
+
+    # -----------------------------
+    # Files
+    # -----------------------------
+    def exists(self) -> bool:
+        return (self.path / "meta.json").exists()
+
+    def _file(self, name: str, base: Path = None) -> Path:
+        base = base or self.path
+        return base / (name if "." in name else f"{name}.bin")
+
+    def _map(self, name: str, dtype: str, length: int) -> np.ndarray:
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", shape=(length,))
+
+    def open(self):
+        """
+        Memory-map a saved store. Nothing is read until rows are requested.
+        """
+        meta = json.loads((self.path / "meta.json").read_text())
+        tables = json.loads((self.path / "tables.json").read_text())
+
+        self._reset_state()
+        self.rows = meta["rows"]
+        self.live_rows = meta["live_rows"]
+        self.loc_rows = meta.get("loc_rows", 0)
+        self.blob_sizes.update(meta["blob_sizes"])
+        self.docs = tables["docs"]
+        self.sources = tables["sources"]
+        self._doc_index = {d: i for i, d in enumerate(self.docs)}
+        self._source_index = {s: i for i, s in enumerate(self.sources)}
+        legacy = SortedRuns.legacy_state("sorted_keys.bin", "sorted_rows.bin", self.live_rows)
+        self._key_runs.open(self.path, meta.get("key_runs") or legacy)
+        self._open_maps()
+
+    def _open_maps(self):
+        self._maps = {name: self._map(name, dtype, self.rows) for name, dtype in COLUMNS.items()}
+        for name, (offsets, blob) in BLOBS.items():
+            self._maps[offsets] = self._map(offsets, "int64", self.rows + 1 if self.rows else 0)
+            self._maps[blob] = self._map(blob, "uint8", self.blob_sizes[name])
+        for name, dtype in LOCATION_COLUMNS.items():
+            self._maps[name] = self._map(name, dtype, self.loc_rows)
+        for name, (offsets, blob) in LOCATION_BLOBS.items():
+            self._maps[offsets] = self._map(offsets, "int64", self.loc_rows + 1 if self.loc_rows else 0)
+            self._maps[blob] = self._map(blob, "uint8", self.blob_sizes[name])
+        self._inverted = {}
+
+    def _close_maps(self):
+        # Windows can't replace/extend files that are still mapped
+        self._maps = {}
+        self._key_runs.close()
+
+    # -----------------------------
+    # Lookup
+    # -----------------------------
+    def _row_of(self, key: int) -> Optional[int]:
+        """
+        Live saved row holding `key`, or None.
+        """
+        row = int(self._key_runs.lookup(np.array([key], dtype="int64"))[0])
+        if row < 0 or not self._maps["live"][row] or row in self._deleted_rows:
+            return None
+        return row
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._pending_rows or self._row_of(key) is not None
+
+    def __len__(self) -> int:
+        return self.live_rows
+
+    def _blob(self, name: str, row: int) -> str:
+        offsets_name, blob_name = {**BLOBS, **LOCATION_BLOBS}[name]
+        offsets = self._maps[offsets_name]
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        return bytes(self._maps[blob_name][start:end]).decode("utf-8")
+
+    def _read_row(self, row: int) -> Dict:
+        page = int(self._maps["page"][row])
+        meta = {
+            "doc_id": self.docs[int(self._maps["doc"][row])],
+            "page": None if page < 0 else page,
+            "source": self.sources[int(self._maps["source"][row])],
+            "chunk_id": self._blob("chunk_id", row),
+        }
+        extra = self._blob("extra", row)
+        if extra:
+            meta.update(json.loads(extra))
+        meta["text"] = self._blob("text", row)
+        return meta
+
+    def get(self, key: int) -> Optional[Dict]:
+        """
+        Metadata of one chunk, with its text under "text". None if unknown.
+        A chunk that stands for near-duplicates lists [doc_id, page] of
+        itself and of each of them under "locations".
+        """
+        key = int(key)
+        pending = self._pending_rows.get(key)
+        if pending is not None:
+            meta = dict(self._pending[pending][1])
+        else:
+            row = self._row_of(key)
+            if row is None:
+                return None
+            meta = self._read_row(row)
+        merged = self.locations(key)
+        if merged:
+            meta["locations"] = [[meta["doc_id"], meta["page"]]] + [[loc["doc_id"], loc["page"]] for loc in merged]
+        return meta
+
+    def keys_for_doc(self, doc_id: str) -> List[int]:
+        keys = [key for key, meta in self._pending if key is not None and meta["doc_id"] == doc_id]
+        doc = self._doc_index.get(doc_id)
+        if doc is not None and self.rows:
+            rows = self._postings("doc", [doc])
+            keys.extend(
+                int(self._maps["keys"][r]) for r in rows
+                if self._maps["live"][r] and int(r) not in self._deleted_rows
+            )
+        return keys
+
+    def _postings(self, column: str, codes: List[int]) -> np.ndarray:
+        """
+        Saved rows whose `column` (doc / source, or loc_keys / loc_doc of
+        the locations table) holds one of `codes`.
+        The column's inverted index (rows sorted by code) is built on first
+        use and kept until the store changes on disk.
+        """
+        if column not in self._inverted:
+            values = np.asarray(self._maps[column])
+            order = np.argsort(values, kind="stable")
+            self._inverted[column] = (order, values[order])
+        if not codes:
+            return np.zeros(0, dtype="int64")
+        order, sorted_values = self._inverted[column]
+        codes = np.asarray(codes, dtype=sorted_values.dtype)
+        starts = np.searchsorted(sorted_values, codes, side="left")
+        ends = np.searchsorted(sorted_values, codes, side="right")
+        return np.concatenate([order[a:b] for a, b in zip(starts, ends)]).astype("int64")
+
+    def _filter_rows(self, chunk_filter: ChunkFilter, table: str) -> np.ndarray:
+        """
+        Live saved rows of `table` ("chunks" or "locations") matching
+        chunk_filter. doc_ids and sources are looked up in the inverted
+        indexes, so only the rows of the named documents are read; page
+        bounds are checked on those rows.
+        """
+        prefix, n_rows, deleted = ("", self.rows, self._deleted_rows) if table == "chunks" else (
+            "loc_", self.loc_rows, self._deleted_locs
+        )
+        doc, source, page, live = (prefix + name for name in ("doc", "source", "page", "live"))
+
+        source_codes = None
+        if chunk_filter.sources is not None:
+            source_codes = [self._source_index[s] for s in chunk_filter.sources if s in self._source_index]
+        if n_rows == 0:
+            return np.zeros(0, dtype="int64")
+        if chunk_filter.doc_ids is not None:
+            codes = [self._doc_index[d] for d in chunk_filter.doc_ids if d in self._doc_index]
+            rows = self._postings(doc, codes)
+        elif source_codes is not None:
+            rows = self._postings(source, source_codes)
+            source_codes = None
+        else:
+            rows = np.arange(n_rows, dtype="int64")
+
+        if len(rows) and source_codes is not None:
+            rows = rows[np.isin(np.asarray(self._maps[source][rows]), source_codes)]
+        if len(rows) and chunk_filter.pages:
+            pages = np.asarray(self._maps[page][rows])
+            keep = pages >= 0
+            if chunk_filter.page_from is not None:
+                keep &= pages >= chunk_filter.page_from
+            if chunk_filter.page_to is not None:
+                keep &= pages <= chunk_filter.page_to
+            rows = rows[keep]
+        if len(rows):
+            rows = rows[np.asarray(self._maps[live][rows]) == 1]
+        if len(rows) and deleted:
+            rows = rows[~np.isin(rows, list(deleted))]
+        return rows
+
+    def select_keys(self, chunk_filter: ChunkFilter) -> np.ndarray:
+        """
+        Sorted keys of the live chunks matching `chunk_filter`, either by
+        their own doc / source / page or by those of a near-duplicate
+        merged into them (the locations table).
+        """
+        rows = self._filter_rows(chunk_filter, "chunks")
+        loc_rows = self._filter_rows(chunk_filter, "locations")
+        parts = [
+            np.asarray(self._maps["keys"][rows]) if len(rows) else np.zeros(0, dtype="int64"),
+            np.asarray(self._maps["loc_keys"][loc_rows]) if len(loc_rows) else np.zeros(0, dtype="int64"),
+        ]
+        pending = [key for key, meta in self._pending if key is not None and chunk_filter.matches(meta)]
+        pending += [key for key, locs in self._pending_locs.items() if any(chunk_filter.matches(loc) for loc in locs)]
+        parts.append(np.array(pending, dtype="int64"))
+        return np.unique(np.concatenate(parts))
+
+    # -----------------------------
+    # Locations of merged duplicates
+    # -----------------------------
+    def _read_location(self, row: int) -> Dict:
+        page = int(self._maps["loc_page"][row])
+        return {
+            "doc_id": self.docs[int(self._maps["loc_doc"][row])],
+            "page": None if page < 0 else page,
+            "source": self.sources[int(self._maps["loc_source"][row])],
+            "chunk_id": self._blob("loc_chunk_id", row),
+        }
+
+    def _location_rows(self, column: str, code: int) -> np.ndarray:
+        """
+        Live saved location rows whose `column` (loc_keys / loc_doc) is code, in row order.
+        """
+        if not self.loc_rows:
+            return np.zeros(0, dtype="int64")
+        rows = np.sort(self._postings(column, [code]))
+        rows = rows[np.asarray(self._maps["loc_live"][rows]) == 1]
+        if len(rows) and self._deleted_locs:
+            rows = rows[~np.isin(rows, list(self._deleted_locs))]
+        return rows
+
+    def locations(self, key: int) -> List[Dict]:
+        """
+        Locations (doc_id, page, source, chunk_id) of the duplicates merged
+        into chunk `key`, oldest first.
+        """
+        key = int(key)
+        found = [self._read_location(int(r)) for r in self._location_rows("loc_keys", key)]
+        found.extend(dict(loc) for loc in self._pending_locs.get(key, ()))
+        return found
+
+    def keys_with_location(self, doc_id: str) -> List[int]:
+        """
+        Keys of the chunks holding a merged duplicate from doc_id.
+        """
+        keys = [k for k, locs in self._pending_locs.items() if any(loc["doc_id"] == doc_id for loc in locs)]
+        doc = self._doc_index.get(doc_id)
+        if doc is not None:
+            keys.extend(int(self._maps["loc_keys"][r]) for r in self._location_rows("loc_doc", doc))
+        return list(dict.fromkeys(keys))
+
+    def add_location(self, key: int, location: Dict):
+        """
+        Record a duplicate (doc_id, page, source, chunk_id) merged into chunk `key`.
+        """
+        location = {field: location.get(field) for field in ("doc_id", "page", "source", "chunk_id")}
+        self._pending_locs.setdefault(int(key), []).append(location)
+
+    def remove_locations(self, key: int, doc_id: str = None) -> int:
+        """
+        Drop the locations of chunk `key` (only those in doc_id if given).
+        Returns how many were dropped.
+        """
+        key = int(key)
+        pending = self._pending_locs.pop(key, [])
+        kept = [loc for loc in pending if doc_id is not None and loc["doc_id"] != doc_id]
+        if kept:
+            self._pending_locs[key] = kept
+        removed = len(pending) - len(kept)
+        for row in self._location_rows("loc_keys", key).tolist():
+            if doc_id is None or self.docs[int(self._maps["loc_doc"][row])] == doc_id:
+                self._deleted_locs.add(row)
+                removed += 1
+        return removed
+
+    def keys(self) -> np.ndarray:
+        """
+        Keys of all live chunks, without reading their rows.
+        """
+        saved = np.zeros(0, dtype="int64")
+        if self.rows:
+            live = np.asarray(self._maps["live"]) == 1
+            if self._deleted_rows:
+                live[list(self._deleted_rows)] = False
+            saved = np.asarray(self._maps["keys"])[live]
+        pending = np.array([key for key, _ in self._pending if key is not None], dtype="int64")
+        return np.concatenate([saved, pending])
+
+    def items(self) -> Iterator[Tuple[int, Dict]]:
+        """
+        Iterate (key, metadata) over all live chunks. Reads every row.
+        """
+        for row in range(self.rows):
+            if self._maps["live"][row] and row not in self._deleted_rows:
+                yield int(self._maps["keys"][row]), self._read_row(row)
+        for key, meta in self._pending:
+            if key is not None:
+                yield key, meta
+
+    # -----------------------------
+    # Mutation (in memory until save)
+    # -----------------------------
+    def reset(self):
+        """
+        Start an empty store; the next save() replaces the files on disk.
+        """
+        self._reset_state()
+        self._rewrite = True
+
+    def append(self, key: int, chunk: Dict):
+        # Locations live in their own table (add_location), not in the row
+        meta = {k: v for k, v in chunk["metadata"].items() if k != "locations"}
+        meta["text"] = chunk["text"]
+        self._pending_rows[key] = len(self._pending)
+        self._pending.append((key, meta))
+        self.live_rows += 1
+
+    def remove(self, key: int) -> bool:
+        """
+        Delete chunk `key` and the locations merged into it.
+        """
+        key = int(key)
+        self.remove_locations(key)
+        pending = self._pending_rows.pop(key, None)
+        if pending is not None:
+            self._pending[pending] = (None, None)
+            self.live_rows -= 1
+            return True
+
+        row = self._row_of(key)
+        if row is None:
+            return False
+        self._deleted_rows.add(row)
+        self.live_rows -= 1
+        return True
+
+    @property
+    def dirty(self) -> bool:
+        return bool(
+            self._pending or self._deleted_rows or self._pending_locs or self._deleted_locs or self._rewrite
+        )
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def _codes(self, meta: Dict) -> Tuple[int, int]:
+        """
+        (doc, source) codes of a row, adding new names to the tables.
+        """
+        doc_id = meta["doc_id"]
+        if doc_id not in self._doc_index:
+            self._doc_index[doc_id] = len(self.docs)
+            self.docs.append(doc_id)
+        source = meta.get("source") or ""
+        if source not in self._source_index:
+            self._source_index[source] = len(self.sources)
+            self.sources.append(source)
+        return self._doc_index[doc_id], self._source_index[source]
+
+    def _encode_blobs(self, cols: Dict, blob_specs: Dict, blobs: Dict[str, List[bytes]], n: int):
+        for name, (offsets_name, blob_name) in blob_specs.items():
+            lengths = np.fromiter((len(b) for b in blobs[name]), dtype="int64", count=n)
+            cols[offsets_name] = self.blob_sizes[name] + np.cumsum(lengths)
+            cols[blob_name] = b"".join(blobs[name])
+
+    def _encode_pending(self) -> Dict[str, np.ndarray]:
+        pending = [(k, m) for k, m in self._pending if k is not None]
+        cols = {name: np.zeros(len(pending), dtype=dtype) for name, dtype in COLUMNS.items()}
+        blobs = {name: [] for name in BLOBS}
+
+        for i, (key, meta) in enumerate(pending):
+            cols["keys"][i] = key
+            cols["doc"][i], cols["source"][i] = self._codes(meta)
+            cols["page"][i] = -1 if meta.get("page") is None else meta["page"]
+            cols["live"][i] = 1
+
+            extra = {k: v for k, v in meta.items() if k not in CORE_FIELDS and k != "text"}
+            blobs["text"].append(meta.get("text", "").encode("utf-8"))
+            blobs["chunk_id"].append(meta["chunk_id"].encode("utf-8"))
+            blobs["extra"].append(json.dumps(extra).encode("utf-8") if extra else b"")
+
+        self._encode_blobs(cols, BLOBS, blobs, len(pending))
+        return cols
+
+    def _encode_pending_locations(self) -> Dict[str, np.ndarray]:
+        pending = [(k, loc) for k, locs in self._pending_locs.items() for loc in locs]
+        cols = {name: np.zeros(len(pending), dtype=dtype) for name, dtype in LOCATION_COLUMNS.items()}
+        blobs = {name: [] for name in LOCATION_BLOBS}
+
+        for i, (key, loc) in enumerate(pending):
+            cols["loc_keys"][i] = key
+            cols["loc_doc"][i], cols["loc_source"][i] = self._codes(loc)
+            cols["loc_page"][i] = -1 if loc.get("page") is None else loc["page"]
+            cols["loc_live"][i] = 1
+            blobs["loc_chunk_id"].append((loc.get("chunk_id") or "").encode("utf-8"))
+
+        self._encode_blobs(cols, LOCATION_BLOBS, blobs, len(pending))
+        return cols
+
+    def _append_table(self, target: Path, columns: Dict, blob_specs: Dict, cols: Dict, committed_rows: int):
+        """
+        Append encoded rows to one table's column and blob files.
+        """
+        for name, dtype in columns.items():
+            size = np.dtype(dtype).itemsize
+            append_file(self._file(name, target), committed_rows * size, cols[name].tobytes())
+        for name, (offsets_name, blob_name) in blob_specs.items():
+            committed = (committed_rows + 1) * 8 if committed_rows else 0
+            offsets = cols[offsets_name]
+            if not committed_rows and len(offsets):
+                offsets = np.concatenate([[0], offsets])
+            append_file(self._file(offsets_name, target), committed, offsets.astype("int64").tobytes())
+            append_file(self._file(blob_name, target), self.blob_sizes[name], cols[blob_name])
+            self.blob_sizes[name] += len(cols[blob_name])
+
+    @staticmethod
+    def _clear_flags(path: Path, rows: set):
+        with open(path, "r+b") as f:
+            for row in sorted(rows):
+                f.seek(row)
+                f.write(b"\x00")
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        target = self.path
+        if self._rewrite:
+            # Fresh build: write a complete new store next to the old one, then swap
+            target = self.path.with_name(self.path.name + ".tmp")
+            shutil.rmtree(target, ignore_errors=True)
+        target.mkdir(parents=True, exist_ok=True)
+
+        cols = self._encode_pending()
+        loc_cols = self._encode_pending_locations()
+        new_rows = len(cols["keys"])
+        self._maps = {}
+
+        # 1. Append new rows and locations after the committed data
+        self._append_table(target, COLUMNS, BLOBS, cols, self.rows)
+        self._append_table(target, LOCATION_COLUMNS, LOCATION_BLOBS, loc_cols, self.loc_rows)
+
+        # 2. Flip the live flag of deleted rows and dropped locations
+        if self._deleted_rows:
+            self._clear_flags(self._file("live", target), self._deleted_rows)
+        if self._deleted_locs:
+            self._clear_flags(self._file("loc_live", target), self._deleted_locs)
+
+        first_new = self.rows
+        self.rows += new_rows
+        self.loc_rows += len(loc_cols["loc_keys"])
+
+        # 3. Index the new rows' keys: a new delta run, or now and then a merged base
+        live = (
+            np.memmap(self._file("live", target), dtype="uint8", mode="r", shape=(self.rows,)) if self.rows
+            else np.zeros(0, dtype="uint8")
+        )
+        key_runs = self._key_runs.save(
+            target, cols["keys"], np.arange(first_new, self.rows, dtype="int64"), live
+        )
+        del live
+
+        # 4. Commit
+        tables = {"docs": self.docs, "sources": self.sources}
+        meta = {
+            "rows": self.rows,
+            "live_rows": self.live_rows,
+            "loc_rows": self.loc_rows,
+            "blob_sizes": self.blob_sizes,
+            "key_runs": key_runs,
+        }
+        atomic_write(target / "tables.json", lambda p: p.write_text(json.dumps(tables)))
+        atomic_write(target / "meta.json", lambda p: p.write_text(json.dumps(meta)))
+
+        if self._rewrite:
+            swap_dir(target, self.path)
+
+        self._pending = []
+        self._pending_rows = {}
+        self._deleted_rows = set()
+        self._pending_locs = {}
+        self._deleted_locs = set()
+        self._rewrite = False
+        self._key_runs.cleanup(self.path)
+        self._key_runs.open(self.path, key_runs)
+        self._open_maps()
+
+    # -----------------------------
+    # Stats
+    # -----------------------------
+    def nbytes_on_disk(self) -> int:
+        return dir_nbytes(self.path)
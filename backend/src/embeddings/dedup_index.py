@@ -0,0 +1,346 @@
+# src/embeddings/dedup_index.py
+import hashlib
+import json
+import re
+import shutil
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.embeddings.sorted_runs import SortedRuns
+from src.utils.fileio import append_file, atomic_write, dir_nbytes, swap_dir
+
+WORD_RE = re.compile(r"\w+")
+
+# Universal hashing a * x + b mod P; a, b < 2**31 and x < 2**32 keep a * x + b inside uint64
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64(0xFFFF_FFFF)
+SHINGLE_BASE = np.uint64(0x100000001B3)
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bands, rows per band) with bands * rows == num_perm whose S-curve
+    midpoint (1 / bands) ** (1 / rows) is the highest one still <= threshold.
+    Candidates are verified against the threshold afterwards, so erring on
+    the low side only costs a few extra comparisons, not missed duplicates.
+    """
+    best = (num_perm, 1)
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        midpoint = (1 / bands) ** (1 / rows)
+        if midpoint <= threshold and midpoint > (1 / best[0]) ** (1 / best[1]):
+            best = (bands, rows)
+    return best
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles.
+    The permutations come from a fixed seed, so signatures are comparable
+    across processes and runs.
+    """
+    def __init__(self, num_perm: int = 64, shingle: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle = shingle
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype="uint64")
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype="uint64")
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        words = WORD_RE.findall(text.lower())
+        if not words:
+            return np.zeros(0, dtype="uint64")
+        hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype="uint64", count=len(words))
+        n = max(1, len(hashes) - self.shingle + 1)
+        combined = np.zeros(n, dtype="uint64")
+        for j in range(min(self.shingle, len(hashes))):
+            combined = combined * SHINGLE_BASE + hashes[j:j + n]
+        # Fold to 32 bits for the permutation step
+        return (combined ^ (combined >> np.uint64(32))) & MAX_HASH
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        uint32 MinHash signature of `text`, None if it has no words.
+        """
+        shingles = self._shingle_hashes(text)
+        if len(shingles) == 0:
+            return None
+        permuted = (self.a[:, None] * shingles[None, :] + self.b[:, None]) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=1).astype("uint32")
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash / LSH index of indexed chunks, used to spot
+    near-duplicates before they are embedded.
+
+    Each chunk's signature is cut into bands; every band is hashed into a
+    bucket. Chunks sharing any bucket are candidates, and a candidate is a
+    duplicate when the signatures agree on at least `threshold` of their
+    positions (estimated Jaccard similarity of the word shingles). Lookups
+    are a binary search per band, never a pairwise scan, so the cost does
+    not grow with the corpus.
+
+    Layout (append-only like the chunk store, meta.json is the commit point):
+        keys.bin / sigs.bin / live.bin   one row per indexed chunk
+        bucket_run*                      sorted band hash -> row runs
+        key_run*                         sorted chunk key -> row runs
+    (see SortedRuns: a save writes the runs of its new rows, not all of them)
+
+    Where the duplicates went is recorded by the chunk store (its locations
+    table), not here.
+    """
+    def __init__(self, path: str, threshold: float = 0.9, num_perm: int = 64, shingle: int = 5):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle)
+        self.bands, self.band_rows = lsh_params(num_perm, threshold)
+        self._reset_state()
+
+    def _reset_state(self):
+        self.rows = 0
+        self.live_rows = 0
+        self._maps: Dict[str, np.ndarray] = {}
+        self._key_runs = SortedRuns("key_run", "int64")
+        self._bucket_runs = SortedRuns("bucket_run", "uint64")
+
+        # Changes not yet on disk
+        self._pending_keys: List[int] = []
+        self._pending_sigs: List[np.ndarray] = []
+        self._pending_buckets: Dict[int, List[int]] = {}
+        self._pending_rows: Dict[int, int] = {}  # key -> row of its pending signature
+        self._deleted_rows: set = set()
+        self._rewrite = False
+
+        self.checked = 0
+        self.duplicates = 0
+
+    # -----------------------------
+    # Files
+    # -----------------------------
+    def exists(self) -> bool:
+        return (self.path / "meta.json").exists()
+
+    def _map(self, name: str, dtype: str, length: int) -> np.ndarray:
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path / f"{name}.bin", dtype=dtype, mode="r", shape=(length,))
+
+    def open(self):
+        meta = json.loads((self.path / "meta.json").read_text())
+        if (meta["num_perm"], meta["shingle"], meta["bands"]) != (
+            self.hasher.num_perm, self.hasher.shingle, self.bands
+        ):
+            raise ValueError(
+                f"Dedup index {self.path} was built with different MinHash settings; rebuild the index"
+            )
+        self._reset_state()
+        self.rows = meta["rows"]
+        self.live_rows = meta["live_rows"]
+        legacy_keys = SortedRuns.legacy_state("sorted_keys.bin", "sorted_rows.bin", self.live_rows)
+        legacy_buckets = SortedRuns.legacy_state("buckets.bin", "bucket_rows.bin", meta.get("buckets", 0))
+        self._key_runs.open(self.path, meta.get("key_runs") or legacy_keys)
+        self._bucket_runs.open(self.path, meta.get("bucket_runs") or legacy_buckets)
+        self._open_maps()
+
+    def _open_maps(self):
+        num_perm = self.hasher.num_perm
+        self._maps = {
+            "keys": self._map("keys", "int64", self.rows),
+            "sigs": self._map("sigs", "uint32", self.rows * num_perm).reshape(self.rows, num_perm),
+            "live": self._map("live", "uint8", self.rows),
+        }
+
+    def reset(self):
+        """
+        Start an empty index; the next save() replaces the files on disk.
+        """
+        self._reset_state()
+        self._rewrite = True
+
+    def __len__(self) -> int:
+        return self.live_rows
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending_keys or self._deleted_rows or self._rewrite)
+
+    # -----------------------------
+    # Lookup
+    # -----------------------------
+    def _band_hashes(self, sig: np.ndarray) -> List[int]:
+        hashes = []
+        for band in range(self.bands):
+            part = sig[band * self.band_rows:(band + 1) * self.band_rows]
+            digest = hashlib.blake2b(part.tobytes(), digest_size=8, salt=band.to_bytes(16, "little")).digest()
+            hashes.append(int.from_bytes(digest, "little"))
+        return hashes
+
+    def _is_live(self, row: int) -> bool:
+        if row in self._deleted_rows:
+            return False
+        return row >= self.rows or bool(self._maps["live"][row])
+
+    def _row_key(self, row: int) -> int:
+        return self._pending_keys[row - self.rows] if row >= self.rows else int(self._maps["keys"][row])
+
+    def _row_sig(self, row: int) -> np.ndarray:
+        return self._pending_sigs[row - self.rows] if row >= self.rows else self._maps["sigs"][row]
+
+    def _candidates(self, band_hashes: List[int]) -> set:
+        rows = set()
+        for h in band_hashes:
+            rows.update(self._pending_buckets.get(h, ()))
+            rows.update(self._bucket_runs.find_all(np.uint64(h)).tolist())
+        return rows
+
+    def find(self, sig: np.ndarray, exclude: int = None, count: bool = True) -> Optional[int]:
+        """
+        Key of the most similar indexed chunk at or above the threshold, or None.
+        count=False leaves the checked/duplicates stats alone (dry runs).
+        """
+        if count:
+            self.checked += 1
+        best_key, best_sim = None, self.threshold
+        for row in self._candidates(self._band_hashes(sig)):
+            if not self._is_live(row):
+                continue
+            key = self._row_key(row)
+            if key == exclude:
+                continue
+            similarity = float(np.mean(self._row_sig(row) == sig))
+            if similarity >= best_sim:
+                best_key, best_sim = key, similarity
+        if best_key is not None and count:
+            self.duplicates += 1
+        return best_key
+
+    def _rows_of(self, keys: List[int]) -> List[int]:
+        """
+        Live rows of `keys`: a dict lookup for pending ones, a binary search
+        of the sorted key runs for saved ones.
+        """
+        keys = np.unique(np.asarray(keys, dtype="int64"))
+        rows = [self._pending_rows[k] for k in keys.tolist() if k in self._pending_rows]
+        rows.extend(int(r) for r in self._key_runs.lookup(keys) if r >= 0)
+        return [r for r in rows if self._is_live(r)]
+
+    # -----------------------------
+    # Mutation (in memory until save)
+    # -----------------------------
+    def add(self, key: int, sig: np.ndarray):
+        """
+        Index a chunk's signature. remove() an earlier one for the same key first.
+        """
+        row = self.rows + len(self._pending_keys)
+        self._pending_keys.append(int(key))
+        self._pending_sigs.append(sig)
+        self._pending_rows[int(key)] = row
+        for h in self._band_hashes(sig):
+            self._pending_buckets.setdefault(h, []).append(row)
+        self.live_rows += 1
+
+    def remove(self, keys: List[int]) -> int:
+        rows = self._rows_of(keys)
+        for key in keys:
+            self._pending_rows.pop(int(key), None)
+        self._deleted_rows.update(rows)
+        self.live_rows -= len(rows)
+        return len(rows)
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self):
+        if not self.dirty:
+            return
+
+        target = self.path
+        if self._rewrite:
+            # Fresh build: write a complete new index next to the old one, then swap
+            target = self.path.with_name(self.path.name + ".tmp")
+            shutil.rmtree(target, ignore_errors=True)
+        target.mkdir(parents=True, exist_ok=True)
+
+        num_perm = self.hasher.num_perm
+        self._maps = {}
+
+        # 1. Append new rows after the committed data
+        new_rows = len(self._pending_keys)
+        new_keys = np.array(self._pending_keys, dtype="int64")
+        sigs = np.stack(self._pending_sigs) if new_rows else np.zeros((0, num_perm), dtype="uint32")
+        append_file(target / "keys.bin", self.rows * 8, new_keys.tobytes())
+        append_file(target / "sigs.bin", self.rows * num_perm * 4, sigs.astype("uint32").tobytes())
+        append_file(target / "live.bin", self.rows, np.ones(new_rows, dtype="uint8").tobytes())
+
+        # 2. Flip the live flag of removed rows
+        if self._deleted_rows:
+            with open(target / "live.bin", "r+b") as f:
+                for row in sorted(self._deleted_rows):
+                    f.seek(row)
+                    f.write(b"\x00")
+        first_new = self.rows
+        self.rows += new_rows
+
+        # 3. Index the new rows' buckets and keys: new delta runs, now and then merged bases
+        live = (
+            np.memmap(target / "live.bin", dtype="uint8", mode="r", shape=(self.rows,)) if self.rows
+            else np.zeros(0, dtype="uint8")
+        )
+        pending = [(h, row) for h, rows in self._pending_buckets.items() for row in rows]
+        bucket_runs = self._bucket_runs.save(
+            target,
+            np.array([h for h, _ in pending], dtype="uint64"),
+            np.array([r for _, r in pending], dtype="int64"),
+            live
+        )
+        key_runs = self._key_runs.save(target, new_keys, np.arange(first_new, self.rows, dtype="int64"), live)
+        del live
+
+        # 4. Commit
+        meta = {
+            "rows": self.rows,
+            "live_rows": self.live_rows,
+            "key_runs": key_runs,
+            "bucket_runs": bucket_runs,
+            "num_perm": num_perm,
+            "shingle": self.hasher.shingle,
+            "bands": self.bands,
+        }
+        atomic_write(target / "meta.json", lambda p: p.write_text(json.dumps(meta)))
+
+        if self._rewrite:
+            swap_dir(target, self.path)
+
+        self._pending_keys = []
+        self._pending_sigs = []
+        self._pending_buckets = {}
+        self._pending_rows = {}
+        self._deleted_rows = set()
+        self._rewrite = False
+        for runs, state in ((self._key_runs, key_runs), (self._bucket_runs, bucket_runs)):
+            runs.cleanup(self.path)
+            runs.open(self.path, state)
+        self._open_maps()
+
+    # -----------------------------
+    # Stats
+    # -----------------------------
+    @property
+    def stats(self) -> dict:
+        return {
+            "chunks": self.live_rows,
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows_per_band": self.band_rows,
+        }
+
+    def nbytes_on_disk(self) -> int:
+        return dir_nbytes(self.path)
@@ -6,19 +6,24 @@ import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from src.embeddings.cache import EmbeddingCache
+
 
 class EmbeddingStore:
     def __init__(
         self,
         model_name: str = "all-MiniLM-L6-v2",
         index_path: str = "data/index/faiss.index",
-        metadata_path: str = "data/index/metadata.pkl"
+        metadata_path: str = "data/index/metadata.pkl",
+        cache_dir: str = None,
+        cache_max_entries: int = 1_000_000
     ):
         self.model_name = model_name
         self.index_path = index_path
         self.metadata_path = metadata_path
 
         self.model = SentenceTransformer(model_name)
+        self.cache = EmbeddingCache(cache_dir, model_name, cache_max_entries) if cache_dir else None
         self.index = None
         self.metadata = []
 
@@ -42,12 +47,26 @@ class EmbeddingStore:
 
         texts = [c["text"] for c in chunks]
 
-        # 1. Generate embeddings
-        embeddings = self.model.encode(
-            texts,
-            convert_to_numpy=True,
-            show_progress_bar=True
-        ).astype("float32")
+        # 1. Generate embeddings (only for texts not already cached)
+        if self.cache is not None:
+            embeddings, missing = self.cache.get_many(texts)
+        else:
+            embeddings, missing = None, list(range(len(texts)))
+
+        if missing:
+            miss_texts = [texts[i] for i in missing]
+            computed = self.model.encode(
+                miss_texts,
+                convert_to_numpy=True,
+                show_progress_bar=True
+            ).astype("float32")
+
+            if self.cache is not None:
+                self.cache.put_many(miss_texts, computed)
+                self.cache.flush()
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), computed.shape[1]), dtype="float32")
+            embeddings[missing] = computed
 
         # 2. Normalize for cosine similarity
         faiss.normalize_L2(embeddings)
@@ -1,13 +1,62 @@
 # src/embeddings/embed_hybrid.py
 from pathlib import Path
+import hashlib
+import json
+import logging
 import os
 import pickle
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional, Tuple
 import numpy as np
-import requests
 import faiss
 from sentence_transformers import SentenceTransformer
 
+from src.embeddings.cache import EmbeddingCache
+from src.embeddings.chunk_store import ChunkFilter, ChunkStore
+from src.embeddings.dedup_index import NearDuplicateIndex
+from src.embeddings.embed_service import EmbeddingServiceClient
+from src.embeddings.index_log import COMPACT_FRACTION, COMPACT_MIN_ENTRIES, IndexLog
+from src.embeddings.index_factory import (
+    bytes_per_vector,
+    create_index,
+    get_search_params,
+    index_type_of,
+    is_compressed,
+    make_search_params,
+    min_training_size,
+    read_index,
+    recall_at_k,
+    set_search_params,
+    supports_remove,
+    train_index,
+)
+from src.embeddings.lmstudio_client import LMStudioEmbeddingClient, LMStudioEmbeddingError
+from src.embeddings.manifest import ManifestError, check_files, describe_file, read_manifest, write_manifest
+from src.embeddings.sparse_index import BM25Index
+from src.embeddings.vector_store import ROW_OVERHEAD_BYTES, VectorStore
+from src.utils.fileio import atomic_write
+from src.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Fallback LM Studio dimension when neither the server nor an index tells us
+DEFAULT_LM_DIM = 1536
+
+
+def chunk_key(chunk_id: str) -> int:
+    """
+    Stable 63-bit FAISS id for a chunk_id string.
+    The same chunk always maps to the same id, across rebuilds and uploads.
+    """
+    digest = hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+class ReadOnlyIndexError(RuntimeError):
+    """
+    A write (add / delete / save) on a store opened with read_only=True.
+    """
+
 
 class HybridEmbeddingStore:
     def __init__(
@@ -16,110 +65,322 @@ class HybridEmbeddingStore:
         lmstudio_url: str = None,
         lmstudio_model: str = None,
         index_path: str = "data/index/faiss.index",
-        metadata_path: str = "data/index/metadata.pkl"
+        metadata_path: str = "data/index/metadata.pkl",
+        chunk_store_path: str = None,
+        sparse_index_path: str = None,
+        dedup_index_path: str = None,
+        vector_store_path: str = None,
+        dedup_threshold: float = 0.0,
+        dedup_num_perm: int = 64,
+        dedup_shingle: int = 5,
+        lmstudio_batch_size: int = 64,
+        lmstudio_max_in_flight: int = 4,
+        lmstudio_max_retries: int = 3,
+        lmstudio_timeout: tuple = (10, 60),
+        cache_dir: str = None,
+        cache_max_entries: int = 1_000_000,
+        index_type: str = "flat",
+        index_options: Dict = None,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        recall_sample: int = 1000,
+        rescore_factor: int = 4,
+        filter_exact_max: int = 2048,
+        verify_checksums: bool = False,
+        read_only: bool = False,
+        st_service: str = None,
+        st_service_timeout: float = 30.0
     ):
         self.st_model_name = st_model_name
         self.lmstudio_url = lmstudio_url
         self.lmstudio_model = lmstudio_model
         self.index_path = Path(index_path).resolve()
+        # Legacy pickled metadata, only read to migrate old indexes
         self.metadata_path = Path(metadata_path).resolve()
+        # Chunk text + metadata, memory-mapped (see chunk_store.ChunkStore)
+        self.chunk_store_path = (
+            Path(chunk_store_path).resolve() if chunk_store_path
+            else self.index_path.parent / "chunks"
+        )
+        # BM25 inverted index over the same chunks (see sparse_index.BM25Index)
+        self.sparse_index_path = (
+            Path(sparse_index_path).resolve() if sparse_index_path
+            else self.index_path.parent / "bm25"
+        )
+        # MinHash / LSH index for near-duplicate chunks (see dedup_index.NearDuplicateIndex)
+        self.dedup_index_path = (
+            Path(dedup_index_path).resolve() if dedup_index_path
+            else self.index_path.parent / "dedup"
+        )
+        # Full-precision vectors that rescore a compressed index (see vector_store.VectorStore)
+        self.vector_store_path = (
+            Path(vector_store_path).resolve() if vector_store_path
+            else self.index_path.parent / "vectors"
+        )
+        # Index type, search params and recall report of the last build
+        self.params_path = self.index_path.with_name(self.index_path.name + ".params.json")
+        # Models, dims, counts and checksums of the saved index (see manifest.py);
+        # verify_checksums also hashes the FAISS file on load, not just its size
+        self.manifest_path = self.index_path.with_name(self.index_path.name + ".manifest.json")
+        self.manifest = None
+        self.verify_checksums = verify_checksums
 
-        # Load SentenceTransformer model for FAISS
-        self.st_model = SentenceTransformer(st_model_name)
+        # ANN settings used when a new index is created (see index_factory)
+        self.index_type = index_type
+        self.index_options = index_options or {}
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.recall_sample = recall_sample
+        self.recall_report = None
+        # Compressed indexes (sq8, fp16, ivf_pq): candidates fetched per result
+        # and rescored with the full-precision vectors; 0 keeps the index scores
+        self.rescore_factor = rescore_factor
+        # Filtered searches (see search): filters matching at most this many
+        # chunks score them directly, larger ones pass FAISS an ID selector.
+        # Resolved filters are cached per index version.
+        self.filter_exact_max = filter_exact_max
+        self._filters = TTLCache(256, 3600.0)
+        # Deleted vectors still physically in an index that can't remove (HNSW)
+        self.tombstones = 0
 
-        # FAISS index placeholder
+        # SentenceTransformer model, loaded on first use (see st_model), or the
+        # address of an embedding service that holds it (see embed_service)
+        self._st_model = None
+        self._st_model_lock = threading.Lock()
+        self.st_service = st_service
+        self.st_service_timeout = st_service_timeout
+
+        # Serve-only mode for multi-worker deployments: the index is memory-
+        # mapped and shared through the page cache; add / delete / save raise
+        self.read_only = read_only
+        self._loaded_stamp = None
+
+        # Pooled LM Studio client (None -> ST-only vectors padded with zeros)
+        self.lm_client = None
+        if lmstudio_url and lmstudio_model:
+            self.lm_client = LMStudioEmbeddingClient(
+                lmstudio_url,
+                lmstudio_model,
+                batch_size=lmstudio_batch_size,
+                max_in_flight=lmstudio_max_in_flight,
+                max_retries=lmstudio_max_retries,
+                timeout=lmstudio_timeout
+            )
+        # Content-addressed embedding caches, one per model (None disables)
+        self.st_cache = None
+        self.lm_cache = None
+        if cache_dir:
+            self.st_cache = EmbeddingCache(cache_dir, st_model_name, cache_max_entries)
+            if self.lm_client is not None:
+                self.lm_cache = EmbeddingCache(
+                    cache_dir, f"lmstudio-{lmstudio_model}", cache_max_entries
+                )
+
+        # chunk_ids indexed with a zero LM Studio half; re-add them to retry
+        self.failed_chunk_ids: List[str] = []
+
+        # FAISS index placeholder (IndexIDMap2 keyed by chunk_key)
         self.index = None
-        self.metadata = []
+        # Changes since the FAISS file was last written in full (see index_log);
+        # _rewrite_index: the index was replaced, the next save writes it whole
+        self.index_log = IndexLog(self.index_path.with_name(self.index_path.name + ".log"))
+        self._rewrite_index = False
+        self.chunks = ChunkStore(self.chunk_store_path)
+        self.sparse = BM25Index(self.sparse_index_path)
+        self.vectors = VectorStore(self.vector_store_path)
+        # None disables near-duplicate detection (threshold 0)
+        self.dedup = None
+        if dedup_threshold > 0 and not read_only:
+            self.dedup = NearDuplicateIndex(
+                self.dedup_index_path, dedup_threshold, dedup_num_perm, dedup_shingle
+            )
+        # Survivors returned by dedupe() that are not added yet, by key, and
+        # the duplicates merged into them meanwhile
+        self._awaiting: Dict[int, Dict] = {}
+        self._awaiting_locations: Dict[int, List[Dict]] = {}
+
+        # Guards index/chunks against concurrent search + upload
+        self.lock = threading.RLock()
+        self._dirty = False
+        # Bumped on every change to the index; query caches key on it
+        self.version = 0
 
     # -----------------------------
     # Helpers
     # -----------------------------
     def is_loaded(self) -> bool:
-        return self.index is not None and len(self.metadata) > 0
+        return self.index is not None and len(self.chunks) > 0
+
+    @property
+    def st_model(self) -> SentenceTransformer:
+        if self._st_model is None:
+            with self._st_model_lock:
+                if self._st_model is None and self.st_service:
+                    self._st_model = EmbeddingServiceClient(self.st_service, timeout=self.st_service_timeout)
+                elif self._st_model is None:
+                    self._st_model = SentenceTransformer(self.st_model_name)
+        return self._st_model
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyIndexError(
+                f"Index {self.index_path} is open read-only; add documents through a writer "
+                "(build_index.py or an API instance with INDEX_READ_ONLY=0)"
+            )
+
+    @property
+    def st_dim(self) -> int:
+        """
+        ST embedding size; from the manifest until the model is loaded.
+        """
+        if self._st_model is None and self.manifest is not None:
+            return self.manifest["st_dim"]
+        return self.st_model.get_sentence_embedding_dimension()
+
+    def get_chunk(self, key: int) -> Dict:
+        """
+        Metadata + text of one indexed chunk (None if it was deleted).
+        """
+        with self.lock:
+            return self.chunks.get(key)
+
+    def get_vectors(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Indexed vectors of the given chunk keys: float32 from the vector
+        store when one is kept, otherwise reconstructed from the index.
+        """
+        keys = np.asarray(keys, dtype="int64")
+        with self.lock:
+            if self._keeps_vectors():
+                return self.vectors.get(keys)[0]
+            return self.index.reconstruct_batch(keys)
+
+    def _lm_dim(self) -> int:
+        """
+        Best known LM Studio embedding dimension, used to size fallback rows.
+        """
+        if self.lm_client is not None and self.lm_client.dim is not None:
+            return self.lm_client.dim
+        if self.lm_cache is not None and self.lm_cache.dim is not None:
+            return self.lm_cache.dim
+        if self.index is not None:
+            return self.index.d - self.st_dim
+        return DEFAULT_LM_DIM
 
     def get_lmstudio_embeddings(self, texts: List[str]) -> np.ndarray:
         """
         Query LM Studio API to get embeddings for multiple texts.
-        Always returns a 2D array (n_texts, embedding_dim)
+        Always returns a 2D array (n_texts, embedding_dim).
+        Rows whose batch failed after all retries are zero-filled; use
+        get_lmstudio_embeddings_with_failures to know which.
         """
-        if not self.lmstudio_url or not self.lmstudio_model:
-            print("[DEBUG] LM Studio not configured, returning zeros")
-            return np.zeros((len(texts), 1536), dtype="float32")
+        return self.get_lmstudio_embeddings_with_failures(texts)[0]
 
+    def get_lmstudio_embeddings_with_failures(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        get_lmstudio_embeddings, also returning the positions of the rows
+        that were zero-filled. The ingest committer and concurrent query
+        callers share the store, so failures are returned, not stored on it.
+        """
         if isinstance(texts, str):
             texts = [texts]
 
+        if self.lm_client is None:
+            logger.debug("LM Studio not configured, returning zeros")
+            return np.zeros((len(texts), self._lm_dim()), dtype="float32"), []
+
         try:
-            resp = requests.post(
-                f"{self.lmstudio_url}/v1/embeddings",
-                json={"model": self.lmstudio_model, "input": texts},
-                timeout=(10, 180)
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            print("[DEBUG] LM Studio raw response:", data)
+            return self.lm_client.embed(texts), []
+        except LMStudioEmbeddingError as e:
+            logger.error("LM Studio embedding failed for %d/%d texts: %s", len(e.failed), len(texts), e)
+            if e.embeddings is not None:
+                return e.embeddings, e.failed
+            return np.zeros((len(texts), self._lm_dim()), dtype="float32"), e.failed
+
+    async def aget_lmstudio_embeddings(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Async get_lmstudio_embeddings_with_failures for the API event loop.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
 
-            if "data" not in data or not isinstance(data["data"], list):
-                print("[WARN] 'data' key missing or invalid. Returning zeros.")
-                return np.zeros((len(texts), 1536), dtype="float32")
+        if self.lm_client is None:
+            return np.zeros((len(texts), self._lm_dim()), dtype="float32"), []
 
-            emb_list = [item.get("embedding") for item in data["data"]]
-            print("[DEBUG] LM Studio embedding list:", emb_list)
+        try:
+            return await self.lm_client.aembed(texts), []
+        except LMStudioEmbeddingError as e:
+            logger.error("LM Studio embedding failed for %d/%d texts: %s", len(e.failed), len(texts), e)
+            if e.embeddings is not None:
+                return e.embeddings, e.failed
+            return np.zeros((len(texts), self._lm_dim()), dtype="float32"), e.failed
 
-            if not emb_list or any(e is None for e in emb_list):
-                print("[WARN] Some embeddings are None. Returning zeros.")
-                return np.zeros((len(texts), 1536), dtype="float32")
+    def _encode_st(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        embeddings = self.st_model.encode(
+            texts, convert_to_numpy=True, show_progress_bar=True
+        ).astype("float32")
+        return embeddings, []
 
-            emb_array = np.array(emb_list, dtype="float32")
-            print("[DEBUG] LM Studio array shape before fix:", emb_array.shape, "ndim:", emb_array.ndim)
+    def _embed_cached(
+        self,
+        cache: EmbeddingCache,
+        texts: List[str],
+        encode
+    ) -> Tuple[np.ndarray, List[int]]:
+        """
+        Look texts up in `cache` and only run `encode` on the misses.
+        `encode` returns (embeddings, failed rows); failed rows (zero-filled
+        LM Studio rows) are not cached. Returns the embeddings and the
+        failed rows as `texts` positions.
+        """
+        if cache is None:
+            return encode(texts)
 
-            # Force 2D
-            if emb_array.ndim == 1:
-                emb_array = emb_array.reshape(1, -1)
-                print("[DEBUG] Reshaped to 2D:", emb_array.shape)
+        cached, missing = cache.get_many(texts)
+        if not missing:
+            return cached, []
 
-            # Ensure row count = len(texts)
-            if emb_array.shape[0] != len(texts):
-                print(f"[WARN] LM Studio returned {emb_array.shape[0]} embeddings, expected {len(texts)}. Filling with zeros.")
-                emb_array = np.zeros((len(texts), emb_array.shape[1]), dtype="float32")
+        miss_texts = [texts[i] for i in missing]
+        computed, failed = encode(miss_texts)
 
-            return emb_array
+        failed = set(failed)
+        keep = [i for i in range(len(miss_texts)) if i not in failed]
+        cache.put_many([miss_texts[i] for i in keep], computed[keep])
+        cache.flush()
 
-        except Exception as e:
-            print(f"[ERROR] LM Studio embedding failed: {e}")
-            return np.zeros((len(texts), 1536), dtype="float32")
+        if cached is None:
+            cached = np.zeros((len(texts), computed.shape[1]), dtype="float32")
+        cached[missing] = computed
+        # Report LM Studio failures against the caller's positions
+        return cached, [missing[i] for i in sorted(failed)]
 
     def embed_texts(self, texts: List[str]) -> np.ndarray:
         """
-        Generate hybrid embeddings (SentenceTransformer + LM Studio)
+        Generate hybrid embeddings (SentenceTransformer + LM Studio).
+        Each half is served from its on-disk cache when available.
+        """
+        return self.embed_texts_with_failures(texts)[0]
+
+    def embed_texts_with_failures(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        embed_texts, also returning the rows whose LM Studio half fell back
+        to zeros (see get_lmstudio_embeddings_with_failures).
         """
         # SentenceTransformer embeddings
-        st_embs = self.st_model.encode(
-            texts, convert_to_numpy=True, show_progress_bar=True
-        ).astype("float32")
-        print(f"[DEBUG] ST embeddings shape: {st_embs.shape}, ndim: {st_embs.ndim}")
+        st_embs, _ = self._embed_cached(self.st_cache, texts, self._encode_st)
+        logger.debug("ST embeddings shape: %s", st_embs.shape)
 
         # LM Studio embeddings
-        lm_embs = self.get_lmstudio_embeddings(texts)
-        print(f"[DEBUG] LM Studio embeddings shape: {lm_embs.shape}, ndim: {lm_embs.ndim}")
-
-        # Safety check before concatenation
-        if lm_embs is None:
-            print("[ERROR] LM Studio returned None, replacing with zeros")
-            lm_embs = np.zeros((len(texts), 1536), dtype="float32")
-
-        if st_embs.shape[0] != lm_embs.shape[0]:
-            print(f"[ERROR] Row mismatch! ST: {st_embs.shape}, LM: {lm_embs.shape}, forcing zeros")
-            lm_dim = lm_embs.shape[1] if lm_embs.ndim == 2 else 1536
-            lm_embs = np.zeros((st_embs.shape[0], lm_dim), dtype="float32")
+        lm_embs, failed = self._embed_cached(self.lm_cache, texts, self.get_lmstudio_embeddings_with_failures)
+        logger.debug("LM Studio embeddings shape: %s", lm_embs.shape)
 
         # Concatenate embeddings
         hybrid_embs = np.concatenate([st_embs, lm_embs], axis=1)
-        print(f"[DEBUG] Hybrid embeddings shape: {hybrid_embs.shape}, ndim: {hybrid_embs.ndim}")
+        logger.debug("Hybrid embeddings shape: %s", hybrid_embs.shape)
 
         # Normalize
         faiss.normalize_L2(hybrid_embs)
-        return hybrid_embs
+        return hybrid_embs, failed
 
     # -----------------------------
     # Build / add embeddings
@@ -128,21 +389,576 @@ class HybridEmbeddingStore:
         """
         chunks: list of dicts with keys:
             - text
-            - metadata
+            - metadata (must contain chunk_id and doc_id)
         """
         if not chunks:
             raise ValueError("No chunks provided for embedding")
+        self._check_writable()
+
+        with self.lock:
+            self._reset_dedup()
+        chunks = self.dedupe(chunks)
 
         texts = [c["text"] for c in chunks]
-        embeddings = self.embed_texts(texts)
+        embeddings, failed = self.embed_texts_with_failures(texts)
+        self.failed_chunk_ids = [chunks[i]["metadata"]["chunk_id"] for i in failed]
+
+        with self.lock:
+            # Create (and train) FAISS index, keyed by stable chunk ids
+            self.index, train_rows = self._new_index(embeddings)
+            self._rewrite_index = True
+            self.chunks.reset()
+            self.sparse.reset()
+            self.vectors.reset(self.index.d)
+            self.tombstones = 0
+            ids = self._add_embeddings(embeddings, chunks)
 
-        # Create FAISS index
-        dim = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dim)
-        self.index.add(embeddings)
+            self.recall_report = None
+            if self.recall_sample and index_type_of(self.index) != "flat":
+                self.recall_report = self._recall_report(embeddings, ids, train_rows)
+                logger.info("ANN recall report: %s", self.recall_report)
+
+    def add(self, chunks: List[Dict]) -> int:
+        """
+        Embed and add chunks to the live index without touching the rest of it.
+        Chunks whose chunk_id is already indexed are replaced (upsert);
+        near-duplicates of indexed chunks are merged into them (see dedupe).
+        Returns the number of vectors added.
+        """
+        self._check_writable()
+        chunks = self.dedupe(chunks)
+        if not chunks:
+            return 0
+
+        embeddings, failed = self.embed_texts_with_failures([c["text"] for c in chunks])
+        self.failed_chunk_ids.extend(chunks[i]["metadata"]["chunk_id"] for i in failed)
+        return self.add_embedded(chunks, embeddings)
+
+    def add_embedded(self, chunks: List[Dict], embeddings: np.ndarray) -> int:
+        """
+        add() for chunks that are already embedded (see embed_texts).
+        The first call on an empty store creates and trains the index from
+        these embeddings.
+        """
+        if not chunks:
+            return 0
+        self._check_writable()
 
-        # Store metadata
-        self.metadata = [c["metadata"] for c in chunks]
+        with self.lock:
+            if self.index is None:
+                self.index, _ = self._new_index(embeddings)
+                self._rewrite_index = True
+                self.vectors.reset(self.index.d)
+            elif embeddings.shape[1] != self.index.d:
+                raise ValueError(
+                    f"Embedding dim {embeddings.shape[1]} != FAISS index dim {self.index.d}"
+                )
+
+            keys = [chunk_key(c["metadata"]["chunk_id"]) for c in chunks]
+            existing = [key for key in keys if key in self.chunks]
+            if existing:
+                # Duplicates from other documents stay merged into the new version
+                doc_ids = {key: c["metadata"]["doc_id"] for key, c in zip(keys, chunks)}
+                for key in existing:
+                    kept = [loc for loc in self.chunks.locations(key) if loc["doc_id"] != doc_ids[key]]
+                    if kept:
+                        self._awaiting_locations.setdefault(key, []).extend(kept)
+                self._remove_ids(existing)
+
+            self._add_embeddings(embeddings, chunks)
+
+        return len(chunks)
+
+    def begin_build(self):
+        """
+        Start a new index that is filled incrementally with add() /
+        add_embedded() (streaming build). The previous index and chunk
+        store are replaced on the next save().
+        """
+        self._check_writable()
+        with self.lock:
+            self.index = None
+            self.chunks.reset()
+            self.sparse.reset()
+            self._reset_dedup()
+            self.tombstones = 0
+            self.recall_report = None
+            self.failed_chunk_ids = []
+            self._dirty = True
+            self.version += 1
+
+    def delete(self, doc_id: str) -> int:
+        """
+        Remove every chunk belonging to doc_id.
+        A chunk that also stands for duplicates in other documents is kept
+        and becomes the chunk of the first of them (see _rekey).
+        Returns the number of vectors removed.
+        """
+        self._check_writable()
+        with self.lock:
+            ids = []
+            for key in self.chunks.keys_for_doc(doc_id):
+                others = [loc for loc in self.chunks.locations(key) if loc["doc_id"] != doc_id]
+                if not (others and self._rekey(key, others)):
+                    ids.append(key)
+
+            # Duplicates from doc_id merged into chunks of other documents
+            for key in self.chunks.keys_with_location(doc_id):
+                if self.chunks.remove_locations(key, doc_id):
+                    self._dirty = True
+                    self.version += 1
+
+            if not ids:
+                return 0
+            if self.dedup is not None:
+                self.dedup.remove(ids)
+            self._remove_ids(ids)
+            return len(ids)
+
+    # -----------------------------
+    # Near-duplicate chunks
+    # -----------------------------
+    def _reset_dedup(self):
+        self._awaiting = {}
+        self._awaiting_locations = {}
+        if self.dedup is not None:
+            self.dedup.reset()
+
+    def _rekey(self, key: int, locations: List[Dict]) -> bool:
+        """
+        Hand chunk `key` over to the first of `locations` (its document is
+        being deleted): the same text and vector are indexed again under
+        that duplicate's own chunk_id, with a FAISS id, BM25 entry and dedup
+        fingerprint of their own, so a re-upload of the deleted document
+        can't overwrite it. Returns False if no location is left to take it.
+        """
+        # A location whose chunk_id got indexed itself since is stale
+        locations = [loc for loc in locations if chunk_key(loc["chunk_id"]) not in self.chunks]
+        if not locations:
+            return False
+
+        meta = self.chunks.get(key)
+        text = meta.pop("text", "")
+        meta.pop("locations", None)
+        meta.update(locations[0])
+        new_key = chunk_key(meta["chunk_id"])
+        vector = self.get_vectors(np.array([key], dtype="int64"))
+
+        if self.dedup is not None:
+            self.dedup.remove([key])
+            sig = self.dedup.hasher.signature(text)
+            if sig is not None:
+                self.dedup.add(new_key, sig)
+        self._remove_ids([key])
+        self._awaiting_locations[new_key] = locations[1:]
+        self._add_embeddings(vector, [{"text": text, "metadata": meta}])
+        return True
+
+    def _merge_duplicate(self, key: int, chunk: Dict):
+        """
+        Record chunk's location on the surviving chunk `key` (appended to
+        the chunk store's locations table once the survivor is indexed).
+        """
+        location = {field: chunk["metadata"].get(field) for field in ("doc_id", "page", "source", "chunk_id")}
+
+        def same_place(meta: Dict) -> bool:
+            return (meta["doc_id"], meta.get("page")) == (location["doc_id"], location["page"])
+
+        survivor = self._awaiting.get(key)
+        if survivor is not None:
+            if same_place(survivor["metadata"]):
+                return
+            merged = self._awaiting_locations.setdefault(key, [])
+            if not any(same_place(loc) for loc in merged):
+                merged.append(location)
+            return
+
+        meta = self.chunks.get(key)
+        if same_place(meta) or any(same_place(loc) for loc in self.chunks.locations(key)):
+            return
+        self.chunks.add_location(key, location)
+        self._dirty = True
+        self.version += 1
+
+    def dedupe(self, chunks: List[Dict]) -> List[Dict]:
+        """
+        Drop chunks that are near-duplicates (MinHash similarity >= the
+        threshold) of an indexed chunk or of an earlier chunk in `chunks`.
+        Each dropped chunk's (doc_id, page) is added to the survivor's
+        "locations" metadata. Returns the chunks left to embed.
+        """
+        if self.dedup is None:
+            return chunks
+
+        kept = []
+        with self.lock:
+            for chunk in chunks:
+                key = chunk_key(chunk["metadata"]["chunk_id"])
+                sig = self.dedup.hasher.signature(chunk["text"])
+                if sig is None:
+                    kept.append(chunk)
+                    continue
+                match = self.dedup.find(sig, exclude=key)
+                if match is not None and (match in self._awaiting or match in self.chunks):
+                    self._merge_duplicate(match, chunk)
+                    continue
+                if key in self._awaiting or key in self.chunks:
+                    # Upsert of an indexed chunk_id: replace its fingerprint
+                    self.dedup.remove([key])
+                self.dedup.add(key, sig)
+                self._awaiting[key] = chunk
+                kept.append(chunk)
+        return kept
+
+    def plan_dedupe(self, chunks: List[Dict], replacing: List[str] = ()) -> List[bool]:
+        """
+        Dry run of dedupe() for replace(): for each chunk, False if it is a
+        near-duplicate of an indexed chunk outside the documents in
+        `replacing`, so it needn't be embedded. Changes nothing. Duplicates
+        within `chunks` are not looked for; replace() drops them after
+        embedding.
+        """
+        if self.dedup is None:
+            return [True] * len(chunks)
+
+        replacing = set(replacing)
+        keep = []
+        with self.lock:
+            for chunk in chunks:
+                key = chunk_key(chunk["metadata"]["chunk_id"])
+                sig = self.dedup.hasher.signature(chunk["text"])
+                match = None if sig is None else self.dedup.find(sig, exclude=key, count=False)
+                keep.append(
+                    match is None
+                    or match not in self.chunks
+                    or self.chunks.get(match)["doc_id"] in replacing
+                )
+        return keep
+
+    def replace(
+        self,
+        doc_ids: List[str],
+        chunks: List[Dict],
+        keep: List[bool],
+        embeddings: Optional[np.ndarray],
+        failed: List[int] = ()
+    ) -> List[Dict]:
+        """
+        Replace documents in one step: delete doc_ids, dedupe `chunks` against
+        what is left, add them and save, all under one hold of the lock, so
+        searches see either the old versions or the new ones.
+        `keep` is plan_dedupe(chunks, doc_ids); `embeddings` are
+        embed_texts_with_failures() of the kept chunks, in order, and
+        `failed` its failed rows. If another writer changed the index since
+        plan_dedupe, chunks kept now but dropped then are embedded with the
+        lock released, and the plan is checked again. On an error the store
+        is rolled back to its last save. Returns the chunks added.
+        """
+        self._check_writable()
+        embedded = [chunk for chunk, k in zip(chunks, keep) if k]
+        rows = {id(chunk): row for row, chunk in enumerate(embedded)}
+        failed_rows = {id(embedded[i]) for i in failed}
+
+        while True:
+            with self.lock:
+                missing = [
+                    chunk for chunk, k in zip(chunks, self.plan_dedupe(chunks, doc_ids))
+                    if k and id(chunk) not in rows
+                ]
+                if not missing:
+                    return self._replace_embedded(doc_ids, chunks, embeddings, rows, failed_rows)
+
+            # Embedding calls LM Studio (retries, backoff): not under the lock
+            extra, extra_failed = self.embed_texts_with_failures([c["text"] for c in missing])
+            failed_rows.update(id(missing[i]) for i in extra_failed)
+            rows.update({id(chunk): len(rows) + i for i, chunk in enumerate(missing)})
+            embeddings = extra if embeddings is None else np.vstack([embeddings, extra])
+
+    def _replace_embedded(
+        self,
+        doc_ids: List[str],
+        chunks: List[Dict],
+        embeddings: Optional[np.ndarray],
+        rows: Dict[int, int],
+        failed_rows: set
+    ) -> List[Dict]:
+        """
+        replace() once every chunk dedupe keeps has an embedding row
+        (`rows`: id(chunk) -> row). Caller holds the lock.
+        """
+        if self.index is not None and embeddings is not None and embeddings.shape[1] != self.index.d:
+            raise ValueError(f"Embedding dim {embeddings.shape[1]} != FAISS index dim {self.index.d}")
+        failed_before = len(self.failed_chunk_ids)
+        try:
+            for doc_id in doc_ids:
+                self.delete(doc_id)
+            added = self.dedupe(chunks)
+            if any(id(chunk) not in rows for chunk in added):
+                raise RuntimeError("dedupe kept a chunk that plan_dedupe dropped")
+            if added:
+                self.failed_chunk_ids.extend(
+                    c["metadata"]["chunk_id"] for c in added if id(c) in failed_rows
+                )
+                self.add_embedded(added, embeddings[[rows[id(c)] for c in added]])
+            if self.index is not None:
+                self.save()
+        except Exception:
+            del self.failed_chunk_ids[failed_before:]
+            self.rollback()
+            raise
+        return added
+
+    def rollback(self):
+        """
+        Discard every change since the last save: reload it, or start empty
+        if there is none.
+        """
+        self._check_writable()
+        with self.lock:
+            self._awaiting = {}
+            self._awaiting_locations = {}
+            if self.index_path.exists():
+                self.load()
+                return
+            self.index = None
+            self.chunks.reset()
+            self.sparse.reset()
+            self._reset_dedup()
+            self.tombstones = 0
+            self._dirty = False
+            self.version += 1
+
+    def _new_index(self, embeddings: np.ndarray):
+        """
+        Create and train an index of self.index_type for these embeddings.
+        Returns (index, row positions used for training).
+        """
+        index_type = self.index_type
+        n, dim = embeddings.shape
+        if n < min_training_size(index_type):
+            logger.warning("%d vectors are too few to train %r, using a flat index", n, index_type)
+            index_type = "flat"
+
+        index = create_index(index_type, dim, n, **self.index_options)
+        train_rows = train_index(index, embeddings)
+        set_search_params(index, nprobe=self.nprobe, ef_search=self.ef_search)
+        return index, train_rows
+
+    def _keeps_vectors(self) -> bool:
+        """
+        True when the index is compressed and full-precision vectors are kept
+        beside it (indexes saved without them are searched as they are).
+        """
+        return self.index is not None and is_compressed(self.index) and self.vectors.dim == self.index.d
+
+    def memory_report(self) -> Dict:
+        """
+        RAM per vector of the search index vs float32 vectors, and the
+        full-precision vectors kept on disk for rescoring.
+        """
+        keeps = self._keeps_vectors()
+        per_vector = bytes_per_vector(self.index)
+        float32_per_vector = self.index.d * 4 + 8
+        return {
+            "index_type": index_type_of(self.index),
+            "bytes_per_vector": per_vector,
+            "float32_bytes_per_vector": float32_per_vector,
+            "compression": round(float32_per_vector / per_vector, 2),
+            "rescore_factor": self.rescore_factor if keeps else 0,
+            "rescore_disk_bytes_per_vector": self.index.d * 4 + ROW_OVERHEAD_BYTES if keeps else 0,
+        }
+
+    def _recall_report(self, embeddings: np.ndarray, ids: np.ndarray, train_rows: np.ndarray, k: int = 10) -> Dict:
+        """
+        recall@k of the ANN index vs exact search, on corpus rows held out of training.
+        Compressed indexes also report recall after rescoring and its delta
+        from the uncompressed (exact float32) index.
+        """
+        rng = np.random.default_rng(0)
+        held_out = np.setdiff1d(np.arange(len(embeddings)), train_rows)
+        pool = held_out if len(held_out) else np.arange(len(embeddings))
+        query_rows = rng.choice(pool, min(self.recall_sample, len(pool)), replace=False)
+        k = min(k, len(embeddings))
+
+        report = {
+            "index_type": index_type_of(self.index),
+            "search_params": get_search_params(self.index),
+            "k": k,
+            "queries": int(len(query_rows)),
+            "held_out": bool(len(held_out)),
+            "recall": round(recall_at_k(self.index, embeddings, ids, query_rows, k), 4),
+        }
+        if is_compressed(self.index):
+            recall = report["recall"]
+            if self.rescore_factor:
+                recall = round(recall_at_k(
+                    self.index, embeddings, ids, query_rows, k, rescore_factor=self.rescore_factor
+                ), 4)
+                report["recall_rescored"] = recall
+            report["recall_delta"] = round(recall - 1.0, 4)
+            report["memory"] = self.memory_report()
+        return report
+
+    def _add_embeddings(self, embeddings: np.ndarray, chunks: List[Dict]) -> np.ndarray:
+        ids = np.array(
+            [chunk_key(c["metadata"]["chunk_id"]) for c in chunks], dtype="int64"
+        )
+        self.index.add_with_ids(embeddings, ids)
+        if not self._rewrite_index:
+            self.index_log.add(ids, embeddings)
+        if self._keeps_vectors():
+            self.vectors.add(ids, embeddings)
+
+        for key, c in zip(ids.tolist(), chunks):
+            self._awaiting.pop(key, None)
+            self.chunks.append(key, c)
+            for location in self._awaiting_locations.pop(key, ()):
+                self.chunks.add_location(key, location)
+            self.sparse.add(key, c["text"])
+        self._dirty = True
+        self.version += 1
+        return ids
+
+    def _remove_ids(self, ids: List[int]):
+        ids = [key for key in ids if self.chunks.remove(key)]
+        if not ids:
+            return
+        for key in ids:
+            self.sparse.remove(key)
+            if self._keeps_vectors():
+                self.vectors.remove(key)
+
+        if supports_remove(self.index):
+            self.index.remove_ids(np.array(ids, dtype="int64"))
+            if not self._rewrite_index:
+                self.index_log.remove(ids)
+        else:
+            # HNSW: vectors stay in the graph, search() filters them out
+            # until save() compacts it
+            self.tombstones += len(ids)
+        self._dirty = True
+        self.version += 1
+
+    # -----------------------------
+    # Search
+    # -----------------------------
+    def search(
+        self,
+        query_embeddings: np.ndarray,
+        k: int,
+        nprobe: int = None,
+        ef_search: int = None,
+        chunk_filter: ChunkFilter = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Thread-safe FAISS search.
+        nprobe / ef_search override the index's persisted defaults for this call.
+        A compressed index returns k * rescore_factor candidates, reranked
+        by their exact full-precision scores.
+        chunk_filter limits the results to matching chunks inside the search.
+        Returns (scores, chunk keys); missing results have key -1.
+        """
+        with self.lock:
+            sel = None
+            if chunk_filter is not None and not chunk_filter.is_empty():
+                resolved = self.resolve_filter(chunk_filter)
+                if len(resolved["keys"]) <= self.filter_exact_max:
+                    return self._exact_search(query_embeddings, resolved["keys"], k)
+                sel = resolved["selector"]
+            params = make_search_params(self.index, nprobe=nprobe, ef_search=ef_search, sel=sel)
+            rescore = self.rescore_factor > 0 and self._keeps_vectors()
+            if rescore:
+                fetch = min(self.index.ntotal, k * self.rescore_factor)
+                _, keys = self.index.search(query_embeddings, fetch, params=params)
+                return self._rescore(query_embeddings, keys, k)
+            if not self.tombstones:
+                return self.index.search(query_embeddings, k, params=params)
+
+            # Over-fetch past deleted / superseded vectors. An upserted key
+            # is also hit through its old vector, which keeps the key's id:
+            # score every live key against its current vector instead
+            fetch = min(self.index.ntotal, k + self.tombstones)
+            _, keys = self.index.search(query_embeddings, fetch, params=params)
+            return self._rescore(query_embeddings, keys, k)
+
+    def resolve_filter(self, chunk_filter: ChunkFilter) -> Dict:
+        """
+        The live chunk keys matching chunk_filter (sorted), with a FAISS ID
+        selector over them. Cached until the index changes.
+        """
+        with self.lock:
+            cache_key = (chunk_filter, self.version)
+            resolved = self._filters.get(cache_key)
+            if resolved is None:
+                keys = self.chunks.select_keys(chunk_filter)
+                resolved = {
+                    "keys": keys,
+                    "selector": faiss.IDSelectorBatch(keys),
+                    "doc_mask": None,  # BM25 docs, built on first sparse_search
+                }
+                self._filters.put(cache_key, resolved)
+            return resolved
+
+    def _exact_search(self, query_embeddings: np.ndarray, keys: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every key directly: cheaper than walking the index for the
+        few vectors a narrow filter lets through, and exact. Keys are live
+        and get_vectors reads their current vector, never an upserted
+        key's old one left in an HNSW graph.
+        """
+        out_scores = np.full((len(query_embeddings), k), -np.inf, dtype="float32")
+        out_keys = np.full((len(query_embeddings), k), -1, dtype="int64")
+        if not len(keys):
+            return out_scores, out_keys
+
+        scores = query_embeddings @ self.get_vectors(keys).T
+        top = min(k, len(keys))
+        best = np.argsort(-scores, axis=1, kind="stable")[:, :top]
+        out_scores[:, :top] = np.take_along_axis(scores, best, axis=1)
+        out_keys[:, :top] = keys[best]
+        return out_scores, out_keys
+
+    def _rescore(self, query_embeddings: np.ndarray, keys: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact inner products of each query's candidates, fetched once per
+        distinct key (from the memory-mapped vectors when kept, else the
+        index's current vector for the key); the k best per query. Deleted
+        keys are dropped.
+        """
+        unique, inverse = np.unique(keys, return_inverse=True)
+        if self._keeps_vectors():
+            vectors, found = self.vectors.get(unique)
+        else:
+            found = np.array([key in self.chunks for key in unique.tolist()], dtype=bool)
+            vectors = np.zeros((len(unique), self.index.d), dtype="float32")
+            if found.any():
+                vectors[found] = self.index.reconstruct_batch(unique[found])
+        found &= unique >= 0
+        inverse = inverse.reshape(keys.shape)
+
+        out_scores = np.full((len(keys), k), -np.inf, dtype="float32")
+        out_keys = np.full((len(keys), k), -1, dtype="int64")
+        for row in range(len(keys)):
+            candidates = np.unique(inverse[row][found[inverse[row]]])
+            exact = vectors[candidates] @ query_embeddings[row]
+            best = np.argsort(-exact, kind="stable")[:k]
+            out_scores[row, :len(best)] = exact[best]
+            out_keys[row, :len(best)] = unique[candidates[best]]
+        return out_scores, out_keys
+
+    def sparse_search(self, query: str, k: int, chunk_filter: ChunkFilter = None) -> List[Tuple[int, float]]:
+        """
+        Thread-safe BM25 search, limited to chunk_filter's chunks if given.
+        Returns [(chunk key, score), ...], best first.
+        """
+        with self.lock:
+            doc_mask = None
+            if chunk_filter is not None and not chunk_filter.is_empty():
+                resolved = self.resolve_filter(chunk_filter)
+                if resolved["doc_mask"] is None:
+                    resolved["doc_mask"] = self.sparse.doc_mask(resolved["keys"])
+                doc_mask = resolved["doc_mask"]
+            return self.sparse.search(query, k, doc_mask=doc_mask)
 
     # -----------------------------
     # Persistence
@@ -150,25 +966,328 @@ class HybridEmbeddingStore:
     def save(self):
         if self.index is None:
             raise ValueError("No index to save")
+        self._check_writable()
 
-        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with self.lock:
+            if not self._dirty and self.index_path.exists():
+                return
 
-        # Convert Path -> str
-        faiss.write_index(self.index, str(self.index_path))
-        with open(self.metadata_path, "wb") as f:
-            pickle.dump(self.metadata, f)
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
 
-    def load(self):
-        print("Looking for FAISS at:", self.index_path)
-        print("Exists (Path.exists()):", self.index_path.exists())
-        print("Exists (os.path.exists()):", os.path.exists(self.index_path))
+            # Chunk store and BM25 index append only what changed
+            self.chunks.save()
+            self.sparse.save()
+            if self.dedup is not None:
+                self.dedup.save()
+            if self._keeps_vectors():
+                self.vectors.save()
+
+            if self.tombstones > self.index.ntotal // 5:
+                self._compact_tombstones()
+
+            # The FAISS index is written in full only when it was replaced or
+            # its change log has grown too long to replay; otherwise the
+            # changes are appended to the log
+            compact = (
+                self._rewrite_index
+                or not self.index_path.exists()
+                or len(self.index_log) > max(COMPACT_MIN_ENTRIES, COMPACT_FRACTION * self.index.ntotal)
+            )
+            if compact:
+                # Convert Path -> str
+                atomic_write(self.index_path, lambda p: faiss.write_index(self.index, str(p)))
+                self.index_log.clear(self.index.d)
+            self.index_log.save()
+            self._rewrite_index = False
+
+            params = {
+                "index_type": index_type_of(self.index),
+                "search_params": get_search_params(self.index),
+                "tombstones": self.tombstones,
+                "recall_report": self.recall_report,
+            }
+            atomic_write(self.params_path, lambda p: p.write_text(json.dumps(params, indent=2)))
+            self._write_manifest(faiss_written=compact)
+            self._dirty = False
+
+    def _compact_tombstones(self, batch_size: int = 65_536):
+        """
+        Rebuild the HNSW graph from its live vectors once deleted ones are
+        more than a fifth of it: they cost memory and every search
+        over-fetches past them. For a key added more than once the graph
+        holds every copy; reconstruct() returns the latest.
+        """
+        keys = self.chunks.keys()
+        logger.info("Compacting the HNSW graph: %d live of %d vectors", len(keys), self.index.ntotal)
+        index = create_index("hnsw", self.index.d, len(keys), **self.index_options)
+        set_search_params(index, ef_search=get_search_params(self.index)["efSearch"])
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            index.add_with_ids(self.index.reconstruct_batch(batch), batch)
+        self.index = index
+        self.tombstones = 0
+        self._rewrite_index = True
+
+    def _manifest_files(self) -> Dict[str, Path]:
+        files = {
+            "faiss": self.index_path,
+            "faiss_log": self.index_log.path / "meta.json",
+            "params": self.params_path,
+            "chunks": self.chunks.path / "meta.json",
+            "bm25": self.sparse.path / "meta.json",
+            "vectors": self.vectors.path / "meta.json",
+        }
+        if self.dedup is not None:
+            files["dedup"] = self.dedup.path / "meta.json"
+        return files
+
+    def _write_manifest(self, faiss_written: bool = True):
+        """
+        faiss_written=False: the FAISS file is the one the current manifest
+        describes, so its checksum is kept rather than computed again.
+        """
+        files = {
+            name: describe_file(path) for name, path in self._manifest_files().items()
+            if (name != "vectors" or self._keeps_vectors())
+            and (name != "faiss" or faiss_written or not self.manifest)
+        }
+        if "faiss" not in files:
+            files["faiss"] = self.manifest["files"]["faiss"]
+        st_dim = self.st_dim
+        manifest = {
+            "st_model": self.st_model_name,
+            "st_dim": st_dim,
+            "lmstudio_model": self.lmstudio_model if self.lm_client is not None else None,
+            "lm_dim": self.index.d - st_dim,
+            "dim": self.index.d,
+            "vectors": int(self.index.ntotal),
+            "chunks": len(self.chunks),
+            "index_type": index_type_of(self.index),
+            "tombstones": self.tombstones,
+            "files": files,
+        }
+        write_manifest(self.manifest_path, manifest)
+        self.manifest = manifest
+
+    def _check_manifest(self, manifest: Dict):
+        """
+        Before the index is read: configured models and file sizes (plus
+        checksums of the small commit files) against the manifest.
+        """
+        problems = []
+        if manifest["st_model"] != self.st_model_name:
+            problems.append(f"built with ST model '{manifest['st_model']}', configured '{self.st_model_name}'")
+        lm_model = self.lmstudio_model if self.lm_client is not None else None
+        if manifest["lmstudio_model"] != lm_model:
+            problems.append(
+                f"built with LM Studio model '{manifest['lmstudio_model']}', configured '{lm_model}'"
+            )
+        verify = {name: name != "faiss" or self.verify_checksums for name in manifest.get("files", {})}
+        # BM25 / dedup indexes that are gone are rebuilt from the chunk store
+        problems += check_files(manifest, self._manifest_files(), verify, rebuildable=("bm25", "dedup"))
+        if problems:
+            raise ManifestError(
+                f"Index at {self.index_path} does not match {self.manifest_path.name}: "
+                + "; ".join(problems) + ". Rebuild the index (build_index.py)."
+            )
+
+    def check_models(self):
+        """
+        After the ST model is loaded: its dimension, and the LM Studio one
+        where a local embedding cache knows it, against the index. No
+        network calls.
+        """
+        st_dim = self.st_model.get_sentence_embedding_dimension()
+        lm_dim = self.lm_cache.dim if self.lm_cache is not None else None
+        if self.manifest is not None:
+            expected_st, expected_lm = self.manifest["st_dim"], self.manifest["lm_dim"]
+        else:
+            expected_st, expected_lm = st_dim, self.index.d - st_dim
+
+        problems = []
+        service_model = getattr(self.st_model, "model_name", self.st_model_name)
+        if service_model != self.st_model_name:
+            problems.append(f"embedding service runs '{service_model}', configured '{self.st_model_name}'")
+        if st_dim != expected_st:
+            problems.append(f"ST model '{self.st_model_name}' gives {st_dim} dims, index has {expected_st}")
+        if lm_dim is not None and lm_dim != expected_lm:
+            problems.append(f"LM Studio embeddings are {lm_dim} dims, index has {expected_lm}")
+        if expected_st + expected_lm != self.index.d:
+            problems.append(f"FAISS index is {self.index.d} dims, expected {expected_st} + {expected_lm}")
+        if problems:
+            raise ManifestError("Embedding dimension mismatch: " + "; ".join(problems) + ". Rebuild the index.")
+
+    def nbytes_on_disk(self) -> Dict[str, int]:
+        """
+        Bytes on disk per component (faiss, faiss_log, chunks, bm25, dedup, vectors).
+        """
+        sizes = {
+            "faiss": self.index_path.stat().st_size if self.index_path.exists() else 0,
+            "faiss_log": self.index_log.nbytes_on_disk(),
+            "chunks": self.chunks.nbytes_on_disk(),
+            "bm25": self.sparse.nbytes_on_disk(),
+        }
+        if self.dedup is not None:
+            sizes["dedup"] = self.dedup.nbytes_on_disk()
+        if self._keeps_vectors():
+            sizes["vectors"] = self.vectors.nbytes_on_disk()
+        return sizes
 
+    def load(self):
+        logger.debug("Looking for FAISS at %s", self.index_path)
         if not os.path.exists(self.index_path):
             raise FileNotFoundError("FAISS index not found")
-        if not os.path.exists(self.metadata_path):
-            raise FileNotFoundError("Metadata file not found")
+        if not self.chunks.exists() and not os.path.exists(self.metadata_path):
+            raise FileNotFoundError("Chunk store not found")
+
+        stamp = self._disk_stamp()
+        manifest = read_manifest(self.manifest_path)
+        if manifest is not None:
+            self._check_manifest(manifest)
+        else:
+            logger.warning("No manifest at %s, index not checked; the next save writes one", self.manifest_path)
+
+        # Read-only: vectors stay in the shared page cache (see index_factory.read_index),
+        # unless there are logged changes to replay, which a mapped index can't take
+        index_log = IndexLog(self.index_log.path)
+        if index_log.exists():
+            index_log.open()
+        index = read_index(self.index_path, mmap=self.read_only and not index_log.entries)
+        index_log.replay(index)
+        if manifest is not None and (index.d, index.ntotal) != (manifest["dim"], manifest["vectors"]):
+            raise ManifestError(
+                f"FAISS index has {index.ntotal} vectors of {index.d} dims, manifest says "
+                f"{manifest['vectors']} of {manifest['dim']}. Rebuild the index (build_index.py)."
+            )
+
+        if self.read_only:
+            # Fresh readers, swapped in below, so searches use the old ones until then
+            chunks, sparse = ChunkStore(self.chunk_store_path), BM25Index(self.sparse_index_path)
+            if not chunks.exists() or not sparse.exists():
+                raise FileNotFoundError(
+                    "Read-only index needs a chunk store and BM25 index; open it once read-write to migrate"
+                )
+        else:
+            chunks, sparse = self.chunks, self.sparse
+            if not chunks.exists():
+                index = self._migrate_metadata_pickle(index)
+        chunks.open()
+        rebuilt = False
+        if sparse.exists():
+            sparse.open()
+        else:
+            self._build_sparse_from_chunks()
+            rebuilt = True
+        if self.dedup is not None:
+            if self.dedup.exists():
+                self.dedup.open()
+            else:
+                self._build_dedup_from_chunks()
+                rebuilt = True
+        # Fresh reader either way: a rebuild may have changed its dim
+        vectors = VectorStore(self.vector_store_path)
+        if is_compressed(index):
+            if vectors.exists():
+                vectors.open()
+            if vectors.dim != index.d:
+                logger.warning(
+                    "No full-precision vectors for the %s index at %s; results are not rescored until it is rebuilt",
+                    index_type_of(index), self.vector_store_path
+                )
+
+        params = {}
+        if self.params_path.exists():
+            params = json.loads(self.params_path.read_text())
+            search_params = params.get("search_params", {})
+            set_search_params(
+                index,
+                nprobe=search_params.get("nprobe"),
+                ef_search=search_params.get("efSearch")
+            )
+
+        with self.lock:
+            self.index = index
+            self.index_log = index_log
+            self._rewrite_index = False
+            self.chunks = chunks
+            self.sparse = sparse
+            self.vectors = vectors
+            self.manifest = manifest
+            self.tombstones = params.get("tombstones", 0)
+            self.recall_report = params.get("recall_report")
+            self._dirty = False
+            self._loaded_stamp = stamp
+            self.version += 1
+            # Rebuilt indexes have new commit files; keep the manifest in step
+            if rebuilt and manifest is not None:
+                self._write_manifest(faiss_written=False)
+
+    def _disk_stamp(self) -> Tuple[int, int]:
+        # The manifest is written last on every save
+        path = self.manifest_path if self.manifest_path.exists() else self.index_path
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self) -> bool:
+        """
+        Read-only stores: load the index again if a writer saved a new one
+        since. A half-finished save fails the manifest check and is picked
+        up on a later call. Returns True if it reloaded.
+        """
+        try:
+            if self._disk_stamp() == self._loaded_stamp:
+                return False
+        except FileNotFoundError:
+            return False
+        self.load()
+        logger.info("Reloaded index from %s (%d vectors)", self.index_path, self.index.ntotal)
+        return True
+
+    def _build_sparse_from_chunks(self):
+        """
+        Indexes saved before the BM25 index existed: build it from the chunk store.
+        """
+        logger.info("Building BM25 index %s from the chunk store", self.sparse_index_path)
+        self.sparse.reset()
+        for key, meta in self.chunks.items():
+            self.sparse.add(key, meta.get("text", ""))
+        self.sparse.save()
+
+    def _build_dedup_from_chunks(self):
+        """
+        Indexes saved without a dedup index: fingerprint the stored chunks
+        so new uploads are checked against them (existing duplicates stay).
+        """
+        logger.info("Building dedup index %s from the chunk store", self.dedup_index_path)
+        self.dedup.reset()
+        for key, meta in self.chunks.items():
+            sig = self.dedup.hasher.signature(meta.get("text", ""))
+            if sig is not None:
+                self.dedup.add(key, sig)
+        self.dedup.save()
 
-        # Convert Path -> str
-        self.index = faiss.read_index(str(self.index_path))
+    def _migrate_metadata_pickle(self, index: faiss.Index) -> faiss.Index:
+        """
+        One-off conversion of an index saved with metadata.pkl into a chunk store.
+        Those builds never stored chunk text; rebuild to get it into prompts.
+        """
+        logger.info("Migrating %s to chunk store %s", self.metadata_path, self.chunk_store_path)
         with open(self.metadata_path, "rb") as f:
-            self.metadata = pickle.load(f)
+            metadata = pickle.load(f)
+
+        if isinstance(metadata, list):
+            # Oldest layout: positional IndexFlatIP + list of metadata.
+            # Re-key the stored vectors by chunk id so add/delete work.
+            vectors = index.reconstruct_n(0, index.ntotal)
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+            ids = np.array([chunk_key(m["chunk_id"]) for m in metadata], dtype="int64")
+            index.add_with_ids(vectors, ids)
+            metadata = dict(zip(ids.tolist(), metadata))
+            atomic_write(self.index_path, lambda p: faiss.write_index(index, str(p)))
+
+        self.chunks.reset()
+        for key, meta in metadata.items():
+            meta = dict(meta)
+            self.chunks.append(key, {"text": meta.pop("text", ""), "metadata": meta})
+        self.chunks.save()
+        return index
@@ -0,0 +1,295 @@
+# src/embeddings/embed_service.py
+"""
+Embedding service: one process holds the SentenceTransformer and serves
+every API worker over a local socket, so the model is in memory once
+however many workers run.
+
+    python -m src.embeddings.embed_service                        # EMBED_SERVICE from config
+    python -m src.embeddings.embed_service --address data/run/embed.sock
+
+Workers set the same EMBED_SERVICE; HybridEmbeddingStore then uses
+EmbeddingServiceClient in place of the model. Requests that arrive within
+`max_wait_ms` of each other are encoded in one batch.
+
+An address is a Unix socket path, or host:port for TCP.
+Wire format, both ways: 4-byte big-endian length + JSON header; an encode
+reply is followed by rows * dim little-endian float32 values.
+    {"op": "info"}                    -> {"model", "dim", "max_seq_length"}
+    {"op": "encode", "texts": [...]}  -> {"rows", "dim"} + vectors
+    failures                          -> {"error": "..."}
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+TCP_ADDRESS_RE = re.compile(r"^(?P<host>[\w.-]+):(?P<port>\d+)$")
+HEADER = struct.Struct(">I")
+
+
+class EmbeddingServiceError(RuntimeError):
+    pass
+
+
+def parse_address(address: str) -> Union[Tuple[str, int], str]:
+    """
+    (host, port) for "host:port", otherwise a Unix socket path.
+    """
+    match = TCP_ADDRESS_RE.match(address)
+    if match:
+        return match["host"], int(match["port"])
+    return address
+
+
+def pack(header: Dict, payload: bytes = b"") -> bytes:
+    body = json.dumps(header).encode("utf-8")
+    return HEADER.pack(len(body)) + body + payload
+
+
+# -----------------------------
+# Server
+# -----------------------------
+class EmbeddingServer:
+    def __init__(self, model_name: str, address: str, max_batch: int = 64, max_wait_ms: float = 2.0):
+        self.model_name = model_name
+        self.address = address
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        # One encode at a time; batching is what buys throughput
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-service")
+        self._queue = None
+
+        self.batches = 0
+        self.texts = 0
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False).astype("<f4")
+
+    async def serve_forever(self):
+        self._queue = asyncio.Queue()
+        worker = asyncio.ensure_future(self._run())
+        target = parse_address(self.address)
+        if isinstance(target, tuple):
+            server = await asyncio.start_server(self._handle, *target)
+        else:
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            if os.path.exists(target):
+                os.unlink(target)  # stale socket of a previous run
+            server = await asyncio.start_unix_server(self._handle, target)
+        logger.info("Embedding service for %s (%d dims) on %s", self.model_name, self.dim, self.address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            worker.cancel()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                except asyncio.IncompleteReadError:
+                    break
+                request = json.loads(await reader.readexactly(length))
+
+                if request.get("op") == "info":
+                    writer.write(pack({
+                        "model": self.model_name,
+                        "dim": self.dim,
+                        "max_seq_length": getattr(self.model, "max_seq_length", None),
+                    }))
+                elif request.get("op") == "encode":
+                    future = asyncio.get_running_loop().create_future()
+                    await self._queue.put((request["texts"], future))
+                    try:
+                        vectors = await future
+                        writer.write(pack({"rows": len(vectors), "dim": self.dim}, vectors.tobytes()))
+                    except Exception as e:
+                        writer.write(pack({"error": f"{type(e).__name__}: {e}"}))
+                else:
+                    writer.write(pack({"error": f"unknown op {request.get('op')!r}"}))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        n_texts = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while n_texts < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            n_texts += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for item in batch for text in item[0]]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self._encode, texts) if texts else None
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            start = 0
+            for item_texts, future in batch:
+                end = start + len(item_texts)
+                if not future.done():
+                    future.set_result(
+                        vectors[start:end] if vectors is not None else np.zeros((0, self.dim), dtype="<f4")
+                    )
+                start = end
+
+
+# -----------------------------
+# Client
+# -----------------------------
+class EmbeddingServiceClient:
+    """
+    Stand-in for a SentenceTransformer, backed by an EmbeddingServer:
+    encode(), get_sentence_embedding_dimension(), max_seq_length.
+    One connection per thread, reopened once if it was dropped.
+    """
+    tokenizer = None  # chunkers fall back to word counts
+
+    def __init__(self, address: str, timeout: float = 30.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+        self._info = None
+
+    def _connect(self) -> socket.socket:
+        target = parse_address(self.address)
+        if isinstance(target, tuple):
+            sock = socket.create_connection(target, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(target)
+        return sock
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, n: int) -> bytes:
+        buffer = bytearray()
+        while len(buffer) < n:
+            chunk = sock.recv(n - len(buffer))
+            if not chunk:
+                raise ConnectionError("embedding service closed the connection")
+            buffer.extend(chunk)
+        return bytes(buffer)
+
+    def _exchange(self, sock: socket.socket, request: Dict) -> Tuple[Dict, bytes]:
+        sock.sendall(pack(request))
+        (length,) = HEADER.unpack(self._recv_exact(sock, HEADER.size))
+        reply = json.loads(self._recv_exact(sock, length))
+        payload = b""
+        if "rows" in reply:
+            payload = self._recv_exact(sock, reply["rows"] * reply["dim"] * 4)
+        return reply, payload
+
+    def _call(self, request: Dict) -> Tuple[Dict, bytes]:
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            fresh = sock is None
+            try:
+                if fresh:
+                    sock = self._local.sock = self._connect()
+                reply, payload = self._exchange(sock, request)
+                break
+            except socket.timeout as e:
+                self._close_local()
+                raise EmbeddingServiceError(f"embedding service {self.address} timed out") from e
+            except OSError as e:
+                self._close_local()
+                # A pooled connection may have gone stale (service restart): retry once
+                if fresh or attempt:
+                    raise EmbeddingServiceError(f"embedding service {self.address}: {e}") from e
+
+        if "error" in reply:
+            raise EmbeddingServiceError(reply["error"])
+        return reply, payload
+
+    def _close_local(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    @property
+    def info(self) -> Dict:
+        if self._info is None:
+            self._info, _ = self._call({"op": "info"})
+        return self._info
+
+    @property
+    def model_name(self) -> str:
+        return self.info["model"]
+
+    @property
+    def max_seq_length(self) -> Optional[int]:
+        return self.info.get("max_seq_length")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.info["dim"]
+
+    def encode(self, texts, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype="float32")
+        reply, payload = self._call({"op": "encode", "texts": texts})
+        vectors = np.frombuffer(payload, dtype="<f4").reshape(reply["rows"], reply["dim"]).astype("float32")
+        return vectors[0] if single else vectors
+
+
+def main(argv=None):
+    from src.utils import config
+
+    parser = argparse.ArgumentParser(description="Serve SentenceTransformer embeddings to API workers")
+    parser.add_argument("--address", default=config.EMBED_SERVICE, help="Unix socket path or host:port")
+    parser.add_argument("--model", default=config.ST_MODEL_NAME)
+    parser.add_argument("--max-batch", type=int, default=config.EMBED_SERVICE_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=config.EMBED_SERVICE_MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+    if not args.address:
+        parser.error("no address: pass --address or set EMBED_SERVICE")
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    server = EmbeddingServer(args.model, args.address, args.max_batch, args.max_wait_ms)
+    server._encode(["warm-up"])
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# src/embeddings/index_factory.py
+"""
+FAISS index construction for the hybrid store.
+
+Supported index types:
+    flat      exact IndexFlatIP (default, wrapped in IndexIDMap2)
+    hnsw      IndexHNSWFlat graph (wrapped in IndexIDMap2, no true delete:
+              deleted ids are tombstoned and the graph rebuilt on save once
+              they pass a fifth of it)
+    ivf_flat  IndexIVFFlat, trained coarse quantizer, ids stored natively
+    ivf_pq    IndexIVFPQ, product-quantized vectors, ids stored natively
+    sq8       IndexScalarQuantizer, 1 byte per dimension (wrapped in IndexIDMap2)
+    fp16      IndexScalarQuantizer, 2 bytes per dimension (wrapped in IndexIDMap2)
+
+The compressed types (sq8, fp16, ivf_pq) are meant to be paired with the
+full-precision vectors of vector_store.VectorStore, which rescore the
+candidates they return (see HybridEmbeddingStore.search).
+"""
+import logging
+import math
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq8", "fp16")
+# Types whose stored vectors are lossy
+COMPRESSED_TYPES = ("ivf_pq", "sq8", "fp16")
+
+SCALAR_QUANTIZERS = {
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+}
+
+# Training points faiss wants per IVF centroid / PQ codebook entry
+MIN_POINTS_PER_CENTROID = 39
+PQ_CODEBOOK_SIZE = 256
+MAX_TRAINING_POINTS_PER_CENTROID = 256
+# sq8 only learns a per-dimension min / max
+MAX_SQ_TRAINING_POINTS = 65536
+
+
+def default_nlist(n_vectors: int) -> int:
+    """
+    ~4 * sqrt(n) inverted lists, capped so every list gets enough training points.
+    """
+    nlist = int(4 * math.sqrt(max(n_vectors, 1)))
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def pq_subquantizers(dim: int, target: int) -> int:
+    """
+    Largest divisor of dim that is <= target (PQ needs dim % m == 0).
+    """
+    for m in range(min(target, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def min_training_size(index_type: str) -> int:
+    if index_type == "ivf_flat":
+        return MIN_POINTS_PER_CENTROID
+    if index_type == "ivf_pq":
+        return PQ_CODEBOOK_SIZE * MIN_POINTS_PER_CENTROID // 4
+    if index_type == "sq8":
+        return 1  # any sample will do, but a larger one gives better value ranges
+    return 0
+
+
+def create_index(
+    index_type: str,
+    dim: int,
+    n_vectors: int,
+    hnsw_m: int = 32,
+    hnsw_ef_construction: int = 200,
+    nlist: Optional[int] = None,
+    pq_m: int = 64,
+    pq_nbits: int = 8
+) -> faiss.Index:
+    """
+    Create an empty (untrained) inner-product index that accepts add_with_ids.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    if index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = hnsw_ef_construction
+        return faiss.IndexIDMap2(hnsw)
+
+    if index_type in SCALAR_QUANTIZERS:
+        sq = faiss.IndexScalarQuantizer(dim, SCALAR_QUANTIZERS[index_type], faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexIDMap2(sq)
+
+    nlist = nlist or default_nlist(n_vectors)
+    quantizer = faiss.IndexFlatIP(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    else:
+        m = pq_subquantizers(dim, pq_m)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+
+    # Lets reconstruct() work with our sparse 63-bit chunk keys
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray, seed: int = 1234) -> np.ndarray:
+    """
+    Train IVF and sq8 indexes on a random sample of `vectors`.
+    Returns the row positions used for training (empty for untrained types).
+    """
+    if index.is_trained:
+        return np.zeros(0, dtype="int64")
+
+    ivf = faiss.try_extract_index_ivf(index)
+    max_points = ivf.nlist * MAX_TRAINING_POINTS_PER_CENTROID if ivf is not None else MAX_SQ_TRAINING_POINTS
+    rng = np.random.default_rng(seed)
+    if len(vectors) > max_points:
+        rows = np.sort(rng.choice(len(vectors), max_points, replace=False))
+    else:
+        rows = np.arange(len(vectors))
+
+    index.train(np.ascontiguousarray(vectors[rows]))
+    return rows
+
+
+def read_index(path, mmap: bool = False) -> faiss.Index:
+    """
+    Read an index; with mmap, vector storage (flat codes, HNSW storage,
+    IVF lists) stays in the file's page cache, shared by every process
+    that maps it. Such an index is read-only: adding to it would fault.
+    """
+    if not mmap:
+        return faiss.read_index(str(path))
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is None:
+        logger.warning("faiss %s can't memory-map flat storage, reading %s into memory", faiss.__version__, path)
+        return faiss.read_index(str(path), faiss.IO_FLAG_READ_ONLY)
+    return faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY)
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexIDMap) or isinstance(index, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(inner, faiss.IndexScalarQuantizer):
+            for name, qtype in SCALAR_QUANTIZERS.items():
+                if inner.sq.qtype == qtype:
+                    return name
+    return "flat"
+
+
+def is_compressed(index: faiss.Index) -> bool:
+    return index_type_of(index) in COMPRESSED_TYPES
+
+
+def bytes_per_vector(index: faiss.Index) -> int:
+    """
+    Approximate RAM per stored vector: its code, its 8-byte id and, for
+    HNSW, the level-0 graph links.
+    """
+    index_type = index_type_of(index)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.extract_index_ivf(index).code_size + 8
+    inner = faiss.downcast_index(index.index) if hasattr(index, "index") else index
+    if index_type == "hnsw":
+        return faiss.downcast_index(inner.storage).code_size + inner.hnsw.nb_neighbors(0) * 4 + 8
+    return inner.code_size + 8
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    return index_type_of(index) != "hnsw"
+
+
+def get_search_params(index: faiss.Index) -> Dict[str, int]:
+    index_type = index_type_of(index)
+    if index_type == "hnsw":
+        return {"efSearch": faiss.downcast_index(index.index).hnsw.efSearch}
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return {"nprobe": index.nprobe}
+    return {}
+
+
+def set_search_params(index: faiss.Index, nprobe: int = None, ef_search: int = None):
+    """
+    Persistent defaults, written into the index file by faiss.write_index.
+    """
+    index_type = index_type_of(index)
+    if index_type == "hnsw" and ef_search:
+        faiss.downcast_index(index.index).hnsw.efSearch = ef_search
+    elif index_type in ("ivf_flat", "ivf_pq") and nprobe:
+        index.nprobe = nprobe
+
+
+def make_search_params(
+    index: faiss.Index,
+    nprobe: int = None,
+    ef_search: int = None,
+    sel: faiss.IDSelector = None
+):
+    """
+    Per-query override, thread-safe (does not touch the shared index).
+    `sel` restricts the search to the chunk keys it selects; IndexIDMap2
+    translates it to the wrapped index's positions.
+    """
+    index_type = index_type_of(index)
+    if index_type == "hnsw" and (ef_search or sel is not None):
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or get_search_params(index)["efSearch"])
+    elif index_type in ("ivf_flat", "ivf_pq") and (nprobe or sel is not None):
+        params = faiss.SearchParametersIVF(nprobe=nprobe or index.nprobe)
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if sel is not None:
+        params.sel = sel
+    return params
+
+
+def recall_at_k(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    query_rows: np.ndarray,
+    k: int = 10,
+    rescore_factor: int = 0
+) -> float:
+    """
+    Mean recall@k of `index` against exact brute-force inner product search
+    over `vectors`, using `query_rows` of the corpus as queries.
+    rescore_factor > 0 fetches k * rescore_factor candidates and keeps the
+    k best by exact score, as a store with full-precision vectors does.
+    """
+    queries = np.ascontiguousarray(vectors[query_rows])
+    _, exact = faiss.knn(queries, vectors, k, metric=faiss.METRIC_INNER_PRODUCT)
+    if not rescore_factor:
+        _, approx = index.search(queries, k)
+    else:
+        _, candidates = index.search(queries, min(k * rescore_factor, index.ntotal))
+        order = np.argsort(ids)
+        approx = np.full((len(queries), k), -1, dtype="int64")
+        for q, row_keys in enumerate(candidates):
+            row_keys = row_keys[row_keys >= 0]
+            rows = order[np.searchsorted(ids, row_keys, sorter=order)]
+            best = np.argsort(-(vectors[rows] @ queries[q]), kind="stable")[:k]
+            approx[q, :len(best)] = row_keys[best]
+
+    exact_ids = ids[exact]
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact_ids.tolist(), approx.tolist()))
+    return hits / float(len(query_rows) * k)
@@ -0,0 +1,131 @@
+# src/embeddings/index_log.py
+import json
+from pathlib import Path
+from typing import List, Tuple
+
+import faiss
+import numpy as np
+
+from src.utils.fileio import append_file, atomic_write, dir_nbytes
+
+ADD, REMOVE = 1, 0
+
+# The index is written in full again (and the log cleared) once the log
+# holds more than max(COMPACT_MIN_ENTRIES, COMPACT_FRACTION * vectors) entries
+COMPACT_MIN_ENTRIES = 10_000
+COMPACT_FRACTION = 0.1
+
+
+class IndexLog:
+    """
+    Changes made to the FAISS index since its file was last written in
+    full: vectors added (with their ids) and ids removed, in order. A save
+    appends them here instead of rewriting the whole index, and load()
+    replays them onto the index read from the file.
+
+    Files, append-only like the chunk store (meta.json commits a save):
+        ops.bin      uint8 per entry, ADD or REMOVE
+        ids.bin      int64 per entry
+        vectors.f32  one float32 row per ADD
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._reset_state()
+
+    def _reset_state(self, dim: int = 0):
+        self.dim = dim
+        self.entries = 0
+        self.adds = 0
+        # (op, ids, vectors or None) not yet on disk
+        self._pending: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        self._cleared = False
+
+    def exists(self) -> bool:
+        return (self.path / "meta.json").exists()
+
+    def open(self):
+        meta = json.loads((self.path / "meta.json").read_text())
+        self._reset_state(meta["dim"])
+        self.entries = meta["entries"]
+        self.adds = meta["adds"]
+
+    def __len__(self) -> int:
+        return self.entries + sum(len(ids) for _, ids, _ in self._pending)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending or self._cleared)
+
+    # -----------------------------
+    # Mutation (in memory until save)
+    # -----------------------------
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        if self.dim and vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dim {vectors.shape[1]} != index log dim {self.dim}")
+        self.dim = vectors.shape[1]
+        self._pending.append((ADD, np.array(ids, dtype="int64"), np.array(vectors, dtype="float32")))
+
+    def remove(self, ids: np.ndarray):
+        self._pending.append((REMOVE, np.array(ids, dtype="int64"), None))
+
+    def clear(self, dim: int):
+        """
+        The index was just written in full: drop every entry on the next save().
+        """
+        self._reset_state(dim)
+        self._cleared = True
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        ops = [np.full(len(ids), op, dtype="uint8") for op, ids, _ in self._pending]
+        ids = [ids for _, ids, _ in self._pending]
+        vectors = [v for _, _, v in self._pending if v is not None]
+        ops = np.concatenate(ops) if ops else np.zeros(0, dtype="uint8")
+        ids = np.concatenate(ids) if ids else np.zeros(0, dtype="int64")
+        vectors = np.concatenate(vectors) if vectors else np.zeros((0, self.dim), dtype="float32")
+
+        # 1. Append after the committed entries (a cleared log starts over)
+        append_file(self.path / "ops.bin", self.entries, ops.tobytes())
+        append_file(self.path / "ids.bin", self.entries * 8, ids.tobytes())
+        append_file(self.path / "vectors.f32", self.adds * self.dim * 4, vectors.tobytes())
+        self.entries += len(ops)
+        self.adds += len(vectors)
+
+        # 2. Commit
+        meta = {"entries": self.entries, "adds": self.adds, "dim": self.dim}
+        atomic_write(self.path / "meta.json", lambda p: p.write_text(json.dumps(meta)))
+        self._pending = []
+        self._cleared = False
+
+    def replay(self, index: faiss.Index):
+        """
+        Apply the committed entries, in order, to the index read from the
+        file this log started from. Runs of one kind are applied as one batch.
+        """
+        if not self.entries:
+            return
+        ops = np.fromfile(self.path / "ops.bin", dtype="uint8", count=self.entries)
+        ids = np.fromfile(self.path / "ids.bin", dtype="int64", count=self.entries)
+        vectors = (
+            np.memmap(self.path / "vectors.f32", dtype="float32", mode="r", shape=(self.adds, self.dim))
+            if self.adds else None
+        )
+
+        bounds = (np.flatnonzero(np.diff(ops)) + 1).tolist()
+        added = 0
+        for start, end in zip([0] + bounds, bounds + [len(ops)]):
+            if ops[start] == ADD:
+                n = end - start
+                index.add_with_ids(np.ascontiguousarray(vectors[added:added + n]), ids[start:end])
+                added += n
+            else:
+                index.remove_ids(ids[start:end])
+
+    def nbytes_on_disk(self) -> int:
+        return dir_nbytes(self.path)
@@ -0,0 +1,298 @@
+# src/embeddings/lmstudio_client.py
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+import httpx
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying; other 4xx mean the request itself is bad
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LMStudioEmbeddingError(RuntimeError):
+    """
+    Raised when some batches still fail after all retries.
+    Carries the partially filled matrix and the row indices that are missing.
+    """
+    def __init__(self, message: str, embeddings: Optional[np.ndarray], failed: List[int]):
+        super().__init__(message)
+        self.embeddings = embeddings
+        self.failed = failed
+
+
+class LMStudioEmbeddingClient:
+    """
+    Pooled, batched client for LM Studio's OpenAI-compatible /v1/embeddings.
+
+    - one keep-alive Session shared by all calls
+    - texts are split into `batch_size` batches
+    - at most `max_in_flight` batches are sent concurrently
+    - each batch is retried with exponential backoff on its own
+    """
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        batch_size: int = 64,
+        max_in_flight: int = 4,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+        timeout: tuple = (10, 60)
+    ):
+        self.url = f"{base_url.rstrip('/')}/v1/embeddings"
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="lmstudio-embed"
+        )
+
+        # Async twin of the session, created on first use inside the event loop
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_semaphore: Optional[asyncio.Semaphore] = None
+
+        # Last seen embedding dimension (used to size zero rows on failure)
+        self.dim: Optional[int] = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "texts": 0,
+            "retries": 0,
+            "failed_batches": 0,
+            "failed_texts": 0,
+        }
+
+    # -----------------------------
+    # Stats
+    # -----------------------------
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    # -----------------------------
+    # Requests
+    # -----------------------------
+    def _post_batch(self, texts: List[str]) -> np.ndarray:
+        resp = self.session.post(
+            self.url,
+            json={"model": self.model, "input": texts},
+            timeout=self.timeout
+        )
+        resp.raise_for_status()
+        return self._parse_response(resp.json(), len(texts))
+
+    def _parse_response(self, body: Dict, n_texts: int) -> np.ndarray:
+        data = body.get("data")
+        if not isinstance(data, list) or len(data) != n_texts:
+            got = len(data) if isinstance(data, list) else "no"
+            raise ValueError(f"LM Studio returned {got} embeddings, expected {n_texts}")
+
+        # Responses carry an explicit index; don't trust list order
+        data = sorted(data, key=lambda item: item.get("index", 0))
+        emb_list = [item.get("embedding") for item in data]
+        if any(e is None for e in emb_list):
+            raise ValueError("LM Studio returned an item without an embedding")
+
+        return np.asarray(emb_list, dtype="float32").reshape(n_texts, -1)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        attempt = 0
+        while True:
+            self._count(requests=1)
+            try:
+                embs = self._post_batch(texts)
+                self._count(texts=len(texts))
+                self.dim = embs.shape[1]
+                return embs
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    raise
+                error = e
+            except (requests.ConnectionError, requests.Timeout, ValueError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                error = e
+
+            delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() * 0.1)
+            logger.warning(
+                "LM Studio batch of %d failed (%s), retry %d/%d in %.2fs",
+                len(texts), error, attempt + 1, self.max_retries, delay
+            )
+            self._count(retries=1)
+            attempt += 1
+            time.sleep(delay)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts in bounded concurrent batches, preserving order.
+        Raises LMStudioEmbeddingError if any batch still fails after retries.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype="float32")
+
+        starts = range(0, len(texts), self.batch_size)
+        if len(starts) == 1:
+            # Single batch (e.g. a query): skip the executor hop
+            futures = None
+            batches = [(0, texts)]
+        else:
+            batches = [(s, texts[s:s + self.batch_size]) for s in starts]
+            futures = [self.executor.submit(self._embed_batch, b) for _, b in batches]
+
+        results: List[Optional[np.ndarray]] = []
+        failed: List[int] = []
+        last_error = None
+        for i, (start, batch) in enumerate(batches):
+            try:
+                embs = futures[i].result() if futures else self._embed_batch(batch)
+                results.append(embs)
+            except Exception as e:
+                last_error = e
+                results.append(None)
+                failed.extend(range(start, start + len(batch)))
+                self._count(failed_batches=1, failed_texts=len(batch))
+                logger.error("LM Studio batch at %d (%d texts) failed: %s", start, len(batch), e)
+
+        if not failed:
+            return np.concatenate(results, axis=0)
+
+        partial = None
+        if self.dim is not None:
+            partial = np.zeros((len(texts), self.dim), dtype="float32")
+            for (start, batch), embs in zip(batches, results):
+                if embs is not None:
+                    partial[start:start + len(batch)] = embs
+
+        raise LMStudioEmbeddingError(
+            f"{len(failed)}/{len(texts)} texts failed to embed: {last_error}",
+            partial,
+            failed
+        )
+
+    # -----------------------------
+    # Async (API request path)
+    # -----------------------------
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            connect, read = self.timeout
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(
+                    max_connections=self.max_in_flight,
+                    max_keepalive_connections=self.max_in_flight
+                )
+            )
+            self._async_semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._async_client
+
+    async def _aembed_batch(self, texts: List[str]) -> np.ndarray:
+        client = self._get_async_client()
+        attempt = 0
+        while True:
+            self._count(requests=1)
+            try:
+                async with self._async_semaphore:
+                    resp = await client.post(
+                        self.url, json={"model": self.model, "input": texts}
+                    )
+                resp.raise_for_status()
+                embs = self._parse_response(resp.json(), len(texts))
+                self._count(texts=len(texts))
+                self.dim = embs.shape[1]
+                return embs
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    raise
+                error = e
+            except (httpx.TransportError, ValueError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                error = e
+
+            delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() * 0.1)
+            logger.warning(
+                "LM Studio batch of %d failed (%s), retry %d/%d in %.2fs",
+                len(texts), error, attempt + 1, self.max_retries, delay
+            )
+            self._count(retries=1)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """
+        Async embed() for the event loop: same batching, retries and errors,
+        with at most max_in_flight requests open across all callers.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype="float32")
+
+        batches = [(s, texts[s:s + self.batch_size]) for s in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(
+            *(self._aembed_batch(b) for _, b in batches), return_exceptions=True
+        )
+
+        failed: List[int] = []
+        last_error = None
+        for (start, batch), embs in zip(batches, results):
+            if isinstance(embs, asyncio.CancelledError):
+                raise embs
+            if isinstance(embs, Exception):
+                last_error = embs
+                failed.extend(range(start, start + len(batch)))
+                self._count(failed_batches=1, failed_texts=len(batch))
+                logger.error("LM Studio batch at %d (%d texts) failed: %s", start, len(batch), embs)
+
+        if not failed:
+            return np.concatenate(results, axis=0)
+
+        partial = None
+        if self.dim is not None:
+            partial = np.zeros((len(texts), self.dim), dtype="float32")
+            for (start, batch), embs in zip(batches, results):
+                if not isinstance(embs, Exception):
+                    partial[start:start + len(batch)] = embs
+
+        raise LMStudioEmbeddingError(
+            f"{len(failed)}/{len(texts)} texts failed to embed: {last_error}",
+            partial,
+            failed
+        )
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,98 @@
+# src/embeddings/manifest.py
+"""
+Index manifest: what an index was built with, written next to the FAISS
+index on every save and checked on load, without loading a model or
+calling LM Studio.
+
+    {
+      "version": 1,
+      "st_model": "all-MiniLM-L6-v2", "st_dim": 384,
+      "lmstudio_model": "...", "lm_dim": 768,
+      "dim": 1152, "vectors": 120000, "chunks": 118500,
+      "index_type": "hnsw",
+      "files": {"faiss": {"bytes": ..., "blake2b": ...}, "chunks": {...}, ...}
+    }
+
+The FAISS file is hashed whenever it is written in full; saves in between
+append to its change log (see index_log.py) and keep the old hash. The
+log, chunk store, BM25 and dedup indexes are append-only and commit
+through their meta.json; hashing that commit point pins their contents
+without re-reading the data files on every upload.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.fileio import atomic_write
+
+MANIFEST_VERSION = 1
+
+
+class ManifestError(ValueError):
+    """
+    The index on disk does not match its manifest or the configured models.
+    """
+
+
+def file_checksum(path: Path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe_file(path: Path) -> Optional[Dict]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    return {"bytes": path.stat().st_size, "blake2b": file_checksum(path)}
+
+
+def write_manifest(path: Path, manifest: Dict):
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **manifest,
+    }
+    atomic_write(path, lambda p: p.write_text(json.dumps(manifest, indent=2)))
+
+
+def read_manifest(path: Path) -> Optional[Dict]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    manifest = json.loads(path.read_text())
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ManifestError(
+            f"Index manifest {path} has version {manifest.get('version')}, "
+            f"expected {MANIFEST_VERSION}; rebuild the index"
+        )
+    return manifest
+
+
+def check_files(
+    manifest: Dict,
+    files: Dict[str, Path],
+    verify_checksums: Dict[str, bool],
+    rebuildable: Tuple[str, ...] = ()
+) -> List[str]:
+    """
+    Problems with the files listed in the manifest: missing (unless
+    rebuildable), other size, or (where verify_checksums[name]) other contents.
+    """
+    problems = []
+    for name, expected in manifest.get("files", {}).items():
+        if expected is None or name not in files:
+            continue
+        path = Path(files[name])
+        if not path.exists():
+            if name not in rebuildable:
+                problems.append(f"{name}: {path} is missing")
+        elif path.stat().st_size != expected["bytes"]:
+            problems.append(f"{name}: {path} is {path.stat().st_size} bytes, manifest says {expected['bytes']}")
+        elif verify_checksums.get(name) and file_checksum(path) != expected["blake2b"]:
+            problems.append(f"{name}: {path} checksum differs from the manifest")
+    return problems
@@ -0,0 +1,170 @@
+# src/embeddings/sorted_runs.py
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# The delta run is merged into the base once it holds more than
+# max(DELTA_MERGE_MIN, DELTA_MERGE_FRACTION * base) pairs
+DELTA_MERGE_MIN = 1 << 16
+DELTA_MERGE_FRACTION = 0.125
+
+
+class SortedRuns:
+    """
+    Sorted value -> row pairs over an append-only table (chunk key -> row of
+    the chunk / vector stores and the dedup index, LSH bucket -> row),
+    kept as two memory-mapped runs so a save does not rewrite them all:
+
+        base   every pair as of the last merge
+        delta  pairs of the rows appended since
+
+    save() writes a new delta (or, once the delta has outgrown the base by
+    the ratio above, a new merged base) under a fresh file name, and the
+    table's meta.json commits the names with the rest of the save, so a
+    committed run is never overwritten. Pairs of rows that are dead when a
+    run is written are left out of it; rows deleted later are still in the
+    runs, so callers check their live flag.
+    """
+    def __init__(self, prefix: str, dtype: str):
+        self.prefix = prefix  # run files: <prefix><n>.values.bin / <prefix><n>.rows.bin
+        self.dtype = dtype
+        self.reset()
+
+    def reset(self):
+        self.runs: Dict[str, Optional[Dict]] = {"base": None, "delta": None}
+        self.next_run = 0
+        self._maps: Dict[str, tuple] = {}
+        self._stale: List[str] = []
+
+    # -----------------------------
+    # Files
+    # -----------------------------
+    def state(self) -> Dict:
+        """
+        What the table's meta.json records about the runs.
+        """
+        return {"runs": self.runs, "next_run": self.next_run}
+
+    @staticmethod
+    def legacy_state(values_file: str, rows_file: str, length: int) -> Dict:
+        """
+        State of a table saved before runs: one fully rewritten sorted index.
+        """
+        base = {"values": values_file, "rows": rows_file, "length": length} if length else None
+        return {"runs": {"base": base, "delta": None}, "next_run": 0}
+
+    def open(self, path: Path, state: Dict):
+        self.runs = {name: state["runs"].get(name) for name in ("base", "delta")}
+        self.next_run = state["next_run"]
+        self._stale = []
+        self._maps = {}
+        for name, run in self.runs.items():
+            if run is None:
+                continue
+            shape = (run["length"],)
+            self._maps[name] = (
+                np.memmap(path / run["values"], dtype=self.dtype, mode="r", shape=shape),
+                np.memmap(path / run["rows"], dtype="int64", mode="r", shape=shape),
+            )
+
+    def close(self):
+        self._maps = {}
+
+    def _arrays(self, name: str):
+        if name in self._maps:
+            return self._maps[name]
+        return np.zeros(0, dtype=self.dtype), np.zeros(0, dtype="int64")
+
+    # -----------------------------
+    # Lookup
+    # -----------------------------
+    def __len__(self) -> int:
+        return sum(run["length"] for run in self.runs.values() if run is not None)
+
+    def lookup(self, values: np.ndarray) -> np.ndarray:
+        """
+        Row of each value (values are unique among live rows), -1 where
+        there is none. The delta is newer, so it wins over the base.
+        """
+        values = np.asarray(values, dtype=self.dtype)
+        rows = np.full(len(values), -1, dtype="int64")
+        for name in ("base", "delta"):
+            sorted_values, sorted_rows = self._arrays(name)
+            if not len(sorted_values) or not len(values):
+                continue
+            pos = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+            found = np.asarray(sorted_values[pos]) == values
+            rows[found] = sorted_rows[pos[found]]
+        return rows
+
+    def find_all(self, value) -> np.ndarray:
+        """
+        Every row paired with `value` (LSH buckets hold many).
+        """
+        value = np.asarray(value, dtype=self.dtype)
+        parts = []
+        for name in ("base", "delta"):
+            sorted_values, sorted_rows = self._arrays(name)
+            if len(sorted_values):
+                lo = int(np.searchsorted(sorted_values, value, side="left"))
+                hi = int(np.searchsorted(sorted_values, value, side="right"))
+                parts.append(np.asarray(sorted_rows[lo:hi]))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype="int64")
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def _write_run(self, target: Path, values: np.ndarray, rows: np.ndarray) -> Optional[Dict]:
+        if not len(values):
+            return None
+        order = np.argsort(values, kind="stable")
+        name = f"{self.prefix}{self.next_run}"
+        self.next_run += 1
+        run = {"values": f"{name}.values.bin", "rows": f"{name}.rows.bin", "length": int(len(values))}
+        values[order].astype(self.dtype).tofile(target / run["values"])
+        rows[order].astype("int64").tofile(target / run["rows"])
+        return run
+
+    def save(self, target: Path, values: np.ndarray, rows: np.ndarray, live: np.ndarray) -> Dict:
+        """
+        Add the pairs of newly appended rows, writing the new runs in
+        `target`. `live` is the table's live flag per row, after this
+        save's deletions. Returns the state to commit; call cleanup() once
+        meta.json is written.
+        """
+        delta_values, delta_rows = (np.asarray(a) for a in self._arrays("delta"))
+        delta_values = np.concatenate([delta_values, np.asarray(values, dtype=self.dtype)])
+        delta_rows = np.concatenate([delta_rows, np.asarray(rows, dtype="int64")])
+        keep = np.asarray(live[delta_rows]) == 1 if len(delta_rows) else np.zeros(0, dtype=bool)
+        delta_values, delta_rows = delta_values[keep], delta_rows[keep]
+
+        base = self.runs["base"]
+        base_length = base["length"] if base is not None else 0
+        old = [run for run in self.runs.values() if run is not None]
+        if len(delta_values) > max(DELTA_MERGE_MIN, DELTA_MERGE_FRACTION * base_length):
+            base_values, base_rows = (np.asarray(a) for a in self._arrays("base"))
+            if len(base_rows):
+                alive = np.asarray(live[base_rows]) == 1
+                base_values, base_rows = base_values[alive], base_rows[alive]
+            merged = self._write_run(
+                target, np.concatenate([base_values, delta_values]), np.concatenate([base_rows, delta_rows])
+            )
+            self.runs = {"base": merged, "delta": None}
+        else:
+            self.runs = {"base": base, "delta": self._write_run(target, delta_values, delta_rows)}
+
+        current = [run for run in self.runs.values() if run is not None]
+        self._stale = [
+            file for run in old if run not in current for file in (run["values"], run["rows"])
+        ]
+        return self.state()
+
+    def cleanup(self, path: Path):
+        """
+        Delete the files of runs replaced by the last save (after its commit).
+        """
+        self.close()
+        for file in self._stale:
+            (path / file).unlink(missing_ok=True)
+        self._stale = []
@@ -0,0 +1,447 @@
+# src/embeddings/sparse_index.py
+import json
+import math
+import re
+import shutil
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.utils.fileio import append_file, atomic_write, dir_nbytes, swap_dir
+
+TOKEN_RE = re.compile(r"\w+(?:[./:\-]\w+)*")
+SEPARATOR_RE = re.compile(r"[./:\-]")
+
+# Merge delta segments once there are this many, or once this share of docs is deleted
+MAX_SEGMENTS = 8
+MAX_DEAD_FRACTION = 0.2
+MAX_TF = np.iinfo("uint16").max
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Identifiers such as "12.3", "2016/679" or
+    "art-5" are kept whole *and* split, so both spellings match.
+    """
+    tokens = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if SEPARATOR_RE.search(token):
+            tokens.extend(part for part in SEPARATOR_RE.split(token) if part)
+    return tokens
+
+
+class Segment:
+    """
+    Immutable posting lists in CSR form, memory-mapped:
+        terms    sorted global term ids present in the segment (int32)
+        offsets  postings of terms[i] are docs/tfs[offsets[i]:offsets[i + 1]] (int64)
+        docs     doc numbers, ascending within a term (uint32)
+        tfs      term frequencies (uint16)
+    """
+    FILES = {"terms": "int32", "offsets": "int64", "docs": "uint32", "tfs": "uint16"}
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.terms = arrays["terms"]
+        self.offsets = arrays["offsets"]
+        self.docs = arrays["docs"]
+        self.tfs = arrays["tfs"]
+
+    @classmethod
+    def open(cls, path: Path, name: str) -> "Segment":
+        arrays = {}
+        for field, dtype in cls.FILES.items():
+            file = path / f"{name}.{field}"
+            arrays[field] = (
+                np.memmap(file, dtype=dtype, mode="r") if file.stat().st_size
+                else np.zeros(0, dtype=dtype)
+            )
+        return cls(arrays)
+
+    def write(self, path: Path, name: str):
+        for field in self.FILES:
+            atomic_write(path / f"{name}.{field}", getattr(self, field).tofile)
+
+    def postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        pos = int(np.searchsorted(self.terms, term))
+        if pos == len(self.terms) or self.terms[pos] != term:
+            return None
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        return self.docs[start:end], self.tfs[start:end]
+
+    @property
+    def n_postings(self) -> int:
+        return len(self.docs)
+
+    @classmethod
+    def from_postings(cls, term_ids: np.ndarray, docs: np.ndarray, tfs: np.ndarray) -> "Segment":
+        """
+        Build from flat (term, doc, tf) triples that are already sorted by doc
+        within each term (a stable sort by term keeps that order).
+        """
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, docs, tfs = term_ids[order], docs[order], tfs[order]
+        terms, counts = np.unique(term_ids, return_counts=True)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        np.cumsum(counts, out=offsets[1:])
+        return cls({
+            "terms": terms.astype("int32"),
+            "offsets": offsets,
+            "docs": docs.astype("uint32"),
+            "tfs": tfs.astype("uint16"),
+        })
+
+
+class BM25Index:
+    """
+    Sparse inverted index with Okapi BM25 scoring, keyed by FAISS chunk key.
+
+    Layout in <path>/:
+        vocab.txt          one term per line, term id = line number (append-only)
+        doc_keys.bin       chunk key per doc number (int64, append-only)
+        doc_len.bin        token count per doc number (int32, append-only)
+        live.bin           0 once the doc is deleted (uint8)
+        seg<N>.*           posting segments (see Segment)
+        meta.json          commit point: counts, segment names, BM25 stats
+
+    Each save() writes the new docs as one small delta segment, so an upload
+    costs about as much as the uploaded document. Segments are merged (and
+    postings of deleted docs dropped) once there are MAX_SEGMENTS of them.
+    """
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self._reset_state()
+
+    def _reset_state(self):
+        self.vocab: Dict[str, int] = {}
+        self.n_terms_saved = 0
+        self.n_docs = 0
+        self.n_docs_saved = 0
+        self.n_live = 0
+        self.total_len = 0
+        self.segments: List[Segment] = []
+        self.segment_names: List[str] = []
+        self.next_segment = 0
+
+        self.doc_keys = np.zeros(0, dtype="int64")
+        self.doc_len = np.zeros(0, dtype="int32")
+        self.live = np.zeros(0, dtype="uint8")
+        self._key_to_doc: Dict[int, int] = {}
+
+        # Postings of docs added since the last save: term -> ([docs], [tfs])
+        self._pending: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._deleted: List[int] = []
+        self._rewrite = False
+
+    # -----------------------------
+    # Files
+    # -----------------------------
+    def exists(self) -> bool:
+        return (self.path / "meta.json").exists()
+
+    def open(self):
+        meta = json.loads((self.path / "meta.json").read_text())
+        self._reset_state()
+        self.n_docs = self.n_docs_saved = meta["n_docs"]
+        self.n_terms_saved = meta["n_terms"]
+        self.n_live = meta["n_live"]
+        self.total_len = meta["total_len"]
+        self.segment_names = meta["segments"]
+        self.next_segment = meta["next_segment"]
+
+        with open(self.path / "vocab.txt", encoding="utf-8") as f:
+            for term_id, line in enumerate(f):
+                if term_id == self.n_terms_saved:
+                    break
+                self.vocab[line.rstrip("\n")] = term_id
+
+        # Doc columns are small (13 bytes per chunk) and mutable, so keep them in RAM
+        self.doc_keys = np.fromfile(self.path / "doc_keys.bin", dtype="int64", count=self.n_docs)
+        self.doc_len = np.fromfile(self.path / "doc_len.bin", dtype="int32", count=self.n_docs)
+        self.live = np.fromfile(self.path / "live.bin", dtype="uint8", count=self.n_docs)
+        live_docs = np.nonzero(self.live)[0]
+        self._key_to_doc = dict(zip(self.doc_keys[live_docs].tolist(), live_docs.tolist()))
+
+        self.segments = [Segment.open(self.path, name) for name in self.segment_names]
+
+    # -----------------------------
+    # Mutation (in memory until save)
+    # -----------------------------
+    def reset(self):
+        """
+        Start an empty index; the next save() replaces the files on disk.
+        """
+        self._reset_state()
+        self._rewrite = True
+
+    def _grow(self, needed: int):
+        if needed <= len(self.doc_keys):
+            return
+        capacity = max(1024, len(self.doc_keys))
+        while capacity < needed:
+            capacity *= 2
+        for name in ("doc_keys", "doc_len", "live"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.n_docs] = old[:self.n_docs]
+            setattr(self, name, new)
+
+    def add(self, key: int, text: str):
+        """
+        Index one chunk. A key that is already indexed is replaced.
+        """
+        key = int(key)
+        self.remove(key)
+
+        counts = Counter(tokenize(text))
+        doc = self.n_docs
+        self._grow(doc + 1)
+        self.n_docs += 1
+
+        length = sum(counts.values())
+        self.doc_keys[doc] = key
+        self.doc_len[doc] = length
+        self.live[doc] = 1
+        self._key_to_doc[key] = doc
+        self.n_live += 1
+        self.total_len += length
+
+        for term, tf in counts.items():
+            term_id = self.vocab.setdefault(term, len(self.vocab))
+            docs, tfs = self._pending.setdefault(term_id, ([], []))
+            docs.append(doc)
+            tfs.append(min(tf, MAX_TF))
+
+    def remove(self, key: int) -> bool:
+        doc = self._key_to_doc.pop(int(key), None)
+        if doc is None:
+            return False
+        self.live[doc] = 0
+        self.n_live -= 1
+        self.total_len -= int(self.doc_len[doc])
+        if doc < self.n_docs_saved:
+            self._deleted.append(doc)
+        return True
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending or self._deleted or self._rewrite or self.n_docs != self.n_docs_saved)
+
+    def __len__(self) -> int:
+        return self.n_live
+
+    # -----------------------------
+    # Search
+    # -----------------------------
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        parts = [seg.postings(term_id) for seg in self.segments]
+        parts = [p for p in parts if p is not None]
+        pending = self._pending.get(term_id)
+        if pending is not None:
+            parts.append((np.array(pending[0], dtype="uint32"), np.array(pending[1], dtype="uint16")))
+        if not parts:
+            return np.zeros(0, dtype="uint32"), np.zeros(0, dtype="uint16")
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def doc_mask(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Boolean mask over docs, True for the live docs of `keys` (see search).
+        """
+        mask = np.zeros(self.n_docs, dtype=bool)
+        docs = [self._key_to_doc[key] for key in np.asarray(keys).tolist() if key in self._key_to_doc]
+        mask[docs] = True
+        return mask
+
+    def search(self, query: str, k: int, doc_mask: np.ndarray = None) -> List[Tuple[int, float]]:
+        """
+        Top-k [(chunk key, BM25 score), ...] for `query`, restricted to the
+        docs of `doc_mask` if given (see doc_mask).
+
+        Scores are kept for candidate docs only, so a query costs about the
+        postings it reads, not the number of docs. Terms go rarest first
+        (MaxScore): while the summed upper bounds of the remaining terms
+        could still lift an unseen doc into the top-k, a term's postings
+        are merged into the candidates; after that, the remaining terms
+        only look the candidates up in their (doc-sorted) postings, and
+        candidates that can no longer reach the top-k are dropped.
+        """
+        if self.n_live == 0 or k <= 0:
+            return []
+
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids:
+            return []
+
+        n = self.n_live
+        avgdl = self.total_len / n if n else 1.0
+        k1, b = self.k1, self.b
+
+        terms = []
+        for term_id in term_ids:
+            # Postings of deleted docs stay in their segment until a merge;
+            # they count neither toward the document frequency nor as hits
+            docs, tfs = self._postings(term_id)
+            alive = self.live[docs].astype(bool)
+            docs, tfs = docs[alive], tfs[alive]
+            if len(docs) == 0:
+                continue
+            idf = math.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            # tf / (tf + K) < 1, so idf * (k1 + 1) bounds the term's contribution
+            terms.append((idf * (k1 + 1), idf, docs, tfs))
+        terms.sort(key=lambda t: t[0], reverse=True)
+        remaining = np.cumsum([t[0] for t in terms][::-1])[::-1]
+
+        # Candidates: doc numbers (ascending) and their partial scores
+        cand_docs = np.zeros(0, dtype="uint32")
+        cand_scores = np.zeros(0, dtype="float64")
+        threshold = 0.0
+        for i, (_, idf, docs, tfs) in enumerate(terms):
+            if doc_mask is not None:
+                keep = docs < len(doc_mask)
+                keep[keep] = doc_mask[docs[keep]]
+                docs, tfs = docs[keep], tfs[keep]
+
+            essential = threshold == 0 or remaining[i] > threshold
+            if not essential:
+                # Unseen docs can't reach the top-k any more
+                hopeful = cand_scores + remaining[i] > threshold
+                cand_docs, cand_scores = cand_docs[hopeful], cand_scores[hopeful]
+                if len(docs) == 0:
+                    continue
+                pos = np.minimum(np.searchsorted(docs, cand_docs), len(docs) - 1)
+                found = docs[pos] == cand_docs
+                docs, tfs = cand_docs[found], tfs[pos[found]]
+            if len(docs) == 0:
+                continue
+
+            tf = tfs.astype("float64")
+            norm = k1 * (1.0 - b + b * self.doc_len[docs] / avgdl)
+            contribution = idf * tf * (k1 + 1) / (tf + norm)
+            if essential:
+                merged, inverse = np.unique(np.concatenate([cand_docs, docs]), return_inverse=True)
+                cand_docs = merged
+                cand_scores = np.bincount(
+                    inverse, weights=np.concatenate([cand_scores, contribution]), minlength=len(merged)
+                )
+            else:
+                cand_scores[found] += contribution
+
+            if len(cand_scores) >= k:
+                threshold = float(np.partition(cand_scores, -k)[-k])
+
+        if len(cand_docs) > k:
+            top = np.argpartition(cand_scores, -k)[-k:]
+            cand_docs, cand_scores = cand_docs[top], cand_scores[top]
+        order = np.argsort(-cand_scores, kind="stable")
+        return [(int(self.doc_keys[d]), float(s)) for d, s in zip(cand_docs[order], cand_scores[order])]
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def _pending_segment(self) -> Segment:
+        term_ids, docs, tfs = [], [], []
+        for term_id, (term_docs, term_tfs) in self._pending.items():
+            term_ids.append(np.full(len(term_docs), term_id, dtype="int32"))
+            docs.append(np.asarray(term_docs, dtype="uint32"))
+            tfs.append(np.asarray(term_tfs, dtype="uint16"))
+        return Segment.from_postings(np.concatenate(term_ids), np.concatenate(docs), np.concatenate(tfs))
+
+    def _merge_segments(self, segments: List[Segment]) -> Segment:
+        """
+        One segment holding every live posting of `segments`.
+        Segments are in doc order, so concatenating keeps docs ascending.
+        """
+        term_ids, docs, tfs = [], [], []
+        for seg in segments:
+            counts = np.diff(np.asarray(seg.offsets))
+            term_ids.append(np.repeat(np.asarray(seg.terms), counts))
+            docs.append(np.asarray(seg.docs))
+            tfs.append(np.asarray(seg.tfs))
+        term_ids, docs, tfs = np.concatenate(term_ids), np.concatenate(docs), np.concatenate(tfs)
+        keep = self.live[docs].astype(bool)
+        return Segment.from_postings(term_ids[keep], docs[keep], tfs[keep])
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        target = self.path
+        if self._rewrite:
+            # Fresh build: write a complete new index next to the old one, then swap
+            target = self.path.with_name(self.path.name + ".tmp")
+            shutil.rmtree(target, ignore_errors=True)
+        target.mkdir(parents=True, exist_ok=True)
+
+        # 1. Append new terms and docs after the committed data
+        terms = sorted(self.vocab.items(), key=lambda t: t[1])[self.n_terms_saved:]
+        vocab_file = target / "vocab.txt"
+        committed = vocab_file.stat().st_size if vocab_file.exists() and self.n_terms_saved else 0
+        append_file(vocab_file, committed, "".join(f"{t}\n" for t, _ in terms).encode("utf-8"))
+
+        saved, n = self.n_docs_saved, self.n_docs
+        append_file(target / "doc_keys.bin", saved * 8, self.doc_keys[saved:n].tobytes())
+        append_file(target / "doc_len.bin", saved * 4, self.doc_len[saved:n].tobytes())
+        append_file(target / "live.bin", saved, self.live[saved:n].tobytes())
+
+        # 2. Flip the live flag of deleted docs
+        if self._deleted:
+            with open(target / "live.bin", "r+b") as f:
+                for doc in sorted(self._deleted):
+                    f.seek(doc)
+                    f.write(b"\x00")
+
+        # 3. New docs become a delta segment; merge when segments pile up
+        segments, names = list(self.segments), list(self.segment_names)
+        if self._pending:
+            segments.append(self._pending_segment())
+            names.append(None)
+
+        dead = self.n_docs - self.n_live
+        if len(segments) > MAX_SEGMENTS or (segments and dead > MAX_DEAD_FRACTION * self.n_docs and self._deleted):
+            segments, names = [self._merge_segments(segments)], [None]
+
+        for i, seg in enumerate(segments):
+            if names[i] is None:
+                names[i] = f"seg{self.next_segment}"
+                self.next_segment += 1
+                seg.write(target, names[i])
+
+        # 4. Commit
+        meta = {
+            "n_docs": self.n_docs,
+            "n_terms": len(self.vocab),
+            "n_live": self.n_live,
+            "total_len": self.total_len,
+            "segments": names,
+            "next_segment": self.next_segment,
+            "k1": self.k1,
+            "b": self.b,
+        }
+        atomic_write(target / "meta.json", lambda p: p.write_text(json.dumps(meta)))
+
+        if self._rewrite:
+            swap_dir(target, self.path)
+
+        # Segment files no longer referenced by meta.json (unmapped first, for Windows)
+        self.segments = []
+        for file in self.path.iterdir():
+            if file.name.startswith("seg") and file.name.split(".")[0] not in names:
+                file.unlink()
+
+        self.segment_names = names
+        self.segments = [Segment.open(self.path, name) for name in names]
+        self.n_docs_saved = self.n_docs
+        self.n_terms_saved = len(self.vocab)
+        self._pending = {}
+        self._deleted = []
+        self._rewrite = False
+
+    def nbytes_on_disk(self) -> int:
+        return dir_nbytes(self.path)
@@ -0,0 +1,220 @@
+# src/embeddings/vector_store.py
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.embeddings.sorted_runs import SortedRuns
+from src.utils.fileio import append_file, atomic_write, dir_nbytes, swap_dir
+
+# Disk bytes per row besides the vector: key, live flag, sorted key -> row entry
+ROW_OVERHEAD_BYTES = 8 + 1 + 16
+
+
+class VectorStore:
+    """
+    Full-precision float32 vectors next to a compressed FAISS index, memory-
+    mapped from disk and read only for the few candidates being rescored,
+    so they cost page cache rather than RAM.
+
+    Files: keys.bin (int64), live.bin (uint8), vectors.f32 (rows x dim),
+    sorted key -> row runs (see SortedRuns), and meta.json, which commits
+    a save. Like ChunkStore it is append-only: save() appends new rows,
+    flips the live flag of removed ones and rewrites meta.json.
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._reset_state()
+
+    def _reset_state(self, dim: int = 0):
+        self.dim = dim
+        self.rows = 0
+        self.live_rows = 0
+        self._maps: Dict[str, np.ndarray] = {}
+        self._key_runs = SortedRuns("key_run", "int64")
+
+        # Changes not yet on disk
+        self._pending: Dict[int, np.ndarray] = {}
+        self._deleted_rows: set = set()
+        self._rewrite = False
+
+    # -----------------------------
+    # Files
+    # -----------------------------
+    def exists(self) -> bool:
+        return (self.path / "meta.json").exists()
+
+    def _file(self, name: str, base: Path = None) -> Path:
+        base = base or self.path
+        return base / (name if "." in name else f"{name}.bin")
+
+    def _map(self, name: str, dtype: str, shape: Tuple[int, ...]) -> np.ndarray:
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", shape=shape)
+
+    def open(self):
+        meta = json.loads((self.path / "meta.json").read_text())
+        self._reset_state(meta["dim"])
+        self.rows = meta["rows"]
+        self.live_rows = meta["live_rows"]
+        legacy = SortedRuns.legacy_state("sorted_keys.bin", "sorted_rows.bin", self.live_rows)
+        self._key_runs.open(self.path, meta.get("key_runs") or legacy)
+        self._open_maps()
+
+    def _open_maps(self):
+        self._maps = {
+            "keys": self._map("keys", "int64", (self.rows,)),
+            "live": self._map("live", "uint8", (self.rows,)),
+            "vectors": self._map("vectors.f32", "float32", (self.rows, self.dim)),
+        }
+
+    def _close_maps(self):
+        self._maps = {}
+        self._key_runs.close()
+
+    # -----------------------------
+    # Lookup
+    # -----------------------------
+    def _rows_of(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Saved row of each key, -1 where it has none.
+        """
+        rows = self._key_runs.lookup(keys)
+        found = rows >= 0
+        if found.any():
+            rows[found] = np.where(np.asarray(self._maps["live"][rows[found]]) == 1, rows[found], -1)
+        if self._deleted_rows:
+            rows[np.isin(rows, list(self._deleted_rows))] = -1
+        return rows
+
+    def __contains__(self, key: int) -> bool:
+        return int(key) in self._pending or self._rows_of(np.array([key], dtype="int64"))[0] >= 0
+
+    def __len__(self) -> int:
+        return self.live_rows
+
+    def get(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (vectors, found): one float32 row per key, zeros where found is False.
+        """
+        keys = np.asarray(keys, dtype="int64")
+        vectors = np.zeros((len(keys), self.dim), dtype="float32")
+        rows = self._rows_of(keys)
+        saved = rows >= 0
+        if saved.any():
+            # Sorted reads keep the page faults sequential
+            order = np.argsort(rows[saved])
+            targets = np.nonzero(saved)[0][order]
+            vectors[targets] = self._maps["vectors"][rows[saved][order]]
+        found = saved
+        if self._pending:
+            for i, key in enumerate(keys.tolist()):
+                vector = self._pending.get(key)
+                if vector is not None:
+                    vectors[i] = vector
+                    found[i] = True
+        return vectors, found
+
+    # -----------------------------
+    # Mutation (in memory until save)
+    # -----------------------------
+    def reset(self, dim: int):
+        """
+        Start an empty store; the next save() replaces the files on disk.
+        """
+        self._reset_state(dim)
+        self._rewrite = True
+
+    def add(self, keys: List[int], vectors: np.ndarray):
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dim {vectors.shape[1]} != vector store dim {self.dim}")
+        for key, vector in zip(keys, vectors):
+            key = int(key)
+            if key not in self._pending:
+                self.live_rows += 1
+            self._pending[key] = np.array(vector, dtype="float32")
+
+    def remove(self, key: int) -> bool:
+        key = int(key)
+        if self._pending.pop(key, None) is not None:
+            self.live_rows -= 1
+            return True
+        row = int(self._rows_of(np.array([key], dtype="int64"))[0])
+        if row < 0:
+            return False
+        self._deleted_rows.add(row)
+        self.live_rows -= 1
+        return True
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending or self._deleted_rows or self._rewrite)
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self):
+        if not self.dirty:
+            return
+
+        target = self.path
+        if self._rewrite:
+            # Fresh build: write a complete new store next to the old one, then swap
+            target = self.path.with_name(self.path.name + ".tmp")
+            shutil.rmtree(target, ignore_errors=True)
+        target.mkdir(parents=True, exist_ok=True)
+
+        new_keys = np.fromiter(self._pending.keys(), dtype="int64", count=len(self._pending))
+        new_vectors = (
+            np.stack(list(self._pending.values())) if self._pending
+            else np.zeros((0, self.dim), dtype="float32")
+        )
+        self._maps = {}
+
+        # 1. Append new rows after the committed data
+        append_file(self._file("keys", target), self.rows * 8, new_keys.tobytes())
+        append_file(
+            self._file("vectors.f32", target), self.rows * self.dim * 4, new_vectors.astype("float32").tobytes()
+        )
+        append_file(self._file("live", target), self.rows, np.ones(len(new_keys), dtype="uint8").tobytes())
+
+        # 2. Flip the live flag of removed rows
+        if self._deleted_rows:
+            with open(self._file("live", target), "r+b") as f:
+                for row in sorted(self._deleted_rows):
+                    f.seek(row)
+                    f.write(b"\x00")
+
+        first_new = self.rows
+        self.rows += len(new_keys)
+
+        # 3. Index the new rows' keys: a new delta run, or now and then a merged base
+        live = (
+            np.memmap(self._file("live", target), dtype="uint8", mode="r", shape=(self.rows,)) if self.rows
+            else np.zeros(0, dtype="uint8")
+        )
+        key_runs = self._key_runs.save(target, new_keys, np.arange(first_new, self.rows, dtype="int64"), live)
+        del live
+
+        # 4. Commit
+        meta = {"rows": self.rows, "live_rows": self.live_rows, "dim": self.dim, "key_runs": key_runs}
+        atomic_write(target / "meta.json", lambda p: p.write_text(json.dumps(meta)))
+
+        if self._rewrite:
+            swap_dir(target, self.path)
+
+        self._pending = {}
+        self._deleted_rows = set()
+        self._rewrite = False
+        self._key_runs.cleanup(self.path)
+        self._key_runs.open(self.path, key_runs)
+        self._open_maps()
+
+    # -----------------------------
+    # Stats
+    # -----------------------------
+    def nbytes_on_disk(self) -> int:
+        return dir_nbytes(self.path)
@@ -1,4 +1,11 @@
-from typing import List, Dict
+import logging
+import re
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 
 def chunk_text(
@@ -24,25 +31,172 @@ def chunk_text(
     return chunks
 
 
-def chunk_documents(documents: List[Dict]) -> List[Dict]:
+# -----------------------------
+# Token-aware chunking
+# -----------------------------
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+|(?<=[.!?;:][\"')\]])\s+")
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _spans(text: str, pattern: re.Pattern, start: int, end: int) -> List[Tuple[int, int]]:
     """
-    Chunk documents and attach chunk-level metadata.
+    Split text[start:end] at `pattern`, as (start, end) offsets into text.
+    """
+    spans, pos = [], start
+    for match in pattern.finditer(text, start, end):
+        if match.start() > pos:
+            spans.append((pos, match.start()))
+        pos = match.end()
+    if pos < end:
+        spans.append((pos, end))
+    return spans
+
+
+class TokenChunker:
+    """
+    Chunks sized by the embedding model's own token count.
+
+    Each batch of pages goes through the tokenizer once (offsets only, no
+    per-chunk re-tokenization); the token count of any paragraph or
+    sentence is then read off the offsets. Paragraphs are kept whole when
+    they fit, otherwise split between sentences, and only a single sentence
+    longer than `max_tokens` is cut mid-sentence. There is no overlap:
+    every token is embedded once.
     """
-    chunked_docs = []
+    def __init__(self, tokenizer=None, max_tokens: int = 254, overlap_sentences: int = 0):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_sentences = overlap_sentences
+
+    @classmethod
+    def for_store(cls, store, max_tokens: int = 0, lm_max_tokens: int = 2048, **kwargs) -> "TokenChunker":
+        """
+        Chunker for a HybridEmbeddingStore: limited by the smaller of the
+        ST model's max_seq_length and the LM Studio model's context
+        (minus the [CLS]/[SEP] tokens the models add).
+        """
+        st_model = store.st_model
+        limit = min(getattr(st_model, "max_seq_length", None) or 512, lm_max_tokens) - 2
+        if max_tokens:
+            limit = min(limit, max_tokens)
+        tokenizer = getattr(st_model, "tokenizer", None)
+        if tokenizer is not None and not getattr(tokenizer, "is_fast", False):
+            logger.warning("Tokenizer has no offset mapping, approximating token counts by words")
+            tokenizer = None
+        return cls(tokenizer, max_tokens=limit, **kwargs)
+
+    def describe(self) -> str:
+        name = type(self.tokenizer).__name__ if self.tokenizer is not None else "words"
+        return f"tokens:{name}:{self.max_tokens}:{self.overlap_sentences}"
+
+    def _token_starts(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Start offset of every token, one batched tokenizer call for all texts.
+        """
+        if self.tokenizer is None:
+            return [np.fromiter((m.start() for m in WORD_RE.finditer(t)), dtype="int64") for t in texts]
+
+        encoded = self.tokenizer(
+            texts, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )
+        return [
+            np.array([start for start, end in offsets if end > start], dtype="int64")
+            for offsets in encoded["offset_mapping"]
+        ]
 
-    for doc in documents:
-        text = doc["text"]
-        metadata = doc["metadata"]
+    def split(self, text: str, starts: np.ndarray) -> List[str]:
+        def count(span):
+            return int(np.searchsorted(starts, span[1]) - np.searchsorted(starts, span[0]))
 
-        chunks = chunk_text(text)
+        chunks, current, current_tokens = [], [], 0
+        overlap_only = False
 
-        for i, chunk in enumerate(chunks):
-            chunked_docs.append({
-                "text": chunk,
-                "metadata": {
-                    **metadata,
-                    "chunk_id": f"{metadata['doc_id']}_p{metadata['page']}_c{i}"
+        def flush():
+            nonlocal current, current_tokens, overlap_only
+            if current and not overlap_only:
+                chunks.append(text[current[0][0]:current[-1][1]].strip())
+            keep = current[-self.overlap_sentences:] if self.overlap_sentences else []
+            current, current_tokens = list(keep), sum(count(s) for s in keep)
+            overlap_only = bool(keep)
+
+        def add(span, tokens):
+            nonlocal current, current_tokens, overlap_only
+            if current_tokens + tokens > self.max_tokens:
+                if overlap_only:
+                    # Overlap + next span don't fit: drop the overlap
+                    current, current_tokens = [], 0
+                else:
+                    flush()
+                    if current_tokens + tokens > self.max_tokens:
+                        current, current_tokens = [], 0
+            current.append(span)
+            current_tokens += tokens
+            overlap_only = False
+
+        for paragraph in _spans(text, PARAGRAPH_RE, 0, len(text)):
+            tokens = count(paragraph)
+            if tokens == 0:
+                continue
+            if tokens <= self.max_tokens:
+                # Start a new chunk rather than split a paragraph that fits in one
+                add(paragraph, tokens)
+                continue
+
+            for sentence in _spans(text, SENTENCE_RE, *paragraph):
+                tokens = count(sentence)
+                if tokens <= self.max_tokens:
+                    add(sentence, tokens)
+                    continue
+                # A single sentence over the limit: cut at token boundaries
+                first = int(np.searchsorted(starts, sentence[0]))
+                last = int(np.searchsorted(starts, sentence[1]))
+                for i in range(first, last, self.max_tokens):
+                    piece_end = int(starts[i + self.max_tokens]) if i + self.max_tokens < last else sentence[1]
+                    piece = (max(int(starts[i]), sentence[0]), piece_end)
+                    add(piece, count(piece))
+        flush()
+        return [c for c in chunks if c]
+
+    def split_many(self, texts: List[str]) -> List[List[str]]:
+        return [self.split(t, starts) for t, starts in zip(texts, self._token_starts(texts))]
+
+
+def iter_chunks(
+    documents: Iterable[Dict],
+    chunker: Optional[TokenChunker] = None,
+    batch_pages: int = 64
+) -> Iterator[Dict]:
+    """
+    Chunk documents lazily and attach chunk-level metadata.
+    With a TokenChunker, pages are tokenized in batches of `batch_pages`;
+    without one, the fixed 1000 / 200 character windows are used.
+    """
+    documents = iter(documents)
+    while True:
+        batch = list(islice(documents, batch_pages))
+        if not batch:
+            return
+
+        if chunker is not None:
+            page_chunks = chunker.split_many([doc["text"] for doc in batch])
+        else:
+            page_chunks = [chunk_text(doc["text"]) for doc in batch]
+
+        for doc, chunks in zip(batch, page_chunks):
+            metadata = doc["metadata"]
+            for i, chunk in enumerate(chunks):
+                yield {
+                    "text": chunk,
+                    "metadata": {
+                        **metadata,
+                        "chunk_id": f"{metadata['doc_id']}_p{metadata['page']}_c{i}"
+                    }
                 }
-            })
 
-    return chunked_docs
+
+def chunk_documents(documents: List[Dict], chunker: Optional[TokenChunker] = None) -> List[Dict]:
+    """
+    Chunk documents and attach chunk-level metadata.
+    """
+    return list(iter_chunks(documents, chunker))
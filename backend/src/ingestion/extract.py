@@ -0,0 +1,389 @@
+# src/ingestion/extract.py
+"""
+Parallel text extraction for PDF / TXT files.
+
+Files are handed to a pool of worker processes. A PDF with more than
+`pages_per_task` pages is split by the worker into page-range tasks, so one
+very large PDF is extracted by several processes. Every task runs under
+`file_timeout`: a worker that overruns it is killed and replaced and the
+file (or page range) is reported as failed instead of stalling the run.
+
+The worker processes belong to an ExtractionPool. A long-running server
+creates one pool and passes it to every call, so uploads reuse warm
+workers instead of starting processes per file. Without a pool, each call
+creates a private one.
+
+Output is a stream of page-level documents, either in input order
+(files in order, pages in order) or in completion order.
+"""
+import multiprocessing
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.ingestion.loader import iter_file, iter_pdf, pdf_page_count
+
+
+class ExtractionStats:
+    def __init__(self):
+        self.files = 0
+        self.pages = 0
+        self.failed: List[Dict] = []
+        self.started = time.time()
+
+    @property
+    def seconds(self) -> float:
+        return time.time() - self.started
+
+    @property
+    def pages_per_second(self) -> float:
+        return round(self.pages / self.seconds, 1) if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "files": self.files,
+            "pages": self.pages,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 2),
+            "pages_per_second": self.pages_per_second,
+        }
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+def _run_task(path: Path, first_page: int, last_page: Optional[int], pages_per_task: int) -> Tuple:
+    """
+    ("pages", [docs]) or, for a whole large PDF, ("split", page count).
+    """
+    if path.suffix.lower() != ".pdf":
+        return "pages", list(iter_file(path))
+
+    if first_page == 0:
+        n_pages = pdf_page_count(path)
+        if n_pages > pages_per_task:
+            return "split", n_pages
+        first_page, last_page = 1, n_pages
+    return "pages", list(iter_pdf(path, first_page, last_page))
+
+
+def _worker_main(conn):
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        key, path, first_page, last_page, pages_per_task = task
+        try:
+            conn.send((key, "ok", _run_task(Path(path), first_page, last_page, pages_per_task)))
+        except Exception as e:
+            conn.send((key, "error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.task = None
+        self.deadline = None
+
+    def submit(self, task: Tuple, timeout: Optional[float]):
+        self.task = task
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.conn.send(task)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+
+
+class ExtractionPool:
+    """
+    Extraction worker processes kept alive across iter_extract calls and
+    shared by the threads making them (at most max_workers in total).
+    Workers start on first use with spawn or forkserver, never fork:
+    a child forked from a threaded server can inherit a lock that another
+    thread held and deadlock on it.
+    """
+    def __init__(self, max_workers: int, start_method: Optional[str] = None):
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.ctx = multiprocessing.get_context(start_method)
+        self.max_workers = max(1, max_workers)
+        self._idle: List[_Worker] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, block: bool = True) -> Optional[_Worker]:
+        """
+        An idle worker, a new one while below max_workers, or (block=False)
+        None when every worker is busy.
+        """
+        with self._cond:
+            while not self._closed and not self._idle and self._size >= self.max_workers:
+                if not block:
+                    return None
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("Extraction pool is closed")
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+        try:
+            return _Worker(self.ctx)
+        except Exception:
+            self._forget()
+            raise
+
+    def release(self, worker: _Worker):
+        """
+        Return a worker with no task in flight.
+        """
+        with self._cond:
+            if not self._closed and worker.process.is_alive():
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+        worker.close()
+        self._forget()
+
+    def discard(self, worker: _Worker):
+        """
+        Kill a worker that timed out, died or still has a task in flight.
+        """
+        worker.kill()
+        self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def close(self):
+        """
+        Stop the idle workers; busy ones stop when they are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.close()
+
+
+# -----------------------------
+# Parent side
+# -----------------------------
+class _FileState:
+    def __init__(self):
+        self.ranges: Optional[List[int]] = None   # first page of each task, once known
+        self.results: Dict[int, List[Dict]] = {}  # first page -> docs
+        self.cursor = 0                           # ordered mode: next range to yield
+
+
+def iter_extract(
+    files: List[Path],
+    workers: int = 4,
+    ordered: bool = True,
+    file_timeout: Optional[float] = 300.0,
+    pages_per_task: int = 50,
+    stats: ExtractionStats = None,
+    start_method: Optional[str] = None,
+    pool: Optional[ExtractionPool] = None
+) -> Iterator[Tuple[int, Dict]]:
+    """
+    Yield (position of the file in `files`, page document).
+    ordered=True keeps input order (at most `workers * 4` files are
+    buffered ahead of the slowest one); ordered=False yields pages as
+    soon as their task finishes. Up to `workers` processes of `pool` are
+    used (a private pool of `workers` when None).
+    """
+    stats = stats if stats is not None else ExtractionStats()
+
+    # Nothing to supervise: extract inline
+    if pool is None and workers <= 1 and not file_timeout:
+        for file_pos, path in enumerate(files):
+            try:
+                for doc in iter_file(Path(path)):
+                    stats.pages += 1
+                    yield file_pos, doc
+            except Exception as e:
+                stats.failed.append({"file": str(path), "error": f"{type(e).__name__}: {e}"})
+            stats.files += 1
+        return
+
+    own_pool = pool is None
+    if own_pool:
+        # Batch scripts: the platform's default start method, as before
+        pool = ExtractionPool(workers, start_method or multiprocessing.get_start_method())
+    used: List[_Worker] = []
+    max_workers = max(1, min(workers, pool.max_workers))
+    max_ahead = max_workers * 4
+
+    states: Dict[int, _FileState] = {}
+    queue = deque()  # page-range tasks of split PDFs, served first
+    next_new_file = 0
+    next_out = 0     # ordered mode: next file to yield
+
+    def next_task() -> Optional[Tuple]:
+        nonlocal next_new_file
+        if queue:
+            return queue.popleft()
+        if next_new_file < len(files) and (not ordered or next_new_file < next_out + max_ahead):
+            file_pos = next_new_file
+            next_new_file += 1
+            states[file_pos] = _FileState()
+            return (file_pos, 0), str(files[file_pos]), 0, None, pages_per_task
+        return None
+
+    def record(key: Tuple[int, int], docs: List[Dict], error: str = None):
+        file_pos, first_page = key
+        state = states[file_pos]
+        if error:
+            stats.failed.append({
+                "file": str(files[file_pos]),
+                "pages": None if first_page == 0 else [first_page, first_page + pages_per_task - 1],
+                "error": error,
+            })
+        if state.ranges is None:
+            state.ranges = [first_page]
+        state.results[first_page] = docs
+
+    def finished(file_pos: int) -> bool:
+        state = states[file_pos]
+        return state.ranges is not None and len(state.results) == len(state.ranges)
+
+    def handle(key: Tuple[int, int], status: str, payload):
+        file_pos, first_page = key
+        if status == "error":
+            record(key, [], error=payload)
+        elif payload[0] == "split":
+            n_pages = payload[1]
+            starts = list(range(1, n_pages + 1, pages_per_task))
+            states[file_pos].ranges = starts
+            # Ranges of this file go ahead of new files, in page order
+            for start in reversed(starts):
+                queue.appendleft((
+                    (file_pos, start), str(files[file_pos]), start, min(start + pages_per_task - 1, n_pages), pages_per_task
+                ))
+        else:
+            record(key, payload[1])
+
+    def drain() -> Iterator[Tuple[int, Dict]]:
+        nonlocal next_out
+        if not ordered:
+            for file_pos in list(states):
+                state = states[file_pos]
+                for first_page in list(state.results):
+                    docs = state.results.pop(first_page)
+                    state.cursor += 1
+                    stats.pages += len(docs)
+                    for doc in docs:
+                        yield file_pos, doc
+                if state.ranges is not None and state.cursor == len(state.ranges):
+                    stats.files += 1
+                    del states[file_pos]
+            return
+
+        while next_out in states:
+            state = states[next_out]
+            if state.ranges is None:
+                return
+            while state.cursor < len(state.ranges) and state.ranges[state.cursor] in state.results:
+                docs = state.results.pop(state.ranges[state.cursor])
+                state.cursor += 1
+                stats.pages += len(docs)
+                for doc in docs:
+                    yield next_out, doc
+            if state.cursor < len(state.ranges):
+                return
+            stats.files += 1
+            del states[next_out]
+            next_out += 1
+
+    try:
+        while True:
+            # Hand out work, taking up to `workers` processes from the pool
+            # (waiting for one only when this call holds none)
+            for worker in [w for w in used if w.task is None] + [None] * (max_workers - len(used)):
+                task = next_task()
+                if task is None:
+                    break
+                if worker is None:
+                    worker = pool.acquire(block=not used)
+                    if worker is None:
+                        queue.appendleft(task)
+                        break
+                    used.append(worker)
+                worker.submit(task, file_timeout)
+
+            busy = [w for w in used if w.task is not None]
+            if not busy:
+                yield from drain()
+                if not queue and next_new_file >= len(files):
+                    break
+                continue
+
+            deadlines = [w.deadline for w in busy if w.deadline is not None]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait([w.conn for w in busy], timeout=timeout)
+
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        key, status, payload = worker.conn.recv()
+                    except (EOFError, OSError):
+                        # Worker died (segfault in a parser, OOM kill ...)
+                        key, status, payload = worker.task[0], "error", "worker process died"
+                        used.remove(worker)
+                        pool.discard(worker)
+                    worker.task = None
+                    handle(key, status, payload)
+                elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                    key = worker.task[0]
+                    used.remove(worker)
+                    pool.discard(worker)
+                    handle(key, "error", f"timed out after {file_timeout:.0f}s")
+
+            yield from drain()
+    finally:
+        for worker in used:
+            if worker.task is None:
+                pool.release(worker)
+            else:
+                # Abandoned mid-task (the caller stopped iterating)
+                pool.discard(worker)
+        if own_pool:
+            pool.close()
+
+
+def extract_documents(
+    files: List[Path],
+    workers: int = 4,
+    ordered: bool = True,
+    file_timeout: Optional[float] = 300.0,
+    pages_per_task: int = 50,
+    stats: ExtractionStats = None,
+    pool: Optional[ExtractionPool] = None
+) -> Iterator[Dict]:
+    """
+    Page-level documents of `files`, extracted in parallel (see iter_extract).
+    """
+    for _, doc in iter_extract(files, workers, ordered, file_timeout, pages_per_task, stats, pool=pool):
+        yield doc
@@ -0,0 +1,98 @@
+# src/ingestion/ingest.py
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.embeddings.embed_hybrid import HybridEmbeddingStore
+from src.ingestion.loader import iter_file
+from src.ingestion.chunker import TokenChunker, chunk_documents
+from src.ingestion.extract import ExtractionPool, ExtractionStats, extract_documents
+from src.utils import config
+from src.utils.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+def load_file(file_path: Path) -> List[Dict]:
+    """
+    Load a single PDF or TXT file into page-level documents.
+    """
+    return list(iter_file(file_path))
+
+
+def extract_file(
+    file_path: Path,
+    doc_id: Optional[str] = None,
+    on_page: Optional[Callable[[Dict], None]] = None,
+    pool: Optional[ExtractionPool] = None
+) -> List[Dict]:
+    """
+    Page-level documents of one file, tagged with doc_id (the file name by
+    default). on_page is called as each page arrives. Servers pass their
+    long-lived extraction pool; without one, worker processes are started
+    for this file alone.
+    """
+    file_path = Path(file_path)
+
+    # Process pool + timeout: a pathological PDF can't hang the upload, and
+    # large PDFs are extracted by page range in parallel
+    stats = ExtractionStats()
+    documents = []
+    with stage_timer("ingest_extract"):
+        for doc in extract_documents(
+            [file_path],
+            workers=config.EXTRACT_WORKERS,
+            file_timeout=config.EXTRACT_FILE_TIMEOUT_SECONDS,
+            pages_per_task=config.EXTRACT_PAGES_PER_TASK,
+            stats=stats,
+            pool=pool
+        ):
+            documents.append(doc)
+            if on_page is not None:
+                on_page(doc)
+    if stats.failed:
+        if not documents:
+            raise ValueError(f"Could not extract {file_path.name}: {stats.failed[0]['error']}")
+        logger.warning("Partial extraction of %s: %s", file_path.name, stats.failed)
+
+    if doc_id is None:
+        doc_id = file_path.name
+    for doc in documents:
+        doc["metadata"]["doc_id"] = doc_id
+    return documents
+
+
+def chunk_for_store(documents: List[Dict], store: HybridEmbeddingStore) -> List[Dict]:
+    """
+    Chunk documents the way the store's index was built (config.CHUNK_MODE).
+    """
+    chunker = None
+    if config.CHUNK_MODE == "tokens":
+        chunker = TokenChunker.for_store(store, config.CHUNK_MAX_TOKENS, config.LMSTUDIO_MAX_TOKENS)
+    with stage_timer("ingest_chunk"):
+        return chunk_documents(documents, chunker)
+
+
+def ingest_file(
+    file_path: Path,
+    store: HybridEmbeddingStore,
+    doc_id: Optional[str] = None
+) -> int:
+    """
+    Incrementally index one file into a live store.
+    Any previous version of the same doc_id is replaced, only the new
+    file's chunks are embedded. Returns the number of chunks added.
+    """
+    file_path = Path(file_path)
+    if doc_id is None:
+        doc_id = file_path.name
+    chunks = chunk_for_store(extract_file(file_path, doc_id), store)
+
+    with stage_timer("ingest_embed"):
+        keep = store.plan_dedupe(chunks, replacing=[doc_id])
+        texts = [chunk["text"] for chunk, k in zip(chunks, keep) if k]
+        embeddings, failed = store.embed_texts_with_failures(texts) if texts else (None, [])
+    with stage_timer("ingest_save"):
+        added = store.replace([doc_id], chunks, keep, embeddings, failed)
+
+    return len(added)
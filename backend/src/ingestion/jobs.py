@@ -0,0 +1,254 @@
+# src/ingestion/jobs.py
+"""
+Background ingestion of uploaded files.
+
+    /upload -> IngestQueue.submit -> worker pool: extract + chunk
+            -> committer: one batched embed + index save for every job ready
+
+Extraction and chunking of up to `workers` files run in parallel. A single
+committer thread takes every job whose chunks are ready (waiting up to
+`coalesce_wait` for more to arrive, at most `coalesce_max_jobs`) and
+indexes them together: one embedding pass over all their chunks and one
+save, instead of one of each per file.
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.embeddings.embed_hybrid import HybridEmbeddingStore
+from src.ingestion.extract import ExtractionPool
+from src.ingestion.ingest import chunk_for_store, extract_file
+from src.ingestion.loader import pdf_page_count
+from src.utils.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# queued -> extracting -> chunking -> waiting -> indexing -> done | failed
+# (superseded: a later upload of the same doc_id was indexed in the same batch)
+JOB_STATUSES = ("queued", "extracting", "chunking", "waiting", "indexing", "done", "failed", "superseded")
+FINISHED = ("done", "failed", "superseded")
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class IngestJob:
+    def __init__(self, path: Path, doc_id: str, size: int):
+        self.id = uuid.uuid4().hex
+        self.path = Path(path)
+        self.doc_id = doc_id
+        self.bytes = size
+        self.status = "queued"
+        self.error: Optional[str] = None
+
+        # Progress
+        self.pages_total: Optional[int] = None
+        self.pages = 0
+        self.chunks = 0
+        self.vectors_added = 0
+        self.batch_jobs = 0  # uploads indexed in the same commit
+
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._chunks: List[Dict] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def as_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "doc_id": self.doc_id,
+            "status": self.status,
+            "bytes": self.bytes,
+            "pages": self.pages,
+            "pages_total": self.pages_total,
+            "chunks": self.chunks,
+            "vectors_added": self.vectors_added,
+            "batch_jobs": self.batch_jobs,
+            "error": self.error,
+            "seconds": round(end - self.created_at, 2),
+        }
+
+
+class IngestQueue:
+    def __init__(
+        self,
+        store: HybridEmbeddingStore,
+        workers: int = 2,
+        max_pending: int = 64,
+        coalesce_max_jobs: int = 16,
+        coalesce_wait: float = 0.2,
+        job_ttl: float = 3600.0,
+        extract_pool: Optional[ExtractionPool] = None
+    ):
+        self.store = store
+        # Shared extraction processes, owned (and closed) by the caller
+        self.extract_pool = extract_pool
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.coalesce_max_jobs = max(1, coalesce_max_jobs)
+        self.coalesce_wait = coalesce_wait
+        self.job_ttl = job_ttl
+
+        self.jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+        self._ready: "queue.Queue[IngestJob]" = queue.Queue()
+
+        # Started on the first submit
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._committer: Optional[threading.Thread] = None
+
+        self.commits = 0
+
+    # -----------------------------
+    # API side
+    # -----------------------------
+    def _start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+            self._committer = threading.Thread(target=self._commit_loop, name="ingest-commit", daemon=True)
+            self._committer.start()
+
+    def submit(self, path: Path, doc_id: str, size: int = 0) -> IngestJob:
+        """
+        Queue an uploaded file (already on disk) for ingestion.
+        Raises QueueFullError when max_pending jobs are still unfinished.
+        """
+        job = IngestJob(path, doc_id, size)
+        with self._lock:
+            self._prune()
+            if sum(not j.finished for j in self.jobs.values()) >= self.max_pending:
+                raise QueueFullError(f"{self.max_pending} uploads are already being ingested")
+            self.jobs[job.id] = job
+            self._start()
+        self._executor.submit(self._prepare, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _prune(self):
+        """
+        Forget finished jobs older than job_ttl (caller holds the lock).
+        """
+        cutoff = time.time() - self.job_ttl
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def counts(self) -> Dict[tuple, int]:
+        """
+        Jobs per status, for the rag_upload_jobs gauge.
+        """
+        with self._lock:
+            counts = {(status,): 0 for status in JOB_STATUSES}
+            for job in self.jobs.values():
+                counts[(job.status,)] += 1
+            return counts
+
+    # -----------------------------
+    # Workers
+    # -----------------------------
+    def _finish(self, job: IngestJob, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job._chunks = []
+
+    def _prepare(self, job: IngestJob):
+        """
+        Extract and chunk one file, then hand it to the committer.
+        """
+        try:
+            job.status = "extracting"
+            if job.path.suffix.lower() == ".pdf":
+                try:
+                    job.pages_total = pdf_page_count(job.path)
+                except Exception:
+                    pass  # unreadable header: extraction reports the real error
+
+            def on_page(doc):
+                job.pages += 1
+
+            documents = extract_file(job.path, job.doc_id, on_page=on_page, pool=self.extract_pool)
+            job.status = "chunking"
+            job._chunks = chunk_for_store(documents, self.store)
+            job.chunks = len(job._chunks)
+        except Exception as e:
+            logger.warning("Ingestion of %s failed: %s", job.path.name, e)
+            self._finish(job, "failed", f"{type(e).__name__}: {e}")
+            return
+        job.status = "waiting"
+        self._ready.put(job)
+
+    def _collect(self) -> List[IngestJob]:
+        batch = [self._ready.get()]
+        deadline = time.monotonic() + self.coalesce_wait
+        while len(batch) < self.coalesce_max_jobs:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._ready.get(timeout=remaining) if remaining > 0 else self._ready.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit_loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._commit(batch)
+            except Exception as e:
+                logger.exception("Indexing %d upload(s) failed", len(batch))
+                for job in batch:
+                    if not job.finished:
+                        self._finish(job, "failed", f"{type(e).__name__}: {e}")
+
+    def _commit(self, batch: List[IngestJob]):
+        """
+        Replace every doc_id of the batch and index all their chunks with one
+        embedding pass and one save. The swap itself is atomic (see
+        HybridEmbeddingStore.replace): a failure leaves the last save in place.
+        """
+        # Two uploads of one doc_id in a batch: the later one wins
+        latest: Dict[str, IngestJob] = {}
+        for job in batch:
+            previous = latest.get(job.doc_id)
+            if previous is not None:
+                self._finish(previous, "superseded")
+            latest[job.doc_id] = job
+        jobs = list(latest.values())
+        for job in jobs:
+            job.status = "indexing"
+            job.batch_jobs = len(jobs)
+
+        store = self.store
+        owner = {id(chunk): job for job in jobs for chunk in job._chunks}
+        doc_ids = [job.doc_id for job in jobs]
+        chunks = [chunk for job in jobs for chunk in job._chunks]
+        # Embed outside the store lock, leaving out what dedupe will drop;
+        # the old versions stay searchable until replace() swaps them
+        with stage_timer("ingest_embed"):
+            keep = store.plan_dedupe(chunks, replacing=doc_ids)
+            texts = [chunk["text"] for chunk, k in zip(chunks, keep) if k]
+            embeddings, failed = store.embed_texts_with_failures(texts) if texts else (None, [])
+        with stage_timer("ingest_save"):
+            chunks = store.replace(doc_ids, chunks, keep, embeddings, failed)
+
+        for chunk in chunks:
+            owner[id(chunk)].vectors_added += 1
+        for job in jobs:
+            self._finish(job, "done")
+        self.commits += 1
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,59 +1,111 @@
+import logging
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
 import PyPDF2
 
+logger = logging.getLogger(__name__)
 
-def load_txt(file_path: Path) -> List[Dict]:
+
+def iter_txt(file_path: Path) -> Iterator[Dict]:
     """
-    Load a TXT file and return text with metadata.
+    Yield the text of a TXT file as one document with metadata.
     """
     with open(file_path, "r", encoding="utf-8") as f:
         text = f.read()
 
-    return [{
+    yield {
         "text": text,
         "metadata": {
             "doc_id": file_path.name,
             "page": None,
             "source": "txt"
         }
-    }]
+    }
 
 
-def load_pdf(file_path: Path) -> List[Dict]:
+def pdf_page_count(file_path: Path) -> int:
+    with open(file_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def iter_pdf(file_path: Path, first_page: int = 1, last_page: Optional[int] = None) -> Iterator[Dict]:
     """
-    Load a PDF file and return page-level text with metadata.
+    Yield page-level text with metadata, one page at a time.
+    first_page / last_page (1-based, inclusive) restrict it to a page range.
     """
-    documents = []
-
     with open(file_path, "rb") as f:
         reader = PyPDF2.PdfReader(f)
+        last_page = min(last_page or len(reader.pages), len(reader.pages))
 
-        for page_number, page in enumerate(reader.pages, start=1):
-            text = page.extract_text()
+        for page_number in range(first_page, last_page + 1):
+            text = reader.pages[page_number - 1].extract_text()
             if text and text.strip():
-                documents.append({
+                yield {
                     "text": text,
                     "metadata": {
                         "doc_id": file_path.name,
                         "page": page_number,
                         "source": "pdf"
                     }
-                })
+                }
+
 
-    return documents
+def load_txt(file_path: Path) -> List[Dict]:
+    """
+    Load a TXT file and return text with metadata.
+    """
+    return list(iter_txt(file_path))
 
 
-def load_documents(data_dir: Path) -> List[Dict]:
+def load_pdf(file_path: Path) -> List[Dict]:
     """
-    Load all PDF and TXT documents from data directory.
+    Load a PDF file and return page-level text with metadata.
+    """
+    return list(iter_pdf(file_path))
+
+
+def iter_file(file_path: Path) -> Iterator[Dict]:
+    """
+    Yield the page-level documents of a single PDF or TXT file.
+    """
+    suffix = file_path.suffix.lower()
+    if suffix == ".pdf":
+        return iter_pdf(file_path)
+    if suffix == ".txt":
+        return iter_txt(file_path)
+    raise ValueError(f"Unsupported file type: {suffix}")
+
+
+def list_documents(data_dir: Path) -> List[Path]:
     """
-    all_docs = []
+    All TXT and PDF files under the data directory, in a stable order.
+    """
+    return sorted((data_dir / "txt").glob("*.txt")) + sorted((data_dir / "pdfs").glob("*.pdf"))
+
+
+def iter_documents(data_dir: Path, workers: int = None, ordered: bool = True) -> Iterator[Dict]:
+    """
+    Yield page-level documents of every file, extracted by a process pool
+    (see extract.iter_extract; workers=1 extracts in this process).
+    """
+    # Imported here: extract's worker processes import this module
+    from src.ingestion.extract import ExtractionStats, extract_documents
+    from src.utils import config
 
-    for txt_file in (data_dir / "txt").glob("*.txt"):
-        all_docs.extend(load_txt(txt_file))
+    stats = ExtractionStats()
+    yield from extract_documents(
+        list_documents(data_dir),
+        workers=config.EXTRACT_WORKERS if workers is None else workers,
+        ordered=ordered,
+        file_timeout=config.EXTRACT_FILE_TIMEOUT_SECONDS,
+        pages_per_task=config.EXTRACT_PAGES_PER_TASK,
+        stats=stats
+    )
+    logger.info("Extraction: %s", stats.as_dict())
 
-    for pdf_file in (data_dir / "pdfs").glob("*.pdf"):
-        all_docs.extend(load_pdf(pdf_file))
 
-    return all_docs
+def load_documents(data_dir: Path, workers: int = None, ordered: bool = True) -> List[Dict]:
+    """
+    Load all PDF and TXT documents from data directory.
+    """
+    return list(iter_documents(data_dir, workers=workers, ordered=ordered))
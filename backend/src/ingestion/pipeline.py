@@ -0,0 +1,222 @@
+# src/ingestion/pipeline.py
+"""
+Streaming index build.
+
+    files -> pages (loader) -> chunks (chunker) -> bounded embedding batches
+          -> index / chunk store / BM25 appends -> periodic checkpoints
+
+Only one batch of chunks (plus the IVF training sample, if any) is held in
+memory at a time. Every `checkpoint_every` chunks the store is saved and
+the position in the input (file, chunk within file) is written to a
+checkpoint file, so an interrupted build resumes from there instead of
+starting over. Chunks indexed without an LM Studio embedding are listed
+in the checkpoint too, so a resumed build still reports them.
+"""
+import json
+import logging
+import time
+from itertools import groupby, islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.embeddings.embed_hybrid import HybridEmbeddingStore
+from src.embeddings.index_factory import min_training_size
+from src.ingestion.chunker import TokenChunker, iter_chunks
+from src.ingestion.extract import ExtractionStats, iter_extract
+from src.utils.fileio import atomic_write
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 2
+
+
+def checkpoint_path_for(store: HybridEmbeddingStore) -> Path:
+    return store.index_path.with_name(store.index_path.name + ".checkpoint.json")
+
+
+def iter_positioned_chunks(
+    files: List[Path],
+    start_file: int = 0,
+    skip_chunks: int = 0,
+    extract_options: Dict = None,
+    chunker: Optional[TokenChunker] = None
+) -> Iterator[Tuple[int, int, Dict]]:
+    """
+    Yield (file position, chunk position within the file, chunk), starting
+    at `start_file` and skipping the first `skip_chunks` of that file.
+    Pages come from the extraction process pool, in input order.
+    """
+    pages = iter_extract(files[start_file:], ordered=True, **(extract_options or {}))
+    for offset, file_pages in groupby(pages, key=lambda item: item[0]):
+        file_pos = start_file + offset
+        chunks = iter_chunks((doc for _, doc in file_pages), chunker)
+        if file_pos == start_file and skip_chunks:
+            chunks = islice(chunks, skip_chunks, None)
+            first = skip_chunks
+        else:
+            first = 0
+        for chunk_pos, chunk in enumerate(chunks, start=first):
+            yield file_pos, chunk_pos, chunk
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _load_checkpoint(path: Path, files: List[Path], index_type: str, chunking: str) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    checkpoint = json.loads(path.read_text())
+    names = [f.name for f in files]
+    if (
+        checkpoint.get("version") != CHECKPOINT_VERSION
+        or checkpoint["files"] != names[:len(checkpoint["files"])]
+        or checkpoint["index_type"] != index_type
+        or checkpoint["chunking"] != chunking
+    ):
+        raise RuntimeError(
+            f"Checkpoint {path} does not match the current input files / index type / chunking.\n"
+            f"👉 Re-run with --restart to build from scratch."
+        )
+    return checkpoint
+
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds > 0 else 0.0
+
+
+def stream_build(
+    store: HybridEmbeddingStore,
+    files: List[Path],
+    batch_size: int = 256,
+    checkpoint_every: int = 10_000,
+    train_size: int = 20_000,
+    resume: bool = True,
+    extract_workers: int = 4,
+    file_timeout: float = 300.0,
+    pages_per_task: int = 50,
+    chunker: Optional[TokenChunker] = None
+) -> Dict:
+    """
+    Build the store's index from `files` in bounded batches.
+    With resume, continue from the last checkpoint if there is one.
+    IVF indexes are trained on the first `train_size` chunks.
+    Without a chunker, the fixed character windows are used.
+    Returns build stats.
+    """
+    extraction = ExtractionStats()
+    extract_options = {
+        "workers": extract_workers,
+        "file_timeout": file_timeout,
+        "pages_per_task": pages_per_task,
+        "stats": extraction,
+    }
+    # Chunk positions in a checkpoint only mean something under the same chunking
+    chunking = chunker.describe() if chunker is not None else "chars"
+    checkpoint_path = checkpoint_path_for(store)
+    checkpoint = _load_checkpoint(checkpoint_path, files, store.index_type, chunking) if resume else None
+
+    if checkpoint:
+        store.load()
+        start_file, skip_chunks = checkpoint["file_pos"], checkpoint["chunk_pos"]
+        total = checkpoint["chunks"]
+        # Chunks before the resume point are not embedded again: keep their failures
+        store.failed_chunk_ids = list(checkpoint.get("failed_chunk_ids", []))
+        logger.info(
+            "Resuming build at %s chunk %d (%d chunks already indexed)",
+            files[start_file].name if start_file < len(files) else "end", skip_chunks, total
+        )
+    else:
+        store.begin_build()
+        start_file, skip_chunks, total = 0, 0, 0
+
+    # IVF / sq8 need a training sample before the first add (flat / HNSW / fp16 don't)
+    pending_chunks, pending_embeddings = [], []
+    needs_training = store.index is None and min_training_size(store.index_type) > 0
+    train_size = max(train_size, min_training_size(store.index_type)) if needs_training else 0
+
+    def write_checkpoint(file_pos: int, chunk_pos: int):
+        store.save()
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "files": [f.name for f in files[:file_pos + 1]],
+            "file_pos": file_pos,
+            "chunk_pos": chunk_pos,
+            "chunks": total,
+            # Indexed with zero-filled LM Studio halves, for build_index to report
+            "failed_chunk_ids": store.failed_chunk_ids,
+            "index_type": store.index_type,
+            "chunking": chunking,
+        }
+        atomic_write(checkpoint_path, lambda p: p.write_text(json.dumps(state)))
+
+    start = time.time()
+    added = 0
+    since_checkpoint = 0
+
+    chunk_stream = iter_positioned_chunks(files, start_file, skip_chunks, extract_options, chunker)
+    for batch in batched(chunk_stream, batch_size):
+        # Near-duplicates are folded into their survivor before embedding
+        chunks = store.dedupe([chunk for _, _, chunk in batch])
+        since_checkpoint += len(batch)
+        if chunks:
+            embeddings, failed = store.embed_texts_with_failures([c["text"] for c in chunks])
+            store.failed_chunk_ids.extend(chunks[i]["metadata"]["chunk_id"] for i in failed)
+
+            if store.index is None and train_size:
+                pending_chunks.extend(chunks)
+                pending_embeddings.append(embeddings)
+                chunks, embeddings = [], None
+                if len(pending_chunks) >= train_size:
+                    chunks, embeddings = pending_chunks, np.concatenate(pending_embeddings)
+                    pending_chunks, pending_embeddings = [], []
+
+            if chunks:
+                store.add_embedded(chunks, embeddings)
+                total += len(chunks)
+                added += len(chunks)
+
+        # No checkpoint while the IVF training sample is still buffered
+        if since_checkpoint >= checkpoint_every and store.index is not None:
+            # Resume point: the chunk after this batch's last one
+            file_pos, chunk_pos, _ = batch[-1]
+            write_checkpoint(file_pos, chunk_pos + 1)
+            since_checkpoint = 0
+            elapsed = time.time() - start
+            logger.info(
+                "Checkpoint: %d chunks indexed, %s chunks/s, extraction %s pages/s",
+                total, _rate(added, elapsed), extraction.pages_per_second
+            )
+
+    # Corpus smaller than the training sample
+    if pending_chunks:
+        store.add_embedded(pending_chunks, np.concatenate(pending_embeddings))
+        total += len(pending_chunks)
+        added += len(pending_chunks)
+
+    if store.index is None:
+        raise ValueError("No chunks provided for embedding")
+
+    store.save()
+    checkpoint_path.unlink(missing_ok=True)
+
+    elapsed = time.time() - start
+    return {
+        "chunks": total,
+        "chunks_this_run": added,
+        "files": len(files),
+        "seconds": round(elapsed, 2),
+        "chunks_per_second": _rate(added, elapsed),
+        "resumed": bool(checkpoint),
+        "chunking": chunking,
+        "dedup": store.dedup.stats if store.dedup is not None else None,
+        "extraction": extraction.as_dict(),
+    }
+
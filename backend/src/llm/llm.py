@@ -1,19 +1,347 @@
 # src/llm/llm.py
+import asyncio
+import json
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+
+from src.llm.pool import Backend, BackendPool, LLMUnavailableError, is_backend_failure
+
+logger = logging.getLogger(__name__)
+
 
 class LLM:
-    def __init__(self, api_url="http://localhost:1234/v1/chat/completions", model_name="mistral-3-3b"):
-        self.api_url = api_url
+    """
+    Chat completions client over a pool of OpenAI-compatible servers
+    (LM Studio instances). `api_urls` lists them; `api_url` alone is a
+    pool of one.
+
+    - persistent connections: one pooled requests.Session and one pooled
+      httpx.AsyncClient for all backends
+    - each request goes to the backend with the fewest in flight
+    - a backend that fails (connection error, timeout, 5xx) is retried on
+      another one, as long as nothing was streamed yet; `breaker_failures`
+      failures in a row eject it for `breaker_cooldown` seconds
+    - with hedge_percentile > 0, a completion still running after that
+      percentile of recent latencies is also sent to a second backend,
+      and the first answer wins
+    """
+    def __init__(
+        self,
+        api_url="http://localhost:1234/v1/chat/completions",
+        model_name="mistral-3-3b",
+        timeout: float = 120.0,
+        max_connections: int = 100,
+        api_urls: Optional[List[str]] = None,
+        hedge_percentile: float = 0.0,
+        hedge_min_samples: int = 20,
+        breaker_failures: int = 5,
+        breaker_cooldown: float = 30.0
+    ):
+        urls = list(api_urls or [api_url])
+        self.api_url = urls[0]
         self.model_name = model_name
+        self.timeout = timeout
+        self.max_connections = max_connections
 
-    def generate_answer(self, prompt: str, max_tokens: int = 512) -> str:
+        self.pool = BackendPool(urls, failure_threshold=breaker_failures, cooldown=breaker_cooldown)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+        # Keep-alive connections for the sync path
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(urls), pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Sync hedging runs both requests here. Created up front rather than
+        # on first hedge so concurrent callers can't race to create two;
+        # its threads only start when something is submitted.
+        self._hedge_executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="llm-hedge")
+
+        # Pooled async client for the API, created on first use in the event loop
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    def _payload(self, prompt: str, max_tokens: int, stream: bool = False) -> dict:
         payload = {
             "model": self.model_name,
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": max_tokens
         }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    @staticmethod
+    def _parse_stream_line(line: str):
+        """
+        One SSE line of a streamed chat completion -> (text delta, usage).
+        Returns None for keep-alives and the final [DONE] marker.
+        """
+        if not line or not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+
+        chunk = json.loads(data)
+        delta = ""
+        if chunk.get("choices"):
+            delta = chunk["choices"][0].get("delta", {}).get("content") or ""
+        return delta, chunk.get("usage")
+
+    def stats(self) -> Dict:
+        """
+        Per-backend load, breaker state, errors and latency, plus hedging counts.
+        """
+        return self.pool.stats()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.pool) < 2:
+            return None
+        return self.pool.latency_percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    # -----------------------------
+    # Failover
+    # -----------------------------
+    def _failover(self, attempt: Callable[[Backend, List[Backend]], object]):
+        """
+        attempt(backend, tried) on the least loaded backend, then on the
+        others in turn while backends fail. Re-raises the last failure.
+        """
+        tried: List[Backend] = []
+        error = None
+        while len(tried) < len(self.pool):
+            try:
+                backend = self.pool.acquire(exclude=tried)
+            except LLMUnavailableError:
+                if error is None:
+                    raise
+                break
+            tried.append(backend)
+            try:
+                return attempt(backend, tried)
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                logger.warning("LLM backend %s failed: %s", backend.url, e)
+                error = e
+        raise error
+
+    async def _afailover(self, attempt):
+        """
+        Async _failover(): `attempt` is a coroutine function.
+        """
+        tried: List[Backend] = []
+        error = None
+        while len(tried) < len(self.pool):
+            try:
+                backend = self.pool.acquire(exclude=tried)
+            except LLMUnavailableError:
+                if error is None:
+                    raise
+                break
+            tried.append(backend)
+            try:
+                return await attempt(backend, tried)
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                logger.warning("LLM backend %s failed: %s", backend.url, e)
+                error = e
+        raise error
+
+    # -----------------------------
+    # Sync
+    # -----------------------------
+    def _complete(self, backend: Backend, payload: dict) -> str:
+        with self.pool.track(backend):
+            response = self.session.post(backend.url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"]
+
+    def _complete_hedged(self, backend: Backend, tried: List[Backend], payload: dict) -> str:
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._complete(backend, payload)
+
+        primary = self._hedge_executor.submit(self._complete, backend, payload)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        try:
+            second = self.pool.acquire(exclude=tried)
+        except LLMUnavailableError:
+            return primary.result()
+        tried.append(second)
+        self.pool.record_hedge()
+        hedge = self._hedge_executor.submit(self._complete, second, payload)
+
+        # First success wins; the other request runs out on its own thread
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.pool.record_hedge(won=True)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def generate_answer(self, prompt: str, max_tokens: int = 512) -> str:
+        payload = self._payload(prompt, max_tokens)
+        return self._failover(lambda backend, tried: self._complete_hedged(backend, tried, payload))
+
+    def stream_answer(self, prompt: str, max_tokens: int = 512) -> Iterator[dict]:
+        """
+        Stream the completion (stream=True). Yields {"delta": str} per chunk,
+        and {"usage": {...}} if the server reports token usage.
+        A backend that fails before the first chunk is replaced by another.
+        """
+        payload = self._payload(prompt, max_tokens, stream=True)
+        tried: List[Backend] = []
+        while True:
+            try:
+                backend = self.pool.acquire(exclude=tried)
+            except LLMUnavailableError:
+                if not tried:
+                    raise
+                raise error
+            tried.append(backend)
+            started = False
+            try:
+                with self.pool.track(backend, sample=False):
+                    with self.session.post(backend.url, json=payload, timeout=self.timeout, stream=True) as response:
+                        response.raise_for_status()
+                        for line in response.iter_lines(decode_unicode=True):
+                            parsed = self._parse_stream_line(line)
+                            if parsed is None:
+                                continue
+                            delta, usage = parsed
+                            started = True
+                            if delta:
+                                yield {"delta": delta}
+                            if usage:
+                                yield {"usage": usage}
+                return
+            except Exception as e:
+                if started or not is_backend_failure(e) or len(tried) == len(self.pool):
+                    raise
+                logger.warning("LLM backend %s failed: %s", backend.url, e)
+                error = e
+
+    # -----------------------------
+    # Async
+    # -----------------------------
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._async_client
+
+    async def _acomplete(self, backend: Backend, payload: dict) -> str:
+        with self.pool.track(backend):
+            response = await self._get_async_client().post(backend.url, json=payload)
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"]
+
+    async def _acomplete_hedged(self, backend: Backend, tried: List[Backend], payload: dict) -> str:
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._acomplete(backend, payload)
+
+        primary = asyncio.ensure_future(self._acomplete(backend, payload))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            try:
+                second = self.pool.acquire(exclude=tried)
+            except LLMUnavailableError:
+                return await primary
+            tried.append(second)
+            self.pool.record_hedge()
+            hedge = asyncio.ensure_future(self._acomplete(second, payload))
+            pending.add(hedge)
+
+            # First success wins; the loser is cancelled (and its connection freed)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.pool.record_hedge(won=True)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def agenerate_answer(self, prompt: str, max_tokens: int = 512) -> str:
+        """
+        Non-blocking generate_answer over pooled keep-alive connections.
+        """
+        payload = self._payload(prompt, max_tokens)
+        return await self._afailover(
+            lambda backend, tried: self._acomplete_hedged(backend, tried, payload)
+        )
+
+    async def astream_answer(self, prompt: str, max_tokens: int = 512) -> AsyncIterator[dict]:
+        """
+        Async stream_answer() over the pooled client.
+        """
+        client = self._get_async_client()
+        payload = self._payload(prompt, max_tokens, stream=True)
+        tried: List[Backend] = []
+        while True:
+            try:
+                backend = self.pool.acquire(exclude=tried)
+            except LLMUnavailableError:
+                if not tried:
+                    raise
+                raise error
+            tried.append(backend)
+            started = False
+            try:
+                with self.pool.track(backend, sample=False):
+                    async with client.stream("POST", backend.url, json=payload) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            parsed = self._parse_stream_line(line)
+                            if parsed is None:
+                                continue
+                            delta, usage = parsed
+                            started = True
+                            if delta:
+                                yield {"delta": delta}
+                            if usage:
+                                yield {"usage": usage}
+                return
+            except Exception as e:
+                if started or not is_backend_failure(e) or len(tried) == len(self.pool):
+                    raise
+                logger.warning("LLM backend %s failed: %s", backend.url, e)
+                error = e
 
-        response = requests.post(self.api_url, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self._hedge_executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,223 @@
+# src/llm/pool.py
+"""
+Inference server pool for the LLM client.
+
+Each request goes to the backend with the fewest requests in flight
+(ties rotate). A backend that fails `failure_threshold` times in a row is
+ejected for `cooldown` seconds, then gets one trial request: success
+closes its breaker again, failure re-opens it. Latencies of recent
+completions feed the hedging delay.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence
+
+import httpx
+import numpy as np
+import requests
+
+from src.utils.metrics import REGISTRY
+
+# Status codes that count against a backend; other 4xx mean the request itself is bad
+FAILURE_STATUS = {408, 429, 500, 502, 503, 504}
+
+BACKEND_SECONDS = REGISTRY.histogram(
+    "rag_llm_backend_seconds", "LLM request latency per backend (streams until the last token)", ["backend"]
+)
+BACKEND_REQUESTS = REGISTRY.counter(
+    "rag_llm_backend_requests_total", "LLM requests per backend by outcome (ok, error, rejected, cancelled)",
+    ["backend", "outcome"]
+)
+HEDGES = REGISTRY.counter(
+    "rag_llm_hedges_total", "Hedged LLM requests sent, and those that answered first", ["result"]
+)
+
+
+class LLMUnavailableError(RuntimeError):
+    """
+    Every backend in the pool is ejected by its circuit breaker.
+    """
+
+
+def is_backend_failure(error: Exception) -> bool:
+    """
+    True for errors that say the backend is unwell (connection, timeout,
+    5xx, malformed reply), False for requests it rightly refused.
+    """
+    if isinstance(error, (requests.HTTPError, httpx.HTTPStatusError)):
+        response = error.response
+        return response is None or response.status_code in FAILURE_STATUS
+    return isinstance(error, (requests.RequestException, httpx.TransportError, ValueError, KeyError))
+
+
+class Backend:
+    def __init__(self, url: str, latency_window: int = 256):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+
+        # Circuit breaker: closed -> open (ejected) -> half_open (one trial) -> closed
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+        # Seconds of recent non-streamed completions
+        self.latencies = deque(maxlen=latency_window)
+
+
+class BackendPool:
+    def __init__(
+        self,
+        urls: Sequence[str],
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        latency_window: int = 256
+    ):
+        if not urls:
+            raise ValueError("LLM backend pool needs at least one URL")
+        self.backends = [Backend(url, latency_window) for url in urls]
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._turn = 0
+
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    # -----------------------------
+    # Selection
+    # -----------------------------
+    def acquire(self, exclude: Sequence[Backend] = ()) -> Backend:
+        """
+        Least-outstanding backend outside `exclude` whose breaker lets a
+        request through; counted as in flight until release().
+        Raises LLMUnavailableError if there is none.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for i, backend in enumerate(self.backends):
+                if backend in exclude:
+                    continue
+                if backend.state == "open":
+                    if now - backend.opened_at < self.cooldown:
+                        continue
+                    backend.state = "half_open"
+                if backend.state == "half_open" and backend.trial_in_flight:
+                    continue
+                candidates.append((i, backend))
+            if not candidates:
+                raise LLMUnavailableError(
+                    f"All {len(self.backends)} LLM backends are unavailable (circuit open)"
+                    if not exclude else "No other LLM backend available"
+                )
+
+            self._turn += 1
+            n = len(self.backends)
+            _, backend = min(candidates, key=lambda c: (c[1].outstanding, (c[0] - self._turn) % n))
+            if backend.state == "half_open":
+                backend.trial_in_flight = True
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, outcome: str, latency: float = None, sample: bool = True):
+        """
+        outcome: ok, error (counts toward the breaker), rejected (a 4xx
+        the backend rightly returned) or cancelled (e.g. a hedge's loser).
+        sample=False keeps `latency` out of the hedging window (streams).
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            backend.trial_in_flight = False
+            if outcome == "error":
+                backend.errors += 1
+                backend.consecutive_failures += 1
+                if backend.state == "half_open" or backend.consecutive_failures >= self.failure_threshold:
+                    backend.state = "open"
+                    backend.opened_at = time.monotonic()
+            elif outcome in ("ok", "rejected"):
+                backend.consecutive_failures = 0
+                backend.state = "closed"
+                if outcome == "ok" and latency is not None and sample:
+                    backend.latencies.append(latency)
+
+        BACKEND_REQUESTS.inc(backend=backend.url, outcome=outcome)
+        if latency is not None:
+            BACKEND_SECONDS.observe(latency, backend=backend.url)
+
+    @contextmanager
+    def track(self, backend: Backend, sample: bool = True):
+        """
+        Release `backend` with the outcome of the block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.release(backend, "error" if is_backend_failure(e) else "rejected")
+            raise
+        except BaseException:
+            # Task cancelled or stream closed early (client gone, hedge lost)
+            self.release(backend, "cancelled")
+            raise
+        self.release(backend, "ok", time.perf_counter() - start, sample)
+
+    # -----------------------------
+    # Hedging
+    # -----------------------------
+    def latency_percentile(self, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """
+        Percentile of recent completion latencies across the pool, None
+        until there are min_samples of them.
+        """
+        with self._lock:
+            samples = [s for backend in self.backends for s in backend.latencies]
+        if len(samples) < max(1, min_samples):
+            return None
+        return float(np.percentile(samples, percentile))
+
+    def record_hedge(self, won: bool = False):
+        with self._lock:
+            if won:
+                self.hedge_wins += 1
+            else:
+                self.hedges += 1
+        HEDGES.inc(result="won" if won else "sent")
+
+    # -----------------------------
+    # Stats
+    # -----------------------------
+    def stats(self) -> Dict:
+        with self._lock:
+            backends = []
+            for backend in self.backends:
+                latencies = np.array(backend.latencies, dtype="float64")
+                backends.append({
+                    "url": backend.url,
+                    "state": backend.state,
+                    "outstanding": backend.outstanding,
+                    "requests": backend.requests,
+                    "errors": backend.errors,
+                    "consecutive_failures": backend.consecutive_failures,
+                    "latency_p50_seconds": round(float(np.percentile(latencies, 50)), 4) if len(latencies) else None,
+                    "latency_p95_seconds": round(float(np.percentile(latencies, 95)), 4) if len(latencies) else None,
+                })
+            return {"backends": backends, "hedges": self.hedges, "hedge_wins": self.hedge_wins}
+
+    def gauges(self) -> Dict[str, Dict[tuple, float]]:
+        """
+        Per-backend values for Prometheus gauges, keyed by gauge.
+        """
+        with self._lock:
+            return {
+                "outstanding": {(b.url,): b.outstanding for b in self.backends},
+                "up": {(b.url,): int(b.state != "open") for b in self.backends},
+            }
@@ -0,0 +1,283 @@
+# src/rag/context.py
+"""
+Prompt context packing.
+
+The retrieved candidates are
+1. collapsed where adjacent chunks of one page overlap (the 200-char
+   windows of CHUNK_MODE=chars, or overlap_sentences), so shared text is
+   sent once;
+2. ordered by Maximal Marginal Relevance over their indexed vectors, so a
+   near-copy of a chunk already picked gives way to one that adds something;
+3. packed in that order into a token budget counted with the LLM's tokenizer.
+"""
+import logging
+import re
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.ingestion.chunker import WORD_RE
+from src.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CHUNK_NUMBER_RE = re.compile(r"_c(\d+)$")
+
+CONTEXT_TOKENS = REGISTRY.histogram(
+    "rag_context_tokens", "LLM tokens of retrieved context per prompt",
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768),
+)
+
+
+def format_chunk(metadata: Dict, text: str) -> str:
+    return f"[{metadata['doc_id']}|page {metadata['page']}] {text}\n"
+
+
+# -----------------------------
+# Token counting
+# -----------------------------
+class TokenCounter:
+    """
+    Token counts with the LLM's tokenizer (a Hugging Face tokenizer name or
+    path). LM Studio has no tokenize endpoint, so without one the count is
+    approximated by words and punctuation marks.
+    """
+    def __init__(self, tokenizer_name: str = ""):
+        self.tokenizer_name = tokenizer_name
+        self.tokenizer = None
+        if tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            except Exception as e:
+                logger.warning(
+                    "Could not load LLM tokenizer %r (%s), approximating token counts by words", tokenizer_name, e
+                )
+
+    def describe(self) -> str:
+        return self.tokenizer_name if self.tokenizer is not None else "words"
+
+    def count(self, texts: List[str]) -> np.ndarray:
+        """
+        Tokens of each text, one batched tokenizer call.
+        """
+        if not texts:
+            return np.zeros(0, dtype="int64")
+        if self.tokenizer is None:
+            return np.array([sum(1 for _ in WORD_RE.finditer(t)) for t in texts], dtype="int64")
+        encoded = self.tokenizer(texts, add_special_tokens=False, verbose=False)
+        return np.array([len(ids) for ids in encoded["input_ids"]], dtype="int64")
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Longest prefix of text that fits in max_tokens.
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is None:
+            starts = [m.start() for m in islice(WORD_RE.finditer(text), max_tokens + 1)]
+            return text if len(starts) <= max_tokens else text[:starts[max_tokens]].rstrip()
+
+        if getattr(self.tokenizer, "is_fast", False):
+            offsets = self.tokenizer(
+                text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+            )["offset_mapping"]
+            return text if len(offsets) <= max_tokens else text[:offsets[max_tokens - 1][1]]
+        ids = self.tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"]
+        return text if len(ids) <= max_tokens else self.tokenizer.decode(ids[:max_tokens])
+
+
+# -----------------------------
+# Overlapping neighbours
+# -----------------------------
+def _overlap(a: str, b: str, min_chars: int) -> int:
+    """
+    Length of the longest suffix of `a` that is a prefix of `b`, 0 if it
+    is shorter than min_chars.
+    """
+    probe = b[:min_chars]
+    if len(probe) < min_chars:
+        return 0
+    pos = a.find(probe, max(0, len(a) - len(b)))
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    return 0
+
+
+def collapse_overlaps(candidates: List[Dict], min_chars: int = 20) -> List[Tuple[List[int], str]]:
+    """
+    Merge runs of consecutive chunks (chunk_id ..._c<n>, same doc and page)
+    whose text overlaps into one passage. Returns (candidate indices, text)
+    per passage; a chunk that overlaps nothing is a passage of its own.
+    """
+    by_page: Dict[tuple, List[Tuple[int, int]]] = {}
+    for i, r in enumerate(candidates):
+        meta = r["metadata"]
+        match = CHUNK_NUMBER_RE.search(str(meta.get("chunk_id", "")))
+        if match:
+            by_page.setdefault((meta.get("doc_id"), meta.get("page")), []).append((int(match.group(1)), i))
+
+    members: List[Optional[List[int]]] = [[i] for i in range(len(candidates))]
+    texts = [r["text"] for r in candidates]
+    for chunks in by_page.values():
+        chunks.sort()
+        run = None  # (chunk number, passage the run was merged into)
+        for number, i in chunks:
+            if run is not None and number == run[0] + 1:
+                head = run[1]
+                overlap = _overlap(texts[head], texts[i], min_chars)
+                if overlap:
+                    texts[head] += texts[i][overlap:]
+                    members[head].append(i)
+                    members[i] = None
+                    run = (number, head)
+                    continue
+            run = (number, i)
+
+    return [(m, texts[i]) for i, m in enumerate(members) if m is not None]
+
+
+# -----------------------------
+# Maximal Marginal Relevance
+# -----------------------------
+def mmr_order(relevance: np.ndarray, vectors: Optional[np.ndarray], mmr_lambda: float) -> np.ndarray:
+    """
+    Greedy MMR over all items: each step takes the argmax of
+    lambda * relevance - (1 - lambda) * (max cosine similarity to the items
+    already taken). Without vectors, or with lambda >= 1, relevance order.
+    """
+    n = len(relevance)
+    if vectors is None or mmr_lambda >= 1 or n < 2:
+        return np.argsort(-relevance, kind="stable")
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms > 0, norms, 1.0)
+    similarity = unit @ unit.T
+
+    gain = mmr_lambda * relevance
+    redundancy = np.zeros(n, dtype="float32")
+    taken = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype="int64")
+    for step in range(n):
+        scores = gain - (1 - mmr_lambda) * redundancy
+        scores[taken] = -np.inf
+        best = int(np.argmax(scores))
+        order[step] = best
+        taken[best] = True
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return order
+
+
+def _relevance(candidates: List[Dict]) -> np.ndarray:
+    """
+    Cross-encoder score when the candidates were reranked, retrieval score
+    otherwise; min-max scaled to [0, 1] to weigh against cosine similarity.
+    """
+    field = "rerank_score" if all("rerank_score" in r for r in candidates) else "score"
+    scores = np.array([r[field] for r in candidates], dtype="float32")
+    lo, hi = scores.min(), scores.max()
+    return (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+
+
+# -----------------------------
+# Builder
+# -----------------------------
+class ContextBuilder:
+    """
+    Picks the retrieved chunks that go into the prompt and the context text
+    made of them (see the module docstring). `max_tokens` 0 means no budget;
+    `mmr_lambda` 1 ranks by relevance alone. `candidates` is how many chunks
+    to retrieve for MMR to choose from.
+    """
+    def __init__(
+        self,
+        counter: TokenCounter = None,
+        max_tokens: int = 2048,
+        mmr_lambda: float = 0.7,
+        candidates: int = 10,
+        min_overlap_chars: int = 20
+    ):
+        self.counter = counter or TokenCounter()
+        self.max_tokens = max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.candidates = candidates
+        self.min_overlap_chars = min_overlap_chars
+
+    @property
+    def diversifies(self) -> bool:
+        return self.mmr_lambda < 1
+
+    def pool_size(self, top_k: int) -> int:
+        return max(top_k, self.candidates) if self.diversifies else top_k
+
+    def build(
+        self,
+        candidates: List[Dict],
+        vectors: Optional[np.ndarray],
+        top_k: int
+    ) -> Tuple[List[Dict], str, Dict]:
+        """
+        (chosen passages, context text, stats) for up to top_k passages.
+        `vectors` holds one row per candidate, or None to skip diversity.
+        A passage is a result dict like the retriever's; a collapsed one
+        lists every chunk it covers under metadata["chunk_ids"].
+        """
+        stats = {
+            "tokens": 0,
+            "budget": self.max_tokens or None,
+            "candidates": len(candidates),
+            "chunks": 0,
+            "collapsed": 0,
+            "truncated": False,
+            "tokenizer": self.counter.describe(),
+        }
+        if not candidates or top_k <= 0:
+            return [], "", stats
+
+        passages = collapse_overlaps(candidates, self.min_overlap_chars)
+        stats["collapsed"] = len(candidates) - len(passages)
+
+        relevance = _relevance(candidates)
+        passage_relevance = np.array([relevance[m].max() for m, _ in passages], dtype="float32")
+        passage_vectors = None
+        if vectors is not None:
+            passage_vectors = np.stack([vectors[m].sum(axis=0) for m, _ in passages])
+        order = mmr_order(passage_relevance, passage_vectors, self.mmr_lambda)
+
+        lines = [format_chunk(candidates[m[0]]["metadata"], text) for m, text in passages]
+        tokens = self.counter.count(lines)
+
+        chosen, parts, used = [], [], 0
+        for p in order.tolist():
+            if len(chosen) == top_k:
+                break
+            members, text = passages[p]
+            line, n_tokens = lines[p], int(tokens[p])
+            if self.max_tokens and used + n_tokens > self.max_tokens:
+                if chosen:
+                    continue  # a shorter passage further down may still fit
+                # Nothing fits yet: cut the best passage down to the budget
+                metadata = candidates[members[0]]["metadata"]
+                header = int(self.counter.count([format_chunk(metadata, "")])[0])
+                text = self.counter.truncate(text, self.max_tokens - header)
+                line = format_chunk(metadata, text)
+                n_tokens = int(self.counter.count([line])[0])
+                stats["truncated"] = True
+            chosen.append((members, text))
+            parts.append(line)
+            used += n_tokens
+
+        retrieved = []
+        for rank, (members, text) in enumerate(chosen):
+            first = candidates[members[0]]
+            metadata = first["metadata"]
+            if len(members) > 1:
+                metadata = {**metadata, "chunk_ids": [candidates[i]["metadata"].get("chunk_id") for i in members]}
+            retrieved.append({**first, "rank": rank, "metadata": metadata, "text": text})
+
+        stats.update(tokens=used, chunks=len(retrieved))
+        CONTEXT_TOKENS.observe(used)
+        return retrieved, "".join(parts), stats
@@ -1,25 +1,114 @@
 # src/rag/rag.py
-from typing import Dict
+import asyncio
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.embeddings.chunk_store import ChunkFilter
 from src.retrieval.retriever_hybrid import Retriever
 from src.llm.llm import LLM
+from src.rag.context import ContextBuilder
+from src.retrieval.reranker import Reranker
+from src.utils.aio import with_timeout
+from src.utils.metrics import record_stage, stage_timer, timed
+from src.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
 
 class RAG:
-    def __init__(self, retriever: Retriever, llm: LLM):
+    def __init__(
+        self,
+        retriever: Retriever,
+        llm: LLM,
+        cache_size: int = 1024,
+        cache_ttl: float = 600.0,
+        llm_timeout: float = 120.0,
+        reranker: Reranker = None,
+        rerank_budget: float = 0.5,
+        context_builder: ContextBuilder = None
+    ):
         self.retriever = retriever
         self.llm = llm
+        self.llm_timeout = llm_timeout
+
+        # Optional cross-encoder pass over the retriever's candidates
+        self.reranker = reranker
+        self.rerank_budget = rerank_budget
+
+        # MMR selection + token budget of the prompt context
+        self.context_builder = context_builder or ContextBuilder()
+
+        # Prompt (i.e. question + retrieved chunks) -> answer
+        self.answer_cache = TTLCache(cache_size, cache_ttl)
+        self._cache_version = retriever.store.version
+
+    def cache_stats(self) -> Dict[str, dict]:
+        stats = {**self.retriever.cache_stats(), "answer": self.answer_cache.stats}
+        if self.reranker is not None:
+            stats["rerank"] = self.reranker.stats
+        return stats
+
+    def _candidates(self, top_k: int) -> int:
+        """
+        Chunks to retrieve for a top_k answer: with a reranker, at least the
+        retriever's default candidate set for it to choose from, and at
+        least the context builder's MMR pool.
+        """
+        candidates = self.context_builder.pool_size(top_k)
+        if self.reranker is None:
+            return candidates
+        return max(candidates, self.retriever.top_k)
+
+    def select(self, question: str, candidates: List[Dict]) -> List[Dict]:
+        """
+        Candidates in cross-encoder order if a reranker is set (and finishes
+        within its budget), in retrieval order otherwise. The context
+        builder picks the top_k that go into the prompt.
+        """
+        if self.reranker is None:
+            return candidates
+        with stage_timer("rerank"):
+            return self.reranker.rerank_within(question, candidates, len(candidates), self.rerank_budget)
 
-    def ask(self, question: str, top_k: int = 3) -> Dict:
-        # 1️⃣ Retrieve chunks
-        retrieved = self.retriever.retrieve(question)[:top_k]
+    async def aselect(self, question: str, candidates: List[Dict]) -> List[Dict]:
+        if self.reranker is None:
+            return candidates
+        return await timed(
+            "rerank", self.reranker.arerank_within(question, candidates, len(candidates), self.rerank_budget)
+        )
 
-        # 2️⃣ Build context string
-        context_chunks = ""
-        for r in retrieved:
-            meta = r["metadata"]
-            context_chunks += f"[{meta['doc_id']}|page {meta['page']}] {meta.get('text', '')}\n"
+    def _context_vectors(self, candidates: List[Dict]) -> Optional[np.ndarray]:
+        """
+        Indexed vectors of the candidates for MMR (no embedding calls);
+        None when diversity is off or a chunk left the index meanwhile.
+        """
+        if not self.context_builder.diversifies or len(candidates) < 2:
+            return None
+        try:
+            return self.retriever.store.get_vectors([r["key"] for r in candidates])
+        except RuntimeError as e:
+            logger.warning("No vectors for MMR, context in relevance order: %s", e)
+            return None
 
+    def build_prompt(self, question: str, candidates: List[Dict], top_k: int) -> Tuple[str, List[Dict], Dict]:
+        """
+        (prompt, chunks it is built from, context stats) for the best top_k
+        candidates that fit the context token budget.
+        """
+        with stage_timer("context_build"):
+            retrieved, context, stats = self.context_builder.build(
+                candidates, self._context_vectors(candidates), top_k
+            )
+            return self._build_prompt(question, context), retrieved, stats
+
+    def _build_prompt(self, question: str, context_chunks: str) -> str:
         # 3️⃣ Build prompt
-        prompt = f"""
+        return f"""
 You are a helpful assistant. Use the context below to answer the question.
 Provide an answer and include source references.
 
@@ -31,9 +120,276 @@ Question:
 
 Answer:
 """
-        # 4️⃣ Generate
-        answer = self.llm.generate_answer(prompt)
+
+    def _answer_cache_key(self, prompt: str) -> bytes:
+        if self._cache_version != self.retriever.store.version:
+            self.answer_cache.clear()
+            self._cache_version = self.retriever.store.version
+        return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+
+    def ask(self, question: str, top_k: int = 3, chunk_filter: ChunkFilter = None) -> Dict:
+        # 1️⃣ Retrieve chunks (only from chunk_filter's documents / pages, if given)
+        candidates = self.retriever.retrieve(
+            question, top_k=self._candidates(top_k), chunk_filter=chunk_filter
+        )
+        return self._answer(question, candidates, top_k)
+
+    def _answer(self, question: str, candidates: List[Dict], top_k: int) -> Dict:
+        # 2️⃣ Pick the chunks for the prompt (rerank, MMR, token budget)
+        candidates = self.select(question, candidates)
+        prompt, retrieved, context = self.build_prompt(question, candidates, top_k)
+
+        # 4️⃣ Generate (reuse the answer if this exact prompt was seen recently)
+        cache_key = self._answer_cache_key(prompt)
+        answer = self.answer_cache.get(cache_key)
+        if answer is None:
+            with stage_timer("llm"):
+                answer = self.llm.generate_answer(prompt)
+            self.answer_cache.put(cache_key, answer)
+        return {
+            "answer": answer,
+            "sources": [r["metadata"] for r in retrieved],
+            "context": context
+        }
+
+    async def aask(self, question: str, top_k: int = 3, chunk_filter: ChunkFilter = None) -> Dict:
+        """
+        Async ask() for the API: nothing here blocks the event loop, and
+        cancelling the task (client disconnect) stops the pending stage.
+        """
+        candidates = await self.retriever.aretrieve(
+            question, top_k=self._candidates(top_k), chunk_filter=chunk_filter
+        )
+        return await self._aanswer(question, candidates, top_k)
+
+    async def _aanswer(self, question: str, candidates: List[Dict], top_k: int) -> Dict:
+        candidates = await self.aselect(question, candidates)
+        prompt, retrieved, context = self.build_prompt(question, candidates, top_k)
+
+        cache_key = self._answer_cache_key(prompt)
+        answer = self.answer_cache.get(cache_key)
+        if answer is None:
+            answer = await timed("llm", with_timeout(
+                self.llm.agenerate_answer(prompt), self.llm_timeout, "llm"
+            ))
+            self.answer_cache.put(cache_key, answer)
         return {
             "answer": answer,
-            "sources": [r["metadata"] for r in retrieved]
+            "sources": [r["metadata"] for r in retrieved],
+            "context": context
+        }
+
+    # -----------------------------
+    # Batches
+    # -----------------------------
+    @staticmethod
+    def _batch_error(index: int, question: str, error: Exception) -> Dict:
+        return {
+            "index": index,
+            "question": question,
+            "error": {"type": type(error).__name__, "detail": str(error)},
+        }
+
+    def ask_many(
+        self,
+        questions: List[str],
+        top_k: int = 3,
+        chunk_filter: ChunkFilter = None,
+        concurrency: int = 4,
+        batch_size: int = 64
+    ) -> Iterator[Dict]:
+        """
+        ask() for many questions. Retrieval runs `batch_size` questions at a
+        time (one embedding pass and one FAISS search each), generation on
+        up to `concurrency` threads. Yields one result per question, in
+        completion order: {"index", "question", "answer", "sources", "context"}, or
+        {"index", "question", "error"} if that question failed.
+        """
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ask-many") as executor:
+            futures = {}
+            for start in range(0, len(questions), batch_size):
+                batch = questions[start:start + batch_size]
+                try:
+                    retrieved = self.retriever.retrieve_many(
+                        batch, top_k=self._candidates(top_k), chunk_filter=chunk_filter
+                    )
+                except Exception as e:
+                    for i, question in enumerate(batch, start):
+                        yield self._batch_error(i, question, e)
+                    continue
+                for i, (question, candidates) in enumerate(zip(batch, retrieved), start):
+                    futures[executor.submit(self._answer, question, candidates, top_k)] = (i, question)
+
+            for future in as_completed(futures):
+                i, question = futures[future]
+                try:
+                    yield {"index": i, "question": question, **future.result()}
+                except Exception as e:
+                    yield self._batch_error(i, question, e)
+
+    async def aask_many(
+        self,
+        questions: List[str],
+        top_k: int = 3,
+        chunk_filter: ChunkFilter = None,
+        concurrency: int = 4,
+        batch_size: int = 64
+    ) -> AsyncIterator[Dict]:
+        """
+        Async ask_many() for the API. Retrieval of later batches overlaps
+        the generations of earlier ones; at most `concurrency` LLM calls
+        are in flight. Closing the iterator cancels the outstanding work.
+        """
+        results = asyncio.Queue()
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = set()
+
+        async def answer(i: int, question: str, candidates: List[Dict]):
+            async with semaphore:
+                try:
+                    result = {"index": i, "question": question, **await self._aanswer(question, candidates, top_k)}
+                except Exception as e:
+                    result = self._batch_error(i, question, e)
+            results.put_nowait(result)
+
+        async def produce():
+            for start in range(0, len(questions), batch_size):
+                batch = questions[start:start + batch_size]
+                try:
+                    retrieved = await self.retriever.aretrieve_many(
+                        batch, top_k=self._candidates(top_k), chunk_filter=chunk_filter
+                    )
+                except Exception as e:
+                    for i, question in enumerate(batch, start):
+                        results.put_nowait(self._batch_error(i, question, e))
+                    continue
+                for i, (question, candidates) in enumerate(zip(batch, retrieved), start):
+                    task = asyncio.ensure_future(answer(i, question, candidates))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            for _ in range(len(questions)):
+                yield await results.get()
+        finally:
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    # -----------------------------
+    # Streaming
+    # -----------------------------
+    @staticmethod
+    def _stream_stats(start: float, llm_start: float, first_token_at: float, n_tokens: int, cached: bool) -> Dict:
+        """
+        Final event payload: time-to-first-token (from request start) and
+        generation throughput (from the moment the LLM call was sent).
+        """
+        end = time.perf_counter()
+        generation = end - llm_start
+        return {
+            "ttft_seconds": round(first_token_at - start, 4) if first_token_at else None,
+            "total_seconds": round(end - start, 4),
+            "completion_tokens": n_tokens,
+            "tokens_per_second": round(n_tokens / generation, 2) if n_tokens and generation > 0 else None,
+            "cached": cached
         }
+
+    @staticmethod
+    def _record_stream_stages(llm_start: float, first_token_at: float):
+        now = time.perf_counter()
+        if first_token_at is not None:
+            record_stage("llm_ttft", first_token_at - llm_start)
+        record_stage("llm", now - llm_start)
+
+    def stream_ask(
+        self,
+        question: str,
+        top_k: int = 3,
+        chunk_filter: ChunkFilter = None
+    ) -> Iterator[Tuple[str, object]]:
+        """
+        Generator version of ask(). Yields (event, data) pairs:
+        ("sources", [...]) once retrieval is done, ("token", str) per delta,
+        then ("done", stats), the context stats under stats["context"].
+        """
+        start = time.perf_counter()
+        candidates = self.retriever.retrieve(
+            question, top_k=self._candidates(top_k), chunk_filter=chunk_filter
+        )
+        candidates = self.select(question, candidates)
+        prompt, retrieved, context = self.build_prompt(question, candidates, top_k)
+        yield "sources", [r["metadata"] for r in retrieved]
+        cache_key = self._answer_cache_key(prompt)
+        answer = self.answer_cache.get(cache_key)
+        if answer is not None:
+            yield "token", answer
+            now = time.perf_counter()
+            yield "done", {**self._stream_stats(start, now, now, 0, cached=True), "context": context}
+            return
+
+        parts, first_token_at, usage = [], None, None
+        llm_start = time.perf_counter()
+        for chunk in self.llm.stream_answer(prompt):
+            if "usage" in chunk:
+                usage = chunk["usage"]
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(chunk["delta"])
+            yield "token", chunk["delta"]
+
+        self.answer_cache.put(cache_key, "".join(parts))
+        n_tokens = (usage or {}).get("completion_tokens") or len(parts)
+        self._record_stream_stages(llm_start, first_token_at)
+        yield "done", {**self._stream_stats(start, llm_start, first_token_at, n_tokens, cached=False), "context": context}
+
+    async def astream_ask(
+        self,
+        question: str,
+        top_k: int = 3,
+        chunk_filter: ChunkFilter = None
+    ) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Async stream_ask() for the API. llm_timeout bounds the wait for
+        each streamed delta, not the whole generation.
+        """
+        start = time.perf_counter()
+        candidates = await self.retriever.aretrieve(
+            question, top_k=self._candidates(top_k), chunk_filter=chunk_filter
+        )
+        candidates = await self.aselect(question, candidates)
+        prompt, retrieved, context = self.build_prompt(question, candidates, top_k)
+        yield "sources", [r["metadata"] for r in retrieved]
+        cache_key = self._answer_cache_key(prompt)
+        answer = self.answer_cache.get(cache_key)
+        if answer is not None:
+            yield "token", answer
+            now = time.perf_counter()
+            yield "done", {**self._stream_stats(start, now, now, 0, cached=True), "context": context}
+            return
+
+        parts, first_token_at, usage = [], None, None
+        llm_start = time.perf_counter()
+        stream = self.llm.astream_answer(prompt)
+        try:
+            while True:
+                try:
+                    chunk = await with_timeout(stream.__anext__(), self.llm_timeout, "llm")
+                except StopAsyncIteration:
+                    break
+                if "usage" in chunk:
+                    usage = chunk["usage"]
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(chunk["delta"])
+                yield "token", chunk["delta"]
+        finally:
+            await stream.aclose()
+
+        self.answer_cache.put(cache_key, "".join(parts))
+        n_tokens = (usage or {}).get("completion_tokens") or len(parts)
+        self._record_stream_stages(llm_start, first_token_at)
+        yield "done", {**self._stream_stats(start, llm_start, first_token_at, n_tokens, cached=False), "context": context}
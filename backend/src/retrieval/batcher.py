@@ -0,0 +1,121 @@
+# src/retrieval/batcher.py
+import asyncio
+import time
+from collections import defaultdict
+from typing import List, Tuple
+
+from src.utils.metrics import begin_timings, merge_timings
+
+
+class RetrievalBatcher:
+    """
+    Micro-batcher for concurrent aretrieve() calls.
+
+    Queries arriving within `max_wait_ms` of the first one (up to
+    `max_batch_size`) are embedded with one ST encode and one LM Studio
+    request, searched with one multi-row index.search, and the hits are
+    handed back to each waiting caller. A lone query waits at most
+    `max_wait_ms` longer than it would unbatched. Each caller is credited
+    with the stage timings of the batch it rode in.
+    """
+    def __init__(self, retriever, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.retriever = retriever
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._inflight = set()
+
+        self.batches = 0
+        self.queries = 0
+        self.max_seen = 0
+
+    def _ensure_worker(self):
+        # The queue and worker task belong to the loop that first uses them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(
+        self,
+        query: str,
+        nprobe: int = None,
+        ef_search: int = None,
+        top_k: int = None,
+        chunk_filter=None
+    ) -> List[Tuple[int, float]]:
+        """
+        Queue one query and wait for its [(chunk key, score), ...].
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((query, (nprobe, ef_search, top_k, chunk_filter), future))
+        hits, timings = await future
+        merge_timings(timings)
+        return hits
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that already gave up (disconnect / cancel) are skipped
+            batch = [item for item in batch if not item[2].done()]
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.queries += len(batch)
+            self.max_seen = max(self.max_seen, len(batch))
+
+            # Search params, top_k and filters are per call, so group by them
+            groups = defaultdict(list)
+            for item in batch:
+                groups[item[1]].append(item)
+
+            for options, items in groups.items():
+                task = asyncio.ensure_future(self._process(items, *options))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+    async def _process(self, items: list, nprobe: int, ef_search: int, top_k: int, chunk_filter):
+        # Stages of a shared batch are collected apart from any one caller
+        timings, _ = begin_timings()
+        try:
+            hits = await self.retriever.aretrieve_hits(
+                [item[0] for item in items], nprobe=nprobe, ef_search=ef_search,
+                top_k=top_k, chunk_filter=chunk_filter
+            )
+        except Exception as e:
+            for item in items:
+                if not item[2].done():
+                    item[2].set_exception(e)
+            return
+
+        for item, row_hits in zip(items, hits):
+            if not item[2].done():
+                item[2].set_result((row_hits, timings))
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_seen
+        }
@@ -0,0 +1,122 @@
+# src/retrieval/reranker.py
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sentence_transformers import CrossEncoder
+
+from src.retrieval.retriever_hybrid import normalize_query
+from src.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """
+    Cross-encoder rerank of retrieved chunks.
+
+    All (query, chunk) pairs that are not in the pair-score cache are scored
+    in one batched predict() call on a dedicated executor, so a busy
+    reranker can't starve retrieval. Callers pass a time budget; when it
+    runs out they get the dense order back (the scores still land in the
+    cache for the next request).
+    """
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        batch_size: int = 32,
+        max_length: int = 512,
+        cache_size: int = 4096,
+        cache_ttl: float = 600.0,
+        workers: int = 1
+    ):
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.batch_size = batch_size
+
+        # (normalized query, chunk text hash) -> score
+        self.pair_cache = TTLCache(cache_size, cache_ttl)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+
+        self.calls = 0
+        self.pairs_scored = 0
+        self.fallbacks = 0
+
+    def _pair_key(self, query: str, text: str) -> Tuple[str, bytes]:
+        return normalize_query(query), hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def score(self, query: str, retrieved: List[Dict]) -> np.ndarray:
+        """
+        Cross-encoder relevance score of each retrieved chunk for `query`.
+        """
+        keys = [self._pair_key(query, r["text"]) for r in retrieved]
+        scores = np.array([self.pair_cache.get(key) for key in keys], dtype="float32")
+
+        missing = [i for i in range(len(keys)) if np.isnan(scores[i])]
+        if missing:
+            pairs = [(query, retrieved[i]["text"]) for i in missing]
+            predicted = np.asarray(
+                self.model.predict(pairs, batch_size=self.batch_size), dtype="float32"
+            ).reshape(-1)
+            for i, score in zip(missing, predicted):
+                scores[i] = score
+                self.pair_cache.put(keys[i], float(score))
+            self.pairs_scored += len(missing)
+
+        self.calls += 1
+        return scores
+
+    def rerank(self, query: str, retrieved: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Best `top_k` of `retrieved` by cross-encoder score, re-ranked from 0.
+        """
+        if not retrieved:
+            return []
+        scores = self.score(query, retrieved)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [
+            {**retrieved[i], "rank": rank, "rerank_score": float(scores[i])}
+            for rank, i in enumerate(order)
+        ]
+
+    def _fallback(self, retrieved: List[Dict], top_k: int, budget: float) -> List[Dict]:
+        self.fallbacks += 1
+        logger.warning("Rerank exceeded %.2fs budget, using dense order", budget)
+        return retrieved[:top_k]
+
+    def rerank_within(self, query: str, retrieved: List[Dict], top_k: int, budget: float) -> List[Dict]:
+        """
+        rerank() with a time budget (seconds, <= 0 means none).
+        Falls back to the first top_k in dense order when it runs out.
+        """
+        future = self.executor.submit(self.rerank, query, retrieved, top_k)
+        try:
+            return future.result(timeout=budget if budget and budget > 0 else None)
+        except FutureTimeoutError:
+            return self._fallback(retrieved, top_k, budget)
+
+    async def arerank_within(self, query: str, retrieved: List[Dict], top_k: int, budget: float) -> List[Dict]:
+        """
+        Async rerank_within(): the model runs on the rerank executor.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self.rerank, query, retrieved, top_k)
+        if not budget or budget <= 0:
+            return await future
+        try:
+            # shield: on timeout the scoring finishes in the background and fills the cache
+            return await asyncio.wait_for(asyncio.shield(future), budget)
+        except asyncio.TimeoutError:
+            return self._fallback(retrieved, top_k, budget)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "pairs_scored": self.pairs_scored,
+            "fallbacks": self.fallbacks,
+            "pair_cache": self.pair_cache.stats,
+        }
@@ -1,13 +1,51 @@
 # src/retrieval/retriever_hybrid.py
-from typing import List, Dict
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple
 import numpy as np
 import faiss
 
+from src.embeddings.chunk_store import ChunkFilter
 from src.embeddings.embed_hybrid import HybridEmbeddingStore
+from src.retrieval.batcher import RetrievalBatcher
+from src.utils.aio import with_timeout
+from src.utils.metrics import stage_timer, timed
+from src.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+# dense: FAISS only; rrf / weighted: FAISS + BM25 fused
+FUSION_MODES = ("dense", "rrf", "weighted")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key for a query: case- and whitespace-insensitive.
+    """
+    return " ".join(query.lower().split())
 
 
 class Retriever:
-    def __init__(self, embedding_store: HybridEmbeddingStore, top_k: int = 5):
+    def __init__(
+        self,
+        embedding_store: HybridEmbeddingStore,
+        top_k: int = 5,
+        cache_size: int = 1024,
+        cache_ttl: float = 600.0,
+        cpu_workers: int = 4,
+        embed_timeout: float = 30.0,
+        search_timeout: float = 10.0,
+        batch_max_size: int = 1,
+        batch_max_wait_ms: float = 2.0,
+        fusion: str = "dense",
+        fusion_candidates: int = 50,
+        rrf_k: int = 60,
+        sparse_weight: float = 0.3
+    ):
         if not embedding_store.is_loaded():
             raise ValueError("HybridEmbeddingStore must be loaded before retrieval")
         self.store = embedding_store
@@ -15,48 +53,414 @@ class Retriever:
         self.lmstudio_url = embedding_store.lmstudio_url
         self.top_k = top_k
 
-    def get_hybrid_query_embedding(self, query: str) -> np.ndarray:
-        # ST embedding
-        st_emb = self.st_model.encode([query], convert_to_numpy=True).astype("float32")
+        # Dense + BM25 fusion: each side contributes `fusion_candidates` hits
+        if fusion not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode '{fusion}', expected one of {FUSION_MODES}")
+        self.fusion = fusion
+        self.fusion_candidates = fusion_candidates
+        self.rrf_k = rrf_k
+        self.sparse_weight = sparse_weight
+
+        # Query caches: normalized query -> embedding, embedding -> chunk keys
+        self.embedding_cache = TTLCache(cache_size, cache_ttl)
+        self.results_cache = TTLCache(cache_size, cache_ttl)
+        self._cache_version = embedding_store.version
+
+        # Async path: ST encoding and FAISS search run here, off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="retriever")
+        self.embed_timeout = embed_timeout
+        self.search_timeout = search_timeout
+
+        # Micro-batching of concurrent aretrieve() calls (batch_max_size <= 1 disables it)
+        self.batcher = None
+        if batch_max_size > 1:
+            self.batcher = RetrievalBatcher(self, max_batch_size=batch_max_size, max_wait_ms=batch_max_wait_ms)
 
-        # LM Studio embedding — safe wrapper
-        lm_emb = self.store.get_lmstudio_embeddings(query)
+    def check_index_version(self):
+        """
+        Drop cached queries as soon as the index has changed.
+        """
+        if self._cache_version != self.store.version:
+            self.embedding_cache.clear()
+            self.results_cache.clear()
+            self._cache_version = self.store.version
+
+    def warm_up(self):
+        """
+        Pay the one-off costs of the first query (model weights, index
+        pages) now, without calling LM Studio.
+        """
+        self._encode_st_queries(["warm-up"])
+        self.store.search(np.zeros((1, self.store.index.d), dtype="float32"), 1)
 
+    def _encode_st_queries(self, queries: List[str]) -> np.ndarray:
+        return self.st_model.encode(queries, convert_to_numpy=True).astype("float32")
+
+    def _combine_query_embedding(self, st_emb: np.ndarray, lm_emb: np.ndarray) -> np.ndarray:
         # Concatenate
         hybrid_emb = np.concatenate([st_emb, lm_emb], axis=1)
 
         # Safety padding for FAISS
         if hybrid_emb.shape[1] != self.store.index.d:
-            print(f"[WARNING] Hybrid embedding dim {hybrid_emb.shape[1]} != FAISS index dim {self.store.index.d}, padding with zeros")
-            padded = np.zeros((1, self.store.index.d), dtype="float32")
-            padded[0, :hybrid_emb.shape[1]] = hybrid_emb
+            logger.warning(
+                "Hybrid embedding dim %d != FAISS index dim %d, padding with zeros",
+                hybrid_emb.shape[1], self.store.index.d
+            )
+            padded = np.zeros((len(hybrid_emb), self.store.index.d), dtype="float32")
+            padded[:, :hybrid_emb.shape[1]] = hybrid_emb
             hybrid_emb = padded
 
         # Normalize
         faiss.normalize_L2(hybrid_emb)
         return hybrid_emb
 
+    def get_hybrid_query_embedding(self, query: str) -> np.ndarray:
+        return self.get_hybrid_query_embeddings([query])
+
+    def get_hybrid_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """
+        Query embeddings, (len(queries), d). Cache misses are encoded with
+        one ST call and one LM Studio request.
+        """
+        self.check_index_version()
+        cache_keys = [normalize_query(q) for q in queries]
+        rows = [self.embedding_cache.get(key) for key in cache_keys]
+
+        missing = {}
+        for i, (key, row) in enumerate(zip(cache_keys, rows)):
+            if row is None:
+                missing.setdefault(key, queries[i])
+
+        if missing:
+            miss_keys = list(missing)
+            miss_queries = list(missing.values())
+            # ST embedding
+            with stage_timer("st_encode"):
+                st_emb = self._encode_st_queries(miss_queries)
+
+            # LM Studio embedding — safe wrapper
+            with stage_timer("lm_embed"):
+                lm_emb, failed = self.store.get_lmstudio_embeddings_with_failures(miss_queries)
+                failed = set(failed)
+
+            hybrid_emb = self._combine_query_embedding(st_emb, lm_emb)
+
+            computed = {}
+            for j, key in enumerate(miss_keys):
+                computed[key] = hybrid_emb[j:j + 1]
+                # Don't cache a query whose LM Studio half fell back to zeros
+                if j not in failed:
+                    self.embedding_cache.put(key, computed[key])
+            rows = [row if row is not None else computed[key] for key, row in zip(cache_keys, rows)]
+
+        return np.concatenate(rows, axis=0)
+
+    async def aget_hybrid_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """
+        Async, batched get_hybrid_query_embedding: cache misses are encoded
+        with one ST call (executor) and one LM Studio request, concurrently.
+        Returns a (len(queries), d) matrix.
+        """
+        self.check_index_version()
+        cache_keys = [normalize_query(q) for q in queries]
+        rows = [self.embedding_cache.get(key) for key in cache_keys]
+
+        # Identical queries in one batch are only embedded once
+        missing = {}
+        for i, (key, row) in enumerate(zip(cache_keys, rows)):
+            if row is None:
+                missing.setdefault(key, queries[i])
+
+        if missing:
+            miss_keys = list(missing)
+            miss_queries = list(missing.values())
+            loop = asyncio.get_running_loop()
+            st_future = loop.run_in_executor(self.executor, self._encode_st_queries, miss_queries)
+            st_emb, (lm_emb, failed) = await with_timeout(
+                asyncio.gather(
+                    timed("st_encode", st_future),
+                    timed("lm_embed", self.store.aget_lmstudio_embeddings(miss_queries))
+                ),
+                self.embed_timeout,
+                "embed"
+            )
+            hybrid_emb = self._combine_query_embedding(st_emb, lm_emb)
+
+            failed = set(failed)
+            computed = {}
+            for j, key in enumerate(miss_keys):
+                computed[key] = hybrid_emb[j:j + 1]
+                if j not in failed:
+                    self.embedding_cache.put(key, computed[key])
+            rows = [row if row is not None else computed[key] for key, row in zip(cache_keys, rows)]
+
+        return np.concatenate(rows, axis=0)
 
-    def retrieve(self, query: str) -> List[Dict]:
+    async def aget_hybrid_query_embedding(self, query: str) -> np.ndarray:
+        """
+        Async twin of get_hybrid_query_embedding.
+        """
+        return await self.aget_hybrid_query_embeddings([query])
+
+    def _results_cache_key(
+        self,
+        query_embedding: np.ndarray,
+        nprobe: int,
+        ef_search: int,
+        top_k: int,
+        chunk_filter: ChunkFilter
+    ) -> Tuple:
+        return (
+            hashlib.blake2b(query_embedding.tobytes(), digest_size=16).digest(),
+            top_k,
+            chunk_filter,
+            self.fusion,
+            nprobe,
+            ef_search,
+            self.store.version
+        )
+
+    def _fetch_k(self, top_k: int) -> int:
+        if self.fusion == "dense":
+            return top_k
+        return max(top_k, self.fusion_candidates)
+
+    def _search(
+        self,
+        query_embeddings: np.ndarray,
+        nprobe: int,
+        ef_search: int,
+        top_k: int,
+        chunk_filter: ChunkFilter = None
+    ) -> List[List[Tuple[int, float]]]:
+        # One FAISS search for all rows (ids are stable chunk keys, -1 when fewer than k hits)
+        distances, indices = self.store.search(
+            query_embeddings, self._fetch_k(top_k), nprobe=nprobe, ef_search=ef_search, chunk_filter=chunk_filter
+        )
+        return [
+            [(int(idx), float(score)) for score, idx in zip(row_scores, row_ids) if idx != -1]
+            for row_scores, row_ids in zip(distances, indices)
+        ]
+
+    def _sparse_search(
+        self,
+        queries: List[str],
+        top_k: int,
+        chunk_filter: ChunkFilter = None
+    ) -> List[List[Tuple[int, float]]]:
+        return [self.store.sparse_search(q, self._fetch_k(top_k), chunk_filter) for q in queries]
+
+    def _fuse(
+        self,
+        dense: List[Tuple[int, float]],
+        sparse: List[Tuple[int, float]],
+        top_k: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Merge dense and BM25 hit lists into the final top_k.
+        rrf:      sum of 1 / (rrf_k + rank) over both lists
+        weighted: min-max normalized scores, BM25 weighted by sparse_weight
+        """
+        scores = defaultdict(float)
+        if self.fusion == "rrf":
+            for hits in (dense, sparse):
+                for rank, (key, _) in enumerate(hits):
+                    scores[key] += 1.0 / (self.rrf_k + rank + 1)
+        else:
+            for hits, weight in ((dense, 1.0 - self.sparse_weight), (sparse, self.sparse_weight)):
+                if not hits:
+                    continue
+                lo, hi = min(s for _, s in hits), max(s for _, s in hits)
+                for key, score in hits:
+                    scores[key] += weight * ((score - lo) / (hi - lo) if hi > lo else 1.0)
+
+        fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return fused[:top_k]
+
+    def _build_results(self, hits: List[Tuple[int, float]]) -> List[Dict]:
+        results = []
+        for idx, score in hits:
+            metadata = self.store.get_chunk(idx)
+            if metadata is None:
+                continue
+            text = metadata.pop("text", "")
+            results.append({
+                "rank": len(results),
+                "key": int(idx),
+                "score": score,
+                "metadata": metadata,
+                "text": text
+            })
+
+        return results
+
+    def retrieve(
+        self,
+        query: str,
+        nprobe: int = None,
+        ef_search: int = None,
+        top_k: int = None,
+        chunk_filter: ChunkFilter = None
+    ) -> List[Dict]:
         """
         Retrieve top-k most relevant chunks for a query.
+        nprobe / ef_search optionally override the ANN index's search params.
+        top_k defaults to the retriever's; chunk_filter restricts the search
+        to matching chunks (see ChunkFilter).
         Returns list of dicts with:
         - rank
+        - key (chunk key in the index)
         - score (cosine similarity)
         - metadata
+        - text (read from the chunk store for these hits only)
         """
-        query_embedding = self.get_hybrid_query_embedding(query)
+        return self.retrieve_many([query], nprobe, ef_search, top_k, chunk_filter)[0]
 
-        # FAISS search
-        distances, indices = self.store.index.search(query_embedding, self.top_k)
+    def retrieve_many(
+        self,
+        queries: List[str],
+        nprobe: int = None,
+        ef_search: int = None,
+        top_k: int = None,
+        chunk_filter: ChunkFilter = None
+    ) -> List[List[Dict]]:
+        """
+        retrieve() for a batch of queries: one embedding pass and one
+        multi-row FAISS search for every query that misses the caches.
+        """
+        top_k = top_k or self.top_k
+        sparse_future = None
+        if self.fusion != "dense":
+            # BM25 runs while the queries are embedded and searched in FAISS
+            sparse_future = self.executor.submit(self._sparse_search, queries, top_k, chunk_filter)
 
-        results = []
-        for rank, idx in enumerate(indices[0]):
-            metadata = self.store.metadata[idx]
-            results.append({
-                "rank": rank,
-                "score": float(distances[0][rank]),
-                "metadata": metadata
-            })
+        query_embeddings = self.get_hybrid_query_embeddings(queries)
 
-        return results
+        cache_keys = [
+            self._results_cache_key(query_embeddings[i:i + 1], nprobe, ef_search, top_k, chunk_filter)
+            for i in range(len(queries))
+        ]
+        hits = [self.results_cache.get(key) for key in cache_keys]
+        missing = [i for i, h in enumerate(hits) if h is None]
+        if missing:
+            with stage_timer("faiss_search"):
+                found = self._search(query_embeddings[missing], nprobe, ef_search, top_k, chunk_filter)
+            if sparse_future is not None:
+                with stage_timer("bm25_wait"):
+                    sparse = sparse_future.result()
+                found = [self._fuse(dense, sparse[i], top_k) for i, dense in zip(missing, found)]
+            for i, row_hits in zip(missing, found):
+                hits[i] = row_hits
+                self.results_cache.put(cache_keys[i], row_hits)
+        elif sparse_future is not None:
+            sparse_future.cancel()
+
+        with stage_timer("chunk_fetch"):
+            return [self._build_results(row_hits) for row_hits in hits]
+
+    async def aretrieve_hits(
+        self,
+        queries: List[str],
+        nprobe: int = None,
+        ef_search: int = None,
+        top_k: int = None,
+        chunk_filter: ChunkFilter = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Batched async search: one embedding pass and one FAISS search
+        (in the bounded executor) for every query that misses the caches.
+        In fusion mode the BM25 search runs alongside embedding + FAISS.
+        top_k and chunk_filter apply to every query (see retrieve).
+        Returns [(chunk key, score), ...] per query.
+        """
+        top_k = top_k or self.top_k
+        loop = asyncio.get_running_loop()
+        sparse_future = None
+        if self.fusion != "dense":
+            sparse_future = asyncio.ensure_future(timed("bm25_search", loop.run_in_executor(
+                self.executor, self._sparse_search, queries, top_k, chunk_filter
+            )))
+
+        try:
+            query_embeddings = await self.aget_hybrid_query_embeddings(queries)
+        except BaseException:
+            if sparse_future is not None:
+                sparse_future.cancel()
+            raise
+
+        cache_keys = [
+            self._results_cache_key(query_embeddings[i:i + 1], nprobe, ef_search, top_k, chunk_filter)
+            for i in range(len(queries))
+        ]
+        hits = [self.results_cache.get(key) for key in cache_keys]
+        missing = [i for i, h in enumerate(hits) if h is None]
+
+        if missing:
+            found = await with_timeout(
+                timed("faiss_search", loop.run_in_executor(
+                    self.executor, self._search, query_embeddings[missing], nprobe, ef_search, top_k, chunk_filter
+                )),
+                self.search_timeout,
+                "search"
+            )
+            if sparse_future is not None:
+                sparse = await with_timeout(sparse_future, self.search_timeout, "search")
+                found = [self._fuse(dense, sparse[i], top_k) for i, dense in zip(missing, found)]
+            for i, row_hits in zip(missing, found):
+                hits[i] = row_hits
+                self.results_cache.put(cache_keys[i], row_hits)
+        elif sparse_future is not None:
+            sparse_future.cancel()
+
+        return hits
+
+    async def aretrieve(
+        self,
+        query: str,
+        nprobe: int = None,
+        ef_search: int = None,
+        top_k: int = None,
+        chunk_filter: ChunkFilter = None
+    ) -> List[Dict]:
+        """
+        Async retrieve(): FAISS search and chunk reads run in the bounded
+        executor, each stage under its own timeout. With a batcher,
+        concurrent calls share one embedding request and one search.
+        """
+        top_k = top_k or self.top_k
+        if self.batcher is not None:
+            hits = await self.batcher.submit(
+                query, nprobe=nprobe, ef_search=ef_search, top_k=top_k, chunk_filter=chunk_filter
+            )
+        else:
+            hits = (await self.aretrieve_hits([query], nprobe, ef_search, top_k, chunk_filter))[0]
+
+        loop = asyncio.get_running_loop()
+        return await timed("chunk_fetch", loop.run_in_executor(self.executor, self._build_results, hits))
+
+    async def aretrieve_many(
+        self,
+        queries: List[str],
+        nprobe: int = None,
+        ef_search: int = None,
+        top_k: int = None,
+        chunk_filter: ChunkFilter = None
+    ) -> List[List[Dict]]:
+        """
+        Async retrieve_many(): the whole list is one batch, so it bypasses
+        the micro-batcher.
+        """
+        hits = await self.aretrieve_hits(queries, nprobe, ef_search, top_k, chunk_filter)
+        loop = asyncio.get_running_loop()
+        return await timed("chunk_fetch", loop.run_in_executor(
+            self.executor, lambda: [self._build_results(row_hits) for row_hits in hits]
+        ))
+
+    def cache_stats(self) -> Dict[str, dict]:
+        stats = {
+            "query_embedding": self.embedding_cache.stats,
+            "retrieval": self.results_cache.stats,
+        }
+        if self.batcher is not None:
+            stats["batcher"] = self.batcher.stats
+        return stats
@@ -1,6 +1,10 @@
+import logging
 import os
 import urllib.request
 
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
 # -----------------------------
 # Config
 # -----------------------------
@@ -17,8 +21,8 @@ os.makedirs(MODEL_DIR, exist_ok=True)
 # Download
 # -----------------------------
 if os.path.exists(MODEL_PATH):
-    print(f"Model already exists at {MODEL_PATH}, skipping download.")
+    logger.info("Model already exists at %s, skipping download.", MODEL_PATH)
 else:
-    print(f"Downloading GPT4All-J 3B to {MODEL_PATH} ...")
+    logger.info("Downloading GPT4All-J 3B to %s ...", MODEL_PATH)
     urllib.request.urlretrieve(MODEL_URL, MODEL_PATH)
-    print("Download complete!")
+    logger.info("Download complete!")
@@ -0,0 +1,28 @@
+# src/utils/aio.py
+import asyncio
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class StageTimeoutError(asyncio.TimeoutError):
+    """
+    A pipeline stage (embed / search / llm ...) exceeded its time budget.
+    """
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"{stage} timed out after {seconds:.1f}s")
+        self.stage = stage
+        self.seconds = seconds
+
+
+async def with_timeout(aw: Awaitable[T], seconds: float, stage: str) -> T:
+    """
+    asyncio.wait_for that names the stage that ran out of time.
+    seconds <= 0 means no limit.
+    """
+    if not seconds or seconds <= 0:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, seconds)
+    except asyncio.TimeoutError:
+        raise StageTimeoutError(stage, seconds) from None
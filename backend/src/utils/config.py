@@ -0,0 +1,191 @@
+# src/utils/config.py
+"""
+Shared settings for the API, build_index.py and ingestion.
+Every value can be overridden with an environment variable of the same name.
+"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+# -----------------------------
+# Models / endpoints
+# -----------------------------
+ST_MODEL_NAME = os.getenv("ST_MODEL_NAME", "all-MiniLM-L6-v2")
+LMSTUDIO_URL = os.getenv("LMSTUDIO_URL", "http://127.0.0.1:1234")
+LMSTUDIO_EMBED_MODEL = os.getenv("LMSTUDIO_EMBED_MODEL", "text-embedding-nomic-embed-text-v1.5")
+LLM_API_URL = os.getenv("LLM_API_URL", f"{LMSTUDIO_URL}/v1/chat/completions")
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "mistral-3-3b")
+
+# -----------------------------
+# Index files
+# -----------------------------
+INDEX_PATH = os.getenv("INDEX_PATH", "data/index/faiss.index")
+METADATA_PATH = os.getenv("METADATA_PATH", "data/index/metadata.pkl")  # legacy, migrated on load
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "data/index/chunks")
+SPARSE_INDEX_PATH = os.getenv("SPARSE_INDEX_PATH", "data/index/bm25")
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH", "data/index/dedup")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "data/index/vectors")  # float32 vectors of sq8 / fp16 / ivf_pq
+# Hash the whole FAISS file against the manifest on load (sizes are always checked)
+INDEX_VERIFY_CHECKSUMS = _env_int("INDEX_VERIFY_CHECKSUMS", 0) == 1
+
+# -----------------------------
+# LM Studio embedding client
+# -----------------------------
+LMSTUDIO_BATCH_SIZE = _env_int("LMSTUDIO_BATCH_SIZE", 64)
+LMSTUDIO_MAX_IN_FLIGHT = _env_int("LMSTUDIO_MAX_IN_FLIGHT", 4)
+LMSTUDIO_MAX_RETRIES = _env_int("LMSTUDIO_MAX_RETRIES", 3)
+LMSTUDIO_BACKOFF_SECONDS = _env_float("LMSTUDIO_BACKOFF_SECONDS", 0.5)
+LMSTUDIO_CONNECT_TIMEOUT = _env_float("LMSTUDIO_CONNECT_TIMEOUT", 10)
+LMSTUDIO_READ_TIMEOUT = _env_float("LMSTUDIO_READ_TIMEOUT", 60)
+
+# -----------------------------
+# Embedding cache
+# -----------------------------
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "data/cache/embeddings")
+EMBEDDING_CACHE_MAX_ENTRIES = _env_int("EMBEDDING_CACHE_MAX_ENTRIES", 1_000_000)
+
+# -----------------------------
+# Query caches (embedding / retrieval / answer tiers)
+# -----------------------------
+QUERY_CACHE_SIZE = _env_int("QUERY_CACHE_SIZE", 1024)
+QUERY_CACHE_TTL_SECONDS = _env_float("QUERY_CACHE_TTL_SECONDS", 600)
+
+# -----------------------------
+# FAISS index type (flat | hnsw | ivf_flat | ivf_pq | sq8 | fp16)
+# -----------------------------
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+HNSW_M = _env_int("HNSW_M", 32)
+HNSW_EF_CONSTRUCTION = _env_int("HNSW_EF_CONSTRUCTION", 200)
+HNSW_EF_SEARCH = _env_int("HNSW_EF_SEARCH", 64)
+IVF_NLIST = _env_int("IVF_NLIST", 0)  # 0 = ~4 * sqrt(n_vectors)
+IVF_NPROBE = _env_int("IVF_NPROBE", 16)
+PQ_M = _env_int("PQ_M", 64)
+PQ_NBITS = _env_int("PQ_NBITS", 8)
+RECALL_SAMPLE = _env_int("RECALL_SAMPLE", 1000)
+# Compressed types: candidates fetched per result and rescored with the float32 vectors (0 = off)
+RESCORE_FACTOR = _env_int("RESCORE_FACTOR", 4)
+
+# -----------------------------
+# Text extraction (process pool)
+# -----------------------------
+EXTRACT_WORKERS = _env_int("EXTRACT_WORKERS", os.cpu_count() or 1)
+EXTRACT_FILE_TIMEOUT_SECONDS = _env_float("EXTRACT_FILE_TIMEOUT_SECONDS", 300)
+EXTRACT_PAGES_PER_TASK = _env_int("EXTRACT_PAGES_PER_TASK", 50)  # larger PDFs are split by page range
+
+# -----------------------------
+# Chunking (tokens | chars)
+# -----------------------------
+CHUNK_MODE = os.getenv("CHUNK_MODE", "tokens")
+CHUNK_MAX_TOKENS = _env_int("CHUNK_MAX_TOKENS", 0)  # 0 = the embedding models' limit
+LMSTUDIO_MAX_TOKENS = _env_int("LMSTUDIO_MAX_TOKENS", 2048)  # context of the LM Studio embedding model
+
+# -----------------------------
+# Near-duplicate chunks (MinHash / LSH), off by default
+# -----------------------------
+# Estimated Jaccard similarity of word shingles at which a chunk is merged
+# into an indexed one instead of embedded (e.g. 0.9); 0 disables
+DEDUP_THRESHOLD = _env_float("DEDUP_THRESHOLD", 0.0)
+DEDUP_NUM_PERM = _env_int("DEDUP_NUM_PERM", 64)
+DEDUP_SHINGLE = _env_int("DEDUP_SHINGLE", 5)  # words per shingle
+
+# -----------------------------
+# Streaming build (build_index.py)
+# -----------------------------
+BUILD_BATCH_SIZE = _env_int("BUILD_BATCH_SIZE", 256)
+BUILD_CHECKPOINT_EVERY = _env_int("BUILD_CHECKPOINT_EVERY", 10_000)
+IVF_TRAIN_SIZE = _env_int("IVF_TRAIN_SIZE", 20_000)  # chunks buffered to train IVF indexes
+
+# -----------------------------
+# /upload ingestion jobs
+# -----------------------------
+UPLOAD_WORKERS = _env_int("UPLOAD_WORKERS", 2)  # files extracted + chunked at once
+UPLOAD_MAX_PENDING = _env_int("UPLOAD_MAX_PENDING", 64)  # unfinished jobs before /upload answers 429
+# Uploads ready within this window (up to the max) share one embedding pass and index save
+UPLOAD_COALESCE_MAX_JOBS = _env_int("UPLOAD_COALESCE_MAX_JOBS", 16)
+UPLOAD_COALESCE_WAIT_MS = _env_float("UPLOAD_COALESCE_WAIT_MS", 200)
+UPLOAD_CHUNK_BYTES = _env_int("UPLOAD_CHUNK_BYTES", 1 << 20)  # upload copied to disk in chunks of this size
+UPLOAD_JOB_TTL_SECONDS = _env_float("UPLOAD_JOB_TTL_SECONDS", 3600)  # finished jobs stay queryable this long
+
+# -----------------------------
+# Async /ask pipeline
+# -----------------------------
+CPU_WORKERS = _env_int("CPU_WORKERS", 4)  # ST encode + FAISS search executor
+EMBED_TIMEOUT_SECONDS = _env_float("EMBED_TIMEOUT_SECONDS", 30)
+SEARCH_TIMEOUT_SECONDS = _env_float("SEARCH_TIMEOUT_SECONDS", 10)
+LLM_TIMEOUT_SECONDS = _env_float("LLM_TIMEOUT_SECONDS", 120)
+LLM_MAX_CONNECTIONS = _env_int("LLM_MAX_CONNECTIONS", 100)
+ASK_MAX_TOP_K = _env_int("ASK_MAX_TOP_K", 50)  # largest top_k a request may ask for
+
+# LLM backend pool: comma-separated chat completion URLs; empty = LLM_API_URL alone
+LLM_API_URLS = [url.strip() for url in os.getenv("LLM_API_URLS", "").split(",") if url.strip()]
+# Send a second request once a completion is slower than this latency percentile (0 = never)
+LLM_HEDGE_PERCENTILE = _env_float("LLM_HEDGE_PERCENTILE", 0)
+LLM_HEDGE_MIN_SAMPLES = _env_int("LLM_HEDGE_MIN_SAMPLES", 20)  # completions seen before hedging starts
+LLM_BREAKER_FAILURES = _env_int("LLM_BREAKER_FAILURES", 5)  # failures in a row that eject a backend
+LLM_BREAKER_COOLDOWN_SECONDS = _env_float("LLM_BREAKER_COOLDOWN_SECONDS", 30)  # before it gets a trial request
+
+# /ask/batch: questions per request, LLM calls in flight, questions per retrieval batch
+ASK_BATCH_MAX_QUESTIONS = _env_int("ASK_BATCH_MAX_QUESTIONS", 10_000)
+ASK_BATCH_CONCURRENCY = _env_int("ASK_BATCH_CONCURRENCY", 4)
+ASK_BATCH_RETRIEVAL_SIZE = _env_int("ASK_BATCH_RETRIEVAL_SIZE", 64)
+
+# Retrieval micro-batching of concurrent queries (max size <= 1 disables it)
+RETRIEVAL_BATCH_MAX_SIZE = _env_int("RETRIEVAL_BATCH_MAX_SIZE", 32)
+RETRIEVAL_BATCH_MAX_WAIT_MS = _env_float("RETRIEVAL_BATCH_MAX_WAIT_MS", 2)
+
+# -----------------------------
+# Dense + BM25 fusion (dense | rrf | weighted)
+# -----------------------------
+RETRIEVAL_FUSION = os.getenv("RETRIEVAL_FUSION", "rrf")
+FUSION_CANDIDATES = _env_int("FUSION_CANDIDATES", 50)
+RRF_K = _env_int("RRF_K", 60)
+SPARSE_WEIGHT = _env_float("SPARSE_WEIGHT", 0.3)
+
+# -----------------------------
+# Metadata filters (/ask "filters")
+# -----------------------------
+# Filters matching at most this many chunks score them directly; larger ones
+# go into the FAISS search as an ID selector
+FILTER_EXACT_MAX = _env_int("FILTER_EXACT_MAX", 2048)
+
+# -----------------------------
+# Multi-worker serving (uvicorn --workers N)
+# -----------------------------
+# Memory-map the index read-only so workers share it; /upload is refused
+INDEX_READ_ONLY = _env_int("INDEX_READ_ONLY", 0) == 1
+INDEX_RELOAD_SECONDS = _env_float("INDEX_RELOAD_SECONDS", 10)  # read-only workers pick up new saves; 0 = never
+# Unix socket path or host:port of `python -m src.embeddings.embed_service`; empty = model in each process
+EMBED_SERVICE = os.getenv("EMBED_SERVICE", "")
+EMBED_SERVICE_MAX_BATCH = _env_int("EMBED_SERVICE_MAX_BATCH", 64)
+EMBED_SERVICE_MAX_WAIT_MS = _env_float("EMBED_SERVICE_MAX_WAIT_MS", 2)
+EMBED_SERVICE_TIMEOUT_SECONDS = _env_float("EMBED_SERVICE_TIMEOUT_SECONDS", 30)
+
+# -----------------------------
+# Prompt context (MMR selection within a token budget)
+# -----------------------------
+# Hugging Face name / path of the LLM's tokenizer; empty = count words and punctuation
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "")
+CONTEXT_MAX_TOKENS = _env_int("CONTEXT_MAX_TOKENS", 2048)  # 0 = no limit
+CONTEXT_MMR_LAMBDA = _env_float("CONTEXT_MMR_LAMBDA", 0.7)  # relevance vs diversity; 1 = relevance only
+CONTEXT_CANDIDATES = _env_int("CONTEXT_CANDIDATES", 10)  # chunks retrieved for MMR to choose from
+
+# -----------------------------
+# Cross-encoder rerank (empty model name disables it)
+# -----------------------------
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+RERANK_CANDIDATES = _env_int("RERANK_CANDIDATES", 20)  # retriever over-fetch when reranking
+RERANK_BUDGET_SECONDS = _env_float("RERANK_BUDGET_SECONDS", 0.5)
+RERANK_BATCH_SIZE = _env_int("RERANK_BATCH_SIZE", 32)
+RERANK_CACHE_SIZE = _env_int("RERANK_CACHE_SIZE", 8192)
+
+# -----------------------------
+# Logging (DEBUG adds per-batch embedding details)
+# -----------------------------
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -0,0 +1,48 @@
+# src/utils/fileio.py
+import os
+import shutil
+from pathlib import Path
+
+
+def atomic_write(path: Path, write_fn):
+    """
+    Write to a temp file next to `path`, then rename over it,
+    so a crash never leaves a half-written file behind.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def append_file(path: Path, committed_bytes: int, data: bytes):
+    """
+    Write `data` right after the first `committed_bytes` of `path`,
+    dropping anything a crashed save left past them.
+    """
+    with open(path, "r+b" if path.exists() else "w+b") as f:
+        f.truncate(committed_bytes)
+        f.seek(committed_bytes)
+        f.write(data)
+
+
+def swap_dir(tmp: Path, path: Path):
+    """
+    Put the complete directory `tmp` in place of `path`; the old one is
+    moved aside first and removed once the new one is in place.
+    """
+    old = path.with_name(path.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if path.exists():
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def dir_nbytes(path: Path) -> int:
+    """
+    Size of the files directly in `path` (0 if it does not exist).
+    """
+    if not path.exists():
+        return 0
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
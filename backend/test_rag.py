@@ -1,22 +1,38 @@
 # test_rag.py
+"""
+Manual smoke test: ask one question against the index built by
+build_index.py, with the LM Studio settings from src/utils/config.py.
+"""
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
-from src.embeddings.embed import EmbeddingStore
-from src.retrieval.retriever import Retriever
+from src.embeddings.embed_hybrid import HybridEmbeddingStore
+from src.retrieval.retriever_hybrid import Retriever
 from src.llm.llm import LLM
 from src.rag.rag import RAG
+from src.utils import config
 
-# Load FAISS index + metadata
-store = EmbeddingStore()
+# Load FAISS index + chunk store
+store = HybridEmbeddingStore(
+    st_model_name=config.ST_MODEL_NAME,
+    lmstudio_url=config.LMSTUDIO_URL,
+    lmstudio_model=config.LMSTUDIO_EMBED_MODEL,
+    index_path=config.INDEX_PATH,
+    metadata_path=config.METADATA_PATH,
+    chunk_store_path=config.CHUNK_STORE_PATH,
+    sparse_index_path=config.SPARSE_INDEX_PATH,
+    dedup_index_path=config.DEDUP_INDEX_PATH,
+    vector_store_path=config.VECTOR_STORE_PATH,
+    dedup_threshold=config.DEDUP_THRESHOLD
+)
 store.load()
 
 # Initialize Retriever
-retriever = Retriever(store, top_k=3)
+retriever = Retriever(store, top_k=3, fusion=config.RETRIEVAL_FUSION)
 
-# Initialize LLM
-llm = LLM(model_path="models/ggml-gpt4all-j-v1.3-groovy.bin")
+# Initialize LLM (LM Studio chat completions endpoint)
+llm = LLM(api_url=config.LLM_API_URL, model_name=config.LLM_MODEL_NAME)
 
 # Initialize RAG
 rag = RAG(retriever, llm)
@@ -29,3 +45,4 @@ print("Answer:\n", result["answer"])
 print("\nSources:")
 for src in result["sources"]:
     print(f"- {src['doc_id']} page {src.get('page', 'N/A')}")
+print(f"\nContext: {result['context']['tokens']} tokens from {result['context']['chunks']} chunks")
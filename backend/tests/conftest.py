@@ -0,0 +1,82 @@
+# tests/conftest.py
+"""
+Shared fixtures: a stub SentenceTransformer, the fake LM Studio server from
+benchmarks/ for embeddings and chat completions, and stores built on them
+in a temporary directory.
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fake_server import FakeLMServer, hashed_embedding  # noqa: E402
+
+ST_DIM = 32
+LM_DIM = 16
+
+
+class StubEncoder:
+    """
+    Stands in for the SentenceTransformer: hashed bag-of-words vectors, so
+    texts sharing words are close, and nothing is downloaded.
+    """
+    def __init__(self, dim: int = ST_DIM):
+        self.dim = dim
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        self.calls += 1
+        texts = [texts] if isinstance(texts, str) else texts
+        return np.array([hashed_embedding(t, self.dim) for t in texts], dtype="float32").reshape(len(texts), self.dim)
+
+
+def make_chunk(doc_id: str, page: int, n: int, text: str, source: str = "pdf") -> dict:
+    return {
+        "text": text,
+        "metadata": {"doc_id": doc_id, "page": page, "source": source, "chunk_id": f"{doc_id}_p{page}_c{n}"},
+    }
+
+
+@pytest.fixture(scope="session")
+def lm_server():
+    server = FakeLMServer(
+        embedding_dim=LM_DIM,
+        embed_latency_ms=0,
+        embed_item_ms=0,
+        chat_latency_ms=0,
+        token_latency_ms=0,
+        answer_tokens=5
+    )
+    with server:
+        yield server
+
+
+@pytest.fixture
+def make_store(tmp_path, lm_server):
+    """
+    make_store(name="index", **HybridEmbeddingStore kwargs) -> store in
+    tmp_path/name, embedding with StubEncoder + the fake server.
+    """
+    from src.embeddings.embed_hybrid import HybridEmbeddingStore
+
+    def make(name: str = "index", **kwargs):
+        kwargs.setdefault("lmstudio_url", lm_server.url)
+        kwargs.setdefault("lmstudio_model", "fake-embed")
+        kwargs.setdefault("lmstudio_max_retries", 0)
+        store = HybridEmbeddingStore(
+            st_model_name="stub-encoder",
+            index_path=str(tmp_path / name / "faiss.index"),
+            metadata_path=str(tmp_path / name / "metadata.pkl"),
+            **kwargs
+        )
+        if not kwargs.get("st_service"):
+            store._st_model = StubEncoder()
+        return store
+
+    return make
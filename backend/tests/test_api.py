@@ -0,0 +1,177 @@
+# tests/test_api.py
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import main, upload
+from src.api.warmup import Warmup
+from src.ingestion.jobs import IngestQueue
+from src.llm.pool import LLMUnavailableError
+from src.utils import config
+from src.utils.aio import StageTimeoutError
+
+
+@pytest.fixture
+def app_state(tmp_path, make_store, monkeypatch):
+    """
+    The app wired to a test store and a finished warm-up; no lifespan, so
+    nothing loads the configured index.
+    """
+    monkeypatch.setattr(config, "EXTRACT_WORKERS", 1)
+    monkeypatch.setattr(config, "EXTRACT_FILE_TIMEOUT_SECONDS", 0)
+    monkeypatch.setattr(config, "CHUNK_MODE", "chars")
+    monkeypatch.setattr(upload, "UPLOAD_DIR", tmp_path / "uploads")
+    (tmp_path / "uploads").mkdir()
+
+    warmup = Warmup(lambda: None)
+    warmup.run()
+    store = make_store()
+    queue = IngestQueue(store, coalesce_wait=0.05)
+    monkeypatch.setattr(main.app.state, "warmup", warmup)
+    monkeypatch.setattr(main.app.state, "embedding_store", store)
+    monkeypatch.setattr(main.app.state, "ingest_queue", queue)
+    yield main.app.state
+    queue.close()
+
+
+@pytest.fixture
+def client(app_state):
+    return TestClient(main.app)
+
+
+def post_txt(client, name: str, text: str):
+    return client.post("/upload", files={"file": (name, text.encode("utf-8"), "text/plain")})
+
+
+def test_upload_is_accepted_and_ingested(client, app_state):
+    response = post_txt(client, "notes.txt", "notes about the quarterly report")
+    assert response.status_code == 202
+    body = response.json()
+    assert body["filename"] == "notes.txt"
+    assert body["status_url"] == f"/upload/{body['job_id']}"
+
+    deadline = time.monotonic() + 10
+    status = client.get(body["status_url"]).json()
+    while status["status"] not in ("done", "failed") and time.monotonic() < deadline:
+        time.sleep(0.02)
+        status = client.get(body["status_url"]).json()
+    assert status["status"] == "done"
+    assert app_state.embedding_store.chunks.keys_for_doc("notes.txt")
+    assert client.get("/upload/missing").status_code == 404
+
+
+def test_upload_is_refused_when_the_queue_is_full(client, app_state, tmp_path, monkeypatch):
+    queue = app_state.ingest_queue
+    queue.max_pending = 1
+    monkeypatch.setattr(queue, "_prepare", lambda job: None)  # never finishes
+    assert post_txt(client, "a.txt", "first").status_code == 202
+
+    response = post_txt(client, "b.txt", "second")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+    # The refused file is not left behind
+    assert [path.name.split("_", 1)[1] for path in (tmp_path / "uploads").iterdir()] == ["a.txt"]
+
+
+def test_upload_is_refused_on_a_read_only_worker(client, app_state, make_store, tmp_path):
+    app_state.embedding_store = make_store("replica", read_only=True)
+
+    response = post_txt(client, "notes.txt", "notes")
+    assert response.status_code == 409
+    assert "read-only" in response.json()["detail"]
+    assert not any((tmp_path / "uploads").iterdir())
+
+
+def test_routes_wait_for_warm_up(client, app_state):
+    app_state.warmup = Warmup(lambda: None)
+    assert client.get("/health").status_code == 200
+    ready = client.get("/ready")
+    assert ready.status_code == 503 and ready.json()["status"] == "pending"
+    response = client.post("/ask", json={"question": "anything"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+    app_state.warmup.run()
+    assert client.get("/ready").status_code == 200
+
+
+class ScriptedRAG:
+    """
+    rag.aask stand-in: answers after `delay`, or raises `error`.
+    """
+    def __init__(self, error: Exception = None, delay: float = 0.0):
+        self.error = error
+        self.delay = delay
+        self.cancelled = False
+
+    async def aask(self, question, top_k=3, chunk_filter=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return {"answer": f"answer to {question}", "sources": [], "context": ""}
+
+
+def test_ask_answers(client, monkeypatch):
+    monkeypatch.setattr(main, "rag", ScriptedRAG())
+    response = client.post("/ask", json={"question": "what is new"})
+    assert response.status_code == 200
+    assert response.json()["answer"] == "answer to what is new"
+
+
+@pytest.mark.parametrize("error, status", [
+    (StageTimeoutError("llm", 30.0), 504),
+    (LLMUnavailableError("every LLM backend is unavailable"), 503),
+])
+def test_ask_maps_pipeline_errors_to_statuses(client, monkeypatch, error, status):
+    monkeypatch.setattr(main, "rag", ScriptedRAG(error=error))
+    response = client.post("/ask", json={"question": "what is new"})
+    assert response.status_code == status
+    assert response.json()["detail"] == str(error)
+
+
+class GoneRequest:
+    async def is_disconnected(self) -> bool:
+        return True
+
+
+def test_ask_is_cancelled_when_the_client_disconnects(monkeypatch):
+    rag = ScriptedRAG(delay=10.0)
+    monkeypatch.setattr(main, "rag", rag)
+
+    async def ask():
+        start = time.monotonic()
+        response = await main.ask_question(main.AskRequest(question="slow"), GoneRequest())
+        await asyncio.sleep(0)  # let the cancelled task unwind
+        return response, time.monotonic() - start
+
+    response, seconds = asyncio.run(ask())
+    assert response.status_code == 499
+    assert seconds < 1.0
+    assert rag.cancelled
+
+
+class BrokenUpload:
+    """
+    UploadFile stand-in whose second read fails, as on a client disconnect.
+    """
+    def __init__(self):
+        self.reads = 0
+
+    async def read(self, size: int) -> bytes:
+        self.reads += 1
+        if self.reads > 1:
+            raise OSError("connection reset")
+        return b"x" * size
+
+
+def test_failed_upload_copy_leaves_no_partial_file(tmp_path):
+    path = tmp_path / "partial.txt"
+    with pytest.raises(OSError):
+        asyncio.run(upload.save_upload(BrokenUpload(), path, chunk_size=16))
+    assert not path.exists()
@@ -0,0 +1,107 @@
+# tests/test_batcher.py
+import asyncio
+
+from conftest import make_chunk
+from src.retrieval.batcher import RetrievalBatcher
+from src.retrieval.retriever_hybrid import Retriever
+
+
+class RecordingRetriever:
+    """
+    aretrieve_hits stand-in: one hit per query, keyed by its length.
+    """
+    def __init__(self, fail: bool = False, delay: float = 0.0):
+        self.calls = []
+        self.fail = fail
+        self.delay = delay
+
+    async def aretrieve_hits(self, queries, nprobe=None, ef_search=None, top_k=None, chunk_filter=None):
+        self.calls.append((list(queries), top_k))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("search failed")
+        return [[(len(q), 1.0)] for q in queries]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_queries_share_one_search():
+    retriever = RecordingRetriever()
+    batcher = RetrievalBatcher(retriever, max_batch_size=8, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit("q" * n, top_k=5) for n in range(1, 6)))
+
+    results = run(main())
+    assert results == [[(n, 1.0)] for n in range(1, 6)]
+    assert len(retriever.calls) == 1
+    assert batcher.stats["max_batch_size"] == 5
+
+
+def test_batches_are_capped_at_max_batch_size():
+    retriever = RecordingRetriever()
+    batcher = RetrievalBatcher(retriever, max_batch_size=3, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(f"q{i}") for i in range(7)))
+
+    run(main())
+    assert [len(queries) for queries, _ in retriever.calls] == [3, 3, 1]
+
+
+def test_batch_is_split_by_search_options():
+    retriever = RecordingRetriever()
+    batcher = RetrievalBatcher(retriever, max_batch_size=8, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit("a", top_k=5), batcher.submit("bb", top_k=10), batcher.submit("ccc", top_k=5)
+        )
+
+    assert run(main()) == [[(1, 1.0)], [(2, 1.0)], [(3, 1.0)]]
+    assert sorted(retriever.calls) == [(["a", "ccc"], 5), (["bb"], 10)]
+    assert batcher.stats["batches"] == 1
+
+
+def test_search_error_reaches_every_caller():
+    batcher = RetrievalBatcher(RecordingRetriever(fail=True), max_batch_size=8, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(f"q{i}") for i in range(3)), return_exceptions=True)
+
+    results = run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_cancelled_caller_does_not_break_the_batch():
+    retriever = RecordingRetriever(delay=0.05)
+    batcher = RetrievalBatcher(retriever, max_batch_size=8, max_wait_ms=20)
+
+    async def main():
+        gone = asyncio.ensure_future(batcher.submit("gone"))
+        kept = asyncio.ensure_future(batcher.submit("kept"))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept
+
+    assert run(main()) == [(4, 1.0)]
+
+
+def test_batched_retrieval_matches_unbatched(make_store):
+    store = make_store()
+    store.add([
+        make_chunk(f"doc{i}.pdf", 1, 0, f"{word} chapter about {word} and {word}")
+        for i, word in enumerate(["rivers", "mountains", "deserts", "oceans", "forests"])
+    ])
+    queries = ["rivers", "oceans and deserts", "forests", "mountains"]
+    plain = Retriever(store, top_k=2)
+    batched = Retriever(store, top_k=2, batch_max_size=8, batch_max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(batched.aretrieve(q) for q in queries))
+
+    results = run(main())
+    assert [[r["key"] for r in rows] for rows in results] == [[r["key"] for r in plain.retrieve(q)] for q in queries]
+    assert batched.batcher.stats["batches"] == 1
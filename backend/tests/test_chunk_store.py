@@ -0,0 +1,91 @@
+# tests/test_chunk_store.py
+import pytest
+
+from conftest import make_chunk
+from src.embeddings.chunk_store import ChunkStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChunkStore(tmp_path / "chunks")
+    store.reset()
+    return store
+
+
+def reopen(store: ChunkStore) -> ChunkStore:
+    reopened = ChunkStore(store.path)
+    reopened.open()
+    return reopened
+
+
+def test_rows_round_trip_before_and_after_save(store):
+    pdf = make_chunk("a.pdf", 3, 0, "Grüße — ünïcode text")
+    pdf["metadata"]["section"] = "intro"
+    txt = make_chunk("b.txt", None, 0, "plain text", source="txt")
+    store.append(1, pdf)
+    store.append(2, txt)
+
+    expected = {
+        1: {"doc_id": "a.pdf", "page": 3, "source": "pdf", "chunk_id": "a.pdf_p3_c0",
+            "section": "intro", "text": "Grüße — ünïcode text"},
+        2: {"doc_id": "b.txt", "page": None, "source": "txt", "chunk_id": "b.txt_pNone_c0", "text": "plain text"},
+    }
+    assert {key: store.get(key) for key in (1, 2)} == expected
+    store.save()
+    assert {key: store.get(key) for key in (1, 2)} == expected
+    assert {key: reopen(store).get(key) for key in (1, 2)} == expected
+
+
+def test_remove_pending_and_saved_rows(store):
+    for key in range(4):
+        store.append(key, make_chunk("a.pdf", key, 0, f"text {key}"))
+    store.save()
+    store.append(10, make_chunk("a.pdf", 10, 0, "pending"))
+
+    assert store.remove(1) and store.remove(10)
+    assert not store.remove(1) and not store.remove(99)
+    assert len(store) == 3
+    assert sorted(store.keys_for_doc("a.pdf")) == [0, 2, 3]
+    store.save()
+
+    reopened = reopen(store)
+    assert len(reopened) == 3
+    assert reopened.get(1) is None and reopened.get(10) is None
+    assert sorted(reopened.keys().tolist()) == [0, 2, 3]
+    assert [key for key, _ in reopened.items()] == [0, 2, 3]
+
+
+def test_keys_for_doc_spans_saves(store):
+    store.append(1, make_chunk("a.pdf", 1, 0, "one"))
+    store.append(2, make_chunk("b.pdf", 1, 0, "two"))
+    store.save()
+    store.append(3, make_chunk("a.pdf", 2, 0, "three"))
+    assert sorted(store.keys_for_doc("a.pdf")) == [1, 3]
+    store.save()
+    assert sorted(reopen(store).keys_for_doc("a.pdf")) == [1, 3]
+    assert reopen(store).keys_for_doc("missing.pdf") == []
+
+
+def test_locations_are_stored_apart_from_rows(store):
+    store.append(1, make_chunk("a.pdf", 1, 0, "shared text"))
+    store.add_location(1, {"doc_id": "b.pdf", "page": 4, "source": "pdf", "chunk_id": "b.pdf_p4_c0"})
+    store.save()
+    assert reopen(store).get(1)["locations"] == [["a.pdf", 1], ["b.pdf", 4]]
+
+    store.remove_locations(1, "b.pdf")
+    store.save()
+    assert "locations" not in reopen(store).get(1)
+
+
+def test_reset_replaces_the_store_on_save(store):
+    store.append(1, make_chunk("a.pdf", 1, 0, "old"))
+    store.save()
+    store.reset()
+    store.append(2, make_chunk("b.pdf", 1, 0, "new"))
+    assert reopen(store).get(1) is not None  # nothing replaced until save
+    store.save()
+
+    reopened = reopen(store)
+    assert reopened.get(1) is None
+    assert reopened.get(2)["text"] == "new"
+    assert not store.path.with_name(store.path.name + ".tmp").exists()
@@ -0,0 +1,83 @@
+# tests/test_context.py
+import numpy as np
+
+from src.rag.context import ContextBuilder, TokenCounter, collapse_overlaps, mmr_order
+
+
+def result(doc_id: str, page: int, n: int, text: str, score: float) -> dict:
+    return {
+        "key": hash((doc_id, page, n)),
+        "score": score,
+        "metadata": {"doc_id": doc_id, "page": page, "chunk_id": f"{doc_id}_p{page}_c{n}"},
+        "text": text,
+    }
+
+
+def test_collapse_merges_overlapping_neighbours_only():
+    candidates = [
+        result("a.pdf", 1, 0, "The quick brown fox jumps over the lazy dog", 0.9),
+        result("a.pdf", 1, 1, "jumps over the lazy dog and runs into the woods", 0.8),
+        result("a.pdf", 1, 3, "into the woods where nobody can find it again", 0.7),  # not adjacent
+        result("a.pdf", 2, 2, "the lazy dog and runs into the woods, page two", 0.6),  # other page
+    ]
+    passages = collapse_overlaps(candidates, min_chars=10)
+    assert passages[0] == ([0, 1], "The quick brown fox jumps over the lazy dog and runs into the woods")
+    assert [members for members, _ in passages[1:]] == [[2], [3]]
+
+
+def test_mmr_demotes_near_duplicates():
+    relevance = np.array([1.0, 0.95, 0.6], dtype="float32")
+    vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]], dtype="float32")
+    assert mmr_order(relevance, vectors, 0.5).tolist() == [0, 2, 1]
+    assert mmr_order(relevance, vectors, 1.0).tolist() == [0, 1, 2]
+    assert mmr_order(relevance, None, 0.5).tolist() == [0, 1, 2]
+
+
+def test_build_prefers_a_diverse_passage_over_a_near_copy():
+    candidates = [
+        result("a.pdf", 1, 0, "solar panels convert sunlight to power", 0.9),
+        result("b.pdf", 1, 0, "solar panels convert sunlight into power", 0.88),
+        result("c.pdf", 4, 0, "wind turbines turn moving air into power", 0.8),
+        result("d.pdf", 2, 0, "unrelated note", 0.1),
+    ]
+    vectors = np.array([[1.0, 0.0], [0.99, 0.05], [0.1, 1.0], [-1.0, 0.0]], dtype="float32")
+    builder = ContextBuilder(TokenCounter(), max_tokens=0, mmr_lambda=0.5)
+    chosen, context, stats = builder.build(candidates, vectors, top_k=2)
+    assert [c["metadata"]["doc_id"] for c in chosen] == ["a.pdf", "c.pdf"]
+    assert context.startswith("[a.pdf|page 1] solar panels")
+    assert stats["chunks"] == 2 and not stats["truncated"]
+
+
+def test_build_skips_passages_that_overflow_the_budget():
+    long_text = " ".join(["filler"] * 40)
+    candidates = [
+        result("a.pdf", 1, 0, "short answer one", 0.9),
+        result("b.pdf", 1, 0, long_text, 0.8),
+        result("c.pdf", 1, 0, "short answer two", 0.7),
+    ]
+    builder = ContextBuilder(TokenCounter(), max_tokens=24, mmr_lambda=1.0)
+    chosen, _, stats = builder.build(candidates, None, top_k=3)
+    assert [c["metadata"]["doc_id"] for c in chosen] == ["a.pdf", "c.pdf"]
+    assert stats["tokens"] == 22
+
+
+def test_build_truncates_when_nothing_fits():
+    candidates = [result("a.pdf", 1, 0, " ".join(f"w{i}" for i in range(100)), 0.9)]
+    builder = ContextBuilder(TokenCounter(), max_tokens=15, mmr_lambda=1.0)
+    chosen, context, stats = builder.build(candidates, None, top_k=1)
+    assert stats["truncated"]
+    assert stats["tokens"] <= 15
+    assert chosen[0]["text"].startswith("w0 w1")
+    assert TokenCounter().count([context])[0] <= 15
+
+
+def test_collapsed_passage_lists_its_chunks():
+    candidates = [
+        result("a.pdf", 1, 0, "alpha beta gamma delta epsilon zeta", 0.9),
+        result("a.pdf", 1, 1, "delta epsilon zeta eta theta iota", 0.8),
+    ]
+    builder = ContextBuilder(TokenCounter(), max_tokens=0, mmr_lambda=1.0, min_overlap_chars=10)
+    chosen, _, stats = builder.build(candidates, None, top_k=5)
+    assert stats["collapsed"] == 1
+    assert chosen[0]["metadata"]["chunk_ids"] == ["a.pdf_p1_c0", "a.pdf_p1_c1"]
+    assert chosen[0]["text"] == "alpha beta gamma delta epsilon zeta eta theta iota"
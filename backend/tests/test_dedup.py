@@ -0,0 +1,163 @@
+# tests/test_dedup.py
+import copy
+import threading
+
+import numpy as np
+
+from conftest import make_chunk
+from src.embeddings.dedup_index import MinHasher, NearDuplicateIndex
+
+SHARED = "the constitution guarantees freedom of expression and assembly to every citizen of the republic"
+
+
+def places(store, text: str, k: int = 10) -> set:
+    """
+    (doc_id, page) of every location behind the top-k results for text.
+    """
+    _, keys = store.search(store.embed_texts([text]), k)
+    found = set()
+    for key in keys[0]:
+        if key < 0:
+            continue
+        meta = store.get_chunk(int(key))
+        found.add((meta["doc_id"], meta["page"]))
+        found.update((doc, page) for doc, page in meta.get("locations", []))
+    return found
+
+
+def doc_a():
+    return [make_chunk("A.pdf", 1, 0, SHARED), make_chunk("A.pdf", 2, 0, "alpha pages cover the budget law and taxes")]
+
+
+def doc_b():
+    return [make_chunk("B.pdf", 1, 0, SHARED), make_chunk("B.pdf", 2, 0, "beta pages cover elections and voting rules")]
+
+
+def test_duplicate_is_merged_into_survivor(make_store):
+    store = make_store(dedup_threshold=0.9)
+    store.add(doc_a())
+    assert store.add(doc_b()) == 1
+
+    survivor = store.get_chunk(store.search(store.embed_texts([SHARED]), 1)[1][0][0])
+    assert survivor["chunk_id"] == "A.pdf_p1_c0"
+    assert survivor["locations"] == [["A.pdf", 1], ["B.pdf", 1]]
+
+
+def test_replace_embeds_late_survivors_without_the_lock(make_store, monkeypatch):
+    store = make_store(dedup_threshold=0.9)
+    store.add(doc_a())
+    store.save()
+    chunks = doc_b()
+    keep = store.plan_dedupe(chunks, replacing=["B.pdf"])
+    assert keep == [False, True]
+    embeddings, failed = store.embed_texts_with_failures([c["text"] for c, k in zip(chunks, keep) if k])
+
+    store.delete("A.pdf")  # another writer: SHARED is no longer a duplicate
+    lock_free = []
+
+    def try_lock():
+        if store.lock.acquire(timeout=1):
+            store.lock.release()
+            lock_free.append(True)
+
+    embed_texts = store.embed_texts_with_failures
+
+    def watching(texts):
+        other = threading.Thread(target=try_lock)
+        other.start()
+        other.join()
+        return embed_texts(texts)
+
+    monkeypatch.setattr(store, "embed_texts_with_failures", watching)
+    added = store.replace(["B.pdf"], chunks, keep, embeddings, failed)
+    assert [c["metadata"]["chunk_id"] for c in added] == ["B.pdf_p1_c0", "B.pdf_p2_c0"]
+    assert lock_free == [True]
+    assert ("B.pdf", 1) in places(store, SHARED)
+
+
+def test_dedupe_does_not_mutate_input(make_store):
+    store = make_store(dedup_threshold=0.9)
+    chunks = doc_a() + doc_b()
+    before = copy.deepcopy(chunks)
+    store.add(chunks)
+    assert chunks == before
+
+
+def test_reupload_of_deleted_survivor_keeps_other_document(make_store):
+    store = make_store(dedup_threshold=0.9)
+    store.add(doc_a())
+    store.add(doc_b())
+
+    store.delete("A.pdf")
+    assert ("B.pdf", 1) in places(store, SHARED)
+    assert ("A.pdf", 1) not in places(store, SHARED)
+
+    store.add(doc_a())
+    assert {("A.pdf", 1), ("B.pdf", 1)} <= places(store, SHARED)
+    # B's page 1 is a chunk of B again, not a row keyed by A's chunk_id
+    assert sorted(m["chunk_id"] for _, m in store.chunks.items()) == [
+        "A.pdf_p2_c0", "B.pdf_p1_c0", "B.pdf_p2_c0"
+    ]
+    assert store.index.ntotal == 3
+    assert len(store.sparse.search("constitution", 10)) == 1
+
+
+def test_reupload_survives_save_and_reload(make_store):
+    store = make_store(dedup_threshold=0.9)
+    store.add(doc_a())
+    store.add(doc_b())
+    store.save()
+    store.delete("A.pdf")
+    store.save()
+    store.add(doc_a())
+    store.save()
+
+    reopened = make_store(dedup_threshold=0.9)
+    reopened.load()
+    assert {("A.pdf", 1), ("B.pdf", 1)} <= places(reopened, SHARED)
+
+    # B's fingerprint moved with it: a third copy merges into B's chunk
+    reopened.add([make_chunk("C.pdf", 4, 0, SHARED)])
+    assert {("A.pdf", 1), ("B.pdf", 1), ("C.pdf", 4)} <= places(reopened, SHARED)
+
+
+def test_delete_drops_locations_held_by_other_documents(make_store):
+    store = make_store(dedup_threshold=0.9)
+    store.add(doc_a())
+    store.add(doc_b())
+    store.save()
+    store.delete("B.pdf")
+    assert places(store, SHARED) == {("A.pdf", 1), ("A.pdf", 2)}
+
+
+def test_merges_append_locations_without_rewriting_rows(make_store):
+    store = make_store(dedup_threshold=0.9)
+    store.add(doc_a())
+    store.save()
+    for i in range(20):
+        store.add([make_chunk(f"copy{i}.pdf", 1, 0, SHARED)])
+        store.save()
+    # One row per distinct chunk, one location per merged copy
+    assert store.chunks.rows == 2
+    assert store.chunks.loc_rows == 20
+
+
+def test_near_duplicate_index_remove_after_save(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "dedup", threshold=0.9)
+    hasher = MinHasher()
+    texts = [f"document number {i} talks about subject {i} in some detail" for i in range(50)]
+    for key, text in enumerate(texts):
+        index.add(key, hasher.signature(text))
+    index.save()
+
+    assert index.find(hasher.signature(texts[7])) == 7
+    assert index.remove([7, 8, 999]) == 2
+    assert index.find(hasher.signature(texts[7])) is None
+    index.save()
+
+    reopened = NearDuplicateIndex(tmp_path / "dedup", threshold=0.9)
+    reopened.open()
+    assert len(reopened) == 48
+    assert reopened.find(hasher.signature(texts[8])) is None
+    assert reopened.find(hasher.signature(texts[9])) == 9
+    assert np.array_equal(np.sort(reopened._rows_of([9, 10])), [9, 10])
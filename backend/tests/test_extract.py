@@ -0,0 +1,71 @@
+# tests/test_extract.py
+import threading
+
+import pytest
+
+from src.ingestion.extract import ExtractionPool, ExtractionStats, extract_documents, iter_extract
+
+
+@pytest.fixture
+def pool():
+    pool = ExtractionPool(2)
+    yield pool
+    pool.close()
+
+
+def write_txts(tmp_path, n: int, prefix: str = "doc"):
+    paths = []
+    for i in range(n):
+        path = tmp_path / f"{prefix}{i}.txt"
+        path.write_text(f"{prefix} text number {i}", encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def test_private_pool_keeps_input_order(tmp_path):
+    paths = write_txts(tmp_path, 5)
+    docs = list(extract_documents(paths, workers=2, file_timeout=30))
+    assert [d["text"] for d in docs] == [f"doc text number {i}" for i in range(5)]
+
+
+def test_shared_pool_reuses_its_workers(tmp_path, pool):
+    paths = write_txts(tmp_path, 4)
+    assert len(list(extract_documents(paths, workers=2, pool=pool))) == 4
+    pids = sorted(w.process.pid for w in pool._idle)
+    assert len(pids) == 2
+
+    assert len(list(extract_documents(paths, workers=2, pool=pool))) == 4
+    assert sorted(w.process.pid for w in pool._idle) == pids
+
+
+def test_shared_pool_is_bounded_across_threads(tmp_path, pool):
+    results = {}
+
+    def run(name):
+        paths = write_txts(tmp_path, 3, prefix=name)
+        results[name] = [d["text"] for d in extract_documents(paths, workers=2, pool=pool)]
+
+    threads = [threading.Thread(target=run, args=(f"t{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=60)
+
+    assert {name: len(texts) for name, texts in results.items()} == {f"t{i}": 3 for i in range(4)}
+    assert pool._size <= 2
+
+
+def test_failed_file_is_reported_and_worker_kept(tmp_path, pool):
+    bad = tmp_path / "notes.docx"
+    bad.write_text("unsupported", encoding="utf-8")
+    stats = ExtractionStats()
+    docs = list(iter_extract([bad] + write_txts(tmp_path, 1), workers=1, stats=stats, pool=pool))
+    assert [d["text"] for _, d in docs] == ["doc text number 0"]
+    assert "Unsupported file type" in stats.failed[0]["error"]
+    assert len(pool._idle) == 1
+
+
+def test_closed_pool_refuses_work(tmp_path, pool):
+    pool.close()
+    with pytest.raises(RuntimeError):
+        list(extract_documents(write_txts(tmp_path, 1), pool=pool))
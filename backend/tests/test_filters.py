@@ -0,0 +1,80 @@
+# tests/test_filters.py
+import numpy as np
+import pytest
+
+from conftest import make_chunk
+from src.embeddings.chunk_store import ChunkFilter, ChunkStore
+from src.embeddings.embed_hybrid import chunk_key
+
+SHARED = "the constitution guarantees freedom of expression and assembly to every citizen of the republic"
+
+
+def corpus():
+    chunks = []
+    for doc in ("A.pdf", "B.pdf", "notes.txt"):
+        source = "txt" if doc.endswith(".txt") else "pdf"
+        for page in range(1, 6):
+            chunks.append(make_chunk(doc, page, 0, f"{doc} page {page} discusses topic {page} of {doc}", source))
+    return chunks
+
+
+def keys_of(chunks, doc_ids=None, sources=None, page_from=None, page_to=None):
+    f = ChunkFilter(doc_ids, sources, page_from, page_to)
+    return np.unique(np.array([chunk_key(c["metadata"]["chunk_id"]) for c in chunks if f.matches(c["metadata"])]))
+
+
+@pytest.mark.parametrize("saved", [False, True])
+@pytest.mark.parametrize("kwargs", [
+    {"doc_ids": ["A.pdf"]},
+    {"doc_ids": ["A.pdf", "missing.pdf"], "page_from": 2, "page_to": 3},
+    {"sources": ["txt"]},
+    {"sources": ["pdf"], "page_to": 1},
+    {"page_from": 5},
+    {"doc_ids": ["nope"]},
+])
+def test_select_keys_matches_python_filter(tmp_path, saved, kwargs):
+    store = ChunkStore(tmp_path / "chunks")
+    chunks = corpus()
+    for c in chunks:
+        store.append(chunk_key(c["metadata"]["chunk_id"]), c)
+    if saved:
+        store.save()
+    assert np.array_equal(store.select_keys(ChunkFilter(**kwargs)), keys_of(chunks, **kwargs))
+
+
+def test_select_keys_skips_deleted_chunks(tmp_path):
+    store = ChunkStore(tmp_path / "chunks")
+    chunks = corpus()
+    for c in chunks:
+        store.append(chunk_key(c["metadata"]["chunk_id"]), c)
+    store.save()
+    gone = chunk_key("A.pdf_p1_c0")
+    store.remove(gone)
+    assert gone not in store.select_keys(ChunkFilter(["A.pdf"]))
+    store.save()
+    assert gone not in store.select_keys(ChunkFilter(["A.pdf"]))
+
+
+@pytest.mark.parametrize("saved", [False, True])
+@pytest.mark.parametrize("exact_max", [0, 2048])  # FAISS ID selector / direct scoring
+def test_filter_matches_merged_location(make_store, saved, exact_max):
+    store = make_store(dedup_threshold=0.9, filter_exact_max=exact_max)
+    store.add([make_chunk("A.pdf", 1, 0, SHARED), make_chunk("A.pdf", 2, 0, "alpha covers budget law")])
+    store.add([make_chunk("B.pdf", 7, 0, SHARED), make_chunk("B.pdf", 8, 0, "beta covers voting rules")])
+    if saved:
+        store.save()
+    survivor = chunk_key("A.pdf_p1_c0")
+
+    query = store.embed_texts([SHARED])
+    _, keys = store.search(query, 5, chunk_filter=ChunkFilter(["B.pdf"]))
+    assert survivor in keys[0]
+    _, keys = store.search(query, 5, chunk_filter=ChunkFilter(["B.pdf"], page_from=7, page_to=7))
+    assert keys[0][0] == survivor
+    _, keys = store.search(query, 5, chunk_filter=ChunkFilter(["B.pdf"], page_from=8))
+    assert survivor not in keys[0]
+    assert survivor in [key for key, _ in store.sparse_search("constitution", 5, ChunkFilter(["B.pdf"]))]
+
+    # Once B is gone its location no longer matches
+    store.delete("B.pdf")
+    _, keys = store.search(query, 5, chunk_filter=ChunkFilter(["B.pdf"]))
+    assert (keys[0] == -1).all()
@@ -0,0 +1,90 @@
+# tests/test_hnsw.py
+import numpy as np
+import pytest
+
+from conftest import make_chunk
+from src.embeddings.chunk_store import ChunkFilter
+from src.embeddings.embed_hybrid import chunk_key
+
+TOPICS = ["apple", "bridge", "castle", "dragon", "engine", "forest", "garden", "harbor", "island", "jungle"]
+
+
+def doc(topic: str, words: str = ""):
+    name = f"{topic}.pdf"
+    return [
+        make_chunk(name, p, 0, f"{topic} {words} chapter {p} about the {topic} {topic} {topic}")
+        for p in range(1, 4)
+    ]
+
+
+def top_doc(store, text: str) -> str:
+    _, keys = store.search(store.embed_texts([text]), 1)
+    return store.get_chunk(int(keys[0][0]))["doc_id"]
+
+
+def hnsw_store(make_store):
+    store = make_store(index_type="hnsw", recall_sample=0)
+    for topic in TOPICS:
+        store.add(doc(topic))
+    store.save()
+    return store
+
+
+def test_few_deletions_stay_tombstoned(make_store):
+    store = hnsw_store(make_store)
+    store.delete("apple.pdf")
+    store.save()
+    assert store.tombstones == 3
+    assert store.index.ntotal == 30
+    assert top_doc(store, "apple apple apple") != "apple.pdf"
+
+
+def test_graph_is_compacted_past_a_fifth_tombstones(make_store):
+    store = hnsw_store(make_store)
+    for topic in TOPICS[:4]:
+        store.delete(f"{topic}.pdf")
+    # Re-uploaded with other text: the graph holds the old and the new vectors
+    store.delete("forest.pdf")
+    store.add(doc("forest", "moss lichen fern"))
+    assert store.tombstones == 15
+    store.save()
+
+    assert store.tombstones == 0
+    assert store.index.ntotal == 18
+    assert top_doc(store, "moss lichen fern forest") == "forest.pdf"
+    assert top_doc(store, "garden garden garden") == "garden.pdf"
+
+    reopened = make_store(index_type="hnsw", recall_sample=0)
+    reopened.load()
+    assert reopened.tombstones == 0
+    assert reopened.index.ntotal == 18
+    assert reopened.index_log.entries == 0
+    assert top_doc(reopened, "moss lichen fern forest") == "forest.pdf"
+
+
+@pytest.mark.parametrize("chunk_filter, filter_exact_max", [
+    (None, 0),
+    (ChunkFilter(["apple.pdf", "bridge.pdf"]), 0),  # selector inside the graph search
+    (ChunkFilter(["apple.pdf", "bridge.pdf"]), 100),  # exact search over the filter's keys
+])
+def test_upserted_chunk_is_not_found_through_its_old_vector(make_store, chunk_filter, filter_exact_max):
+    store = make_store(index_type="hnsw", recall_sample=0, filter_exact_max=filter_exact_max)
+    for topic in TOPICS:
+        store.add(doc(topic))
+    store.save()
+    store.add([make_chunk("apple.pdf", 1, 0, "violin cello viola concerto")])
+    upserted = chunk_key("apple.pdf_p1_c0")
+    assert store.tombstones == 1
+
+    old_text = store.embed_texts(["apple chapter 1 about the apple apple apple"])
+    scores, keys = store.search(old_text, 6, chunk_filter=chunk_filter)
+    hits = [(float(score), int(key)) for score, key in zip(scores[0], keys[0]) if key != -1]
+    assert len({key for _, key in hits}) == len(hits)  # no key twice
+    for score, key in hits:  # each scored by the key's current vector
+        assert score == pytest.approx(float(old_text[0] @ store.get_vectors(np.array([key]))[0]))
+    assert hits[0][1] != upserted
+
+    new_text = store.embed_texts(["violin cello viola concerto"])
+    _, keys = store.search(new_text, 1, chunk_filter=chunk_filter)
+    assert int(keys[0][0]) == upserted
+    assert store.get_chunk(upserted)["text"] == "violin cello viola concerto"
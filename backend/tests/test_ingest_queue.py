@@ -0,0 +1,128 @@
+# tests/test_ingest_queue.py
+import time
+
+import pytest
+
+from src.ingestion.jobs import IngestJob, IngestQueue, QueueFullError
+from src.utils import config
+
+
+@pytest.fixture(autouse=True)
+def inline_extraction(monkeypatch):
+    # Extract in-process and chunk by characters: no worker processes or tokenizer
+    monkeypatch.setattr(config, "EXTRACT_WORKERS", 1)
+    monkeypatch.setattr(config, "EXTRACT_FILE_TIMEOUT_SECONDS", 0)
+    monkeypatch.setattr(config, "CHUNK_MODE", "chars")
+
+
+def write_txt(tmp_path, name: str, text: str):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def prepared(queue: IngestQueue, path, doc_id: str):
+    """
+    A job taken through extraction and chunking synchronously.
+    """
+    job = IngestJob(path, doc_id, path.stat().st_size)
+    queue.jobs[job.id] = job
+    queue._prepare(job)
+    return job
+
+
+def doc_keys(store, doc_id: str) -> list:
+    return [int(k) for k in store.chunks.keys_for_doc(doc_id)]
+
+
+def test_jobs_move_through_states_to_done(tmp_path, make_store):
+    store = make_store(dedup_threshold=0.9)
+    queue = IngestQueue(store, workers=2, coalesce_wait=0.05)
+    paths = [write_txt(tmp_path, f"doc{i}.txt", f"document {i} is about topic {i} and nothing else") for i in range(3)]
+    jobs = [queue.submit(path, path.name, path.stat().st_size) for path in paths]
+
+    deadline = time.monotonic() + 10
+    while not all(job.finished for job in jobs) and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    assert [job.status for job in jobs] == ["done"] * 3
+    assert all(job.vectors_added == job.chunks == 1 for job in jobs)
+    assert queue.counts()[("done",)] == 3
+    assert store.index.ntotal == 3
+    assert store.index_path.exists()
+    queue.close()
+
+
+def test_later_upload_of_same_doc_supersedes_earlier(tmp_path, make_store):
+    store = make_store()
+    queue = IngestQueue(store)
+    first = prepared(queue, write_txt(tmp_path, "v1.txt", "first version of the report"), "report.txt")
+    second = prepared(queue, write_txt(tmp_path, "v2.txt", "second version of the report"), "report.txt")
+    assert first.status == second.status == "waiting"
+
+    queue._commit([first, second])
+    assert first.status == "superseded"
+    assert second.status == "done" and second.batch_jobs == 1
+    [key] = doc_keys(store, "report.txt")
+    assert store.get_chunk(key)["text"] == "second version of the report"
+
+
+def test_failed_extraction_marks_job_failed(tmp_path, make_store):
+    queue = IngestQueue(make_store())
+    job = prepared(queue, write_txt(tmp_path, "notes.docx", "not a supported type"), "notes.docx")
+    assert job.status == "failed"
+    assert "Unsupported file type" in job.error
+    assert queue._ready.empty()
+
+
+def test_submit_raises_when_queue_is_full(tmp_path, make_store, monkeypatch):
+    queue = IngestQueue(make_store(), max_pending=1)
+    monkeypatch.setattr(queue, "_prepare", lambda job: None)  # never finishes
+    path = write_txt(tmp_path, "a.txt", "some text")
+    queue.submit(path, "a.txt")
+    with pytest.raises(QueueFullError):
+        queue.submit(path, "b.txt")
+    queue.close()
+
+
+def test_old_version_stays_searchable_while_new_one_embeds(tmp_path, make_store, monkeypatch):
+    store = make_store(dedup_threshold=0.9)
+    queue = IngestQueue(store)
+    queue._commit([prepared(queue, write_txt(tmp_path, "v1.txt", "budget law for the year"), "law.txt")])
+    old_keys = doc_keys(store, "law.txt")
+
+    seen = []
+    embed_texts = store.embed_texts_with_failures
+
+    def watching(texts):
+        seen.append(doc_keys(store, "law.txt"))
+        return embed_texts(texts)
+
+    monkeypatch.setattr(store, "embed_texts_with_failures", watching)
+    queue._commit([prepared(queue, write_txt(tmp_path, "v2.txt", "amended budget law for next year"), "law.txt")])
+    assert seen == [old_keys]
+    assert store.get_chunk(doc_keys(store, "law.txt")[0])["text"] == "amended budget law for next year"
+
+
+def test_failed_commit_rolls_back_to_last_save(tmp_path, make_store, monkeypatch):
+    store = make_store(dedup_threshold=0.9)
+    queue = IngestQueue(store)
+    queue._commit([prepared(queue, write_txt(tmp_path, "v1.txt", "budget law for the year"), "law.txt")])
+    old_keys = doc_keys(store, "law.txt")
+
+    def broken_save():
+        raise OSError("disk full")
+
+    job = prepared(queue, write_txt(tmp_path, "v2.txt", "amended budget law for next year"), "law.txt")
+    with monkeypatch.context() as patch, pytest.raises(OSError):
+        patch.setattr(store, "save", broken_save)
+        queue._commit([job])
+
+    # Nothing half-applied: the old version is back and no dedup reservation leaked
+    assert doc_keys(store, "law.txt") == old_keys
+    assert store.index.ntotal == 1
+    assert store._awaiting == {} and store._awaiting_locations == {}
+
+    job = prepared(queue, write_txt(tmp_path, "v2.txt", "amended budget law for next year"), "law.txt")
+    queue._commit([job])
+    assert job.status == "done" and job.vectors_added == 1
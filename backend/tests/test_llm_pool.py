@@ -0,0 +1,131 @@
+# tests/test_llm_pool.py
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_server import FakeLMServer
+from src.llm.llm import LLM
+from src.llm.pool import LLMUnavailableError
+
+ANSWER = " token0 token1 token2"
+
+
+def chat_url(server: FakeLMServer) -> str:
+    return f"{server.url}/v1/chat/completions"
+
+
+def ask_async_and_close(llm: LLM) -> str:
+    # The async client belongs to the loop it was created on
+    async def run():
+        try:
+            return await llm.agenerate_answer("q")
+        finally:
+            await llm.aclose()
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def dead_url():
+    # A port nothing listens on: connection refused
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+@pytest.fixture
+def fast_server():
+    with FakeLMServer(chat_latency_ms=0, token_latency_ms=0, answer_tokens=3) as server:
+        yield server
+
+
+@pytest.fixture
+def slow_server():
+    with FakeLMServer(chat_latency_ms=400, token_latency_ms=0, answer_tokens=3) as server:
+        yield server
+
+
+def test_failover_to_a_healthy_backend(dead_url, fast_server):
+    llm = LLM(api_urls=[dead_url, chat_url(fast_server)], model_name="fake-chat", timeout=5)
+    for _ in range(4):
+        assert llm.generate_answer("q") == ANSWER
+    assert "".join(c.get("delta", "") for c in llm.stream_answer("q")) == ANSWER
+    assert ask_async_and_close(llm) == ANSWER
+
+    dead, healthy = llm.stats()["backends"]
+    assert dead["errors"] >= 1
+    assert healthy["errors"] == 0
+
+
+def test_breaker_ejects_a_failing_backend_until_cooldown(dead_url, fast_server):
+    llm = LLM(
+        api_urls=[dead_url, chat_url(fast_server)], model_name="fake-chat", timeout=5,
+        breaker_failures=2, breaker_cooldown=0.3
+    )
+    for _ in range(6):
+        llm.generate_answer("q")
+    dead = llm.pool.backends[0]
+    assert dead.state == "open"
+    assert dead.errors == 2  # not tried again while open
+
+    time.sleep(0.35)
+    for _ in range(4):
+        llm.generate_answer("q")
+    # One trial request after the cooldown, which failed and re-opened the breaker
+    assert dead.errors == 3
+    assert dead.state == "open"
+    asyncio.run(llm.aclose())
+
+
+def test_all_backends_open_raises_unavailable(dead_url):
+    llm = LLM(api_urls=[dead_url], model_name="fake-chat", timeout=5, breaker_failures=1, breaker_cooldown=60)
+    with pytest.raises(Exception):
+        llm.generate_answer("q")
+    with pytest.raises(LLMUnavailableError):
+        llm.generate_answer("q")
+    asyncio.run(llm.aclose())
+
+
+def hedged_llm(slow_server, fast_server) -> LLM:
+    llm = LLM(
+        api_urls=[chat_url(slow_server), chat_url(fast_server)], model_name="fake-chat", timeout=5,
+        hedge_percentile=95, hedge_min_samples=1
+    )
+    # Hedge after ~100 ms: well past the fast server, well before the slow one
+    llm.pool.backends[0].latencies.extend([0.1] * 50)
+    return llm
+
+
+def test_slow_completion_is_hedged_to_another_backend(slow_server, fast_server):
+    llm = hedged_llm(slow_server, fast_server)
+    for _ in range(4):
+        start = time.perf_counter()
+        assert llm.generate_answer("q") == ANSWER
+        assert time.perf_counter() - start < 0.3
+    assert llm.stats()["hedges"] >= 1
+    assert llm.stats()["hedge_wins"] >= 1
+    assert ask_async_and_close(llm) == ANSWER
+
+
+def test_concurrent_hedges_share_one_executor(slow_server, fast_server):
+    llm = hedged_llm(slow_server, fast_server)
+    executor = llm._hedge_executor
+    answers = []
+
+    def ask():
+        answers.append(llm.generate_answer("q"))
+
+    threads = [threading.Thread(target=ask) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert answers == [ANSWER] * 16
+    assert llm._hedge_executor is executor
+    hedge_threads = [t for t in threading.enumerate() if t.name.startswith("llm-hedge")]
+    assert len(hedge_threads) <= llm.max_connections
+    asyncio.run(llm.aclose())
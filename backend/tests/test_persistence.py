@@ -0,0 +1,160 @@
+# tests/test_persistence.py
+import numpy as np
+import pytest
+
+from conftest import make_chunk
+from src.embeddings import embed_hybrid, sorted_runs
+from src.embeddings.chunk_store import ChunkStore
+from src.embeddings.embed_hybrid import chunk_key
+
+
+def doc(name: str, pages: int = 3):
+    return [make_chunk(name, p, 0, f"{name} page {p} talks about subject {p} of {name}") for p in range(1, pages + 1)]
+
+
+def top_doc(store, text: str) -> str:
+    _, keys = store.search(store.embed_texts([text]), 1)
+    return store.get_chunk(int(keys[0][0]))["doc_id"]
+
+
+def test_incremental_save_appends_to_log_instead_of_rewriting_faiss(make_store):
+    store = make_store()
+    store.add(doc("a.pdf"))
+    store.save()
+    faiss_bytes = store.index_path.read_bytes()
+    faiss_hash = store.manifest["files"]["faiss"]
+
+    store.add(doc("b.pdf"))
+    store.delete("a.pdf")
+    store.save()
+    assert store.index_path.read_bytes() == faiss_bytes
+    assert store.manifest["files"]["faiss"] == faiss_hash
+    assert store.index_log.entries == 6  # 3 adds, 3 removes
+
+    reopened = make_store()
+    reopened.load()
+    assert reopened.index.ntotal == 3
+    assert top_doc(reopened, "b.pdf page 2 talks about subject 2 of b.pdf") == "b.pdf"
+    assert reopened.chunks.keys_for_doc("a.pdf") == []
+
+
+def test_long_log_is_compacted_into_the_faiss_file(make_store, monkeypatch):
+    monkeypatch.setattr(embed_hybrid, "COMPACT_MIN_ENTRIES", 4)
+    store = make_store()
+    store.add(doc("a.pdf"))
+    store.save()
+    store.add(doc("b.pdf", pages=2))
+    store.save()
+    assert store.index_log.entries == 2
+
+    store.add(doc("c.pdf", pages=3))
+    store.save()
+    assert store.index_log.entries == 0
+    reopened = make_store()
+    reopened.load()
+    assert reopened.index.ntotal == 8
+
+
+def test_read_only_store_replays_the_log(make_store):
+    writer = make_store()
+    writer.add(doc("a.pdf"))
+    writer.save()
+    writer.add(doc("b.pdf"))
+    writer.save()
+
+    reader = make_store(read_only=True)
+    reader.load()
+    assert reader.index.ntotal == 6
+    assert top_doc(reader, "b.pdf page 1 talks about subject 1 of b.pdf") == "b.pdf"
+
+
+def test_unsaved_log_entries_are_not_replayed(make_store):
+    store = make_store()
+    store.add(doc("a.pdf"))
+    store.save()
+    store.add(doc("b.pdf"))  # never saved
+
+    reopened = make_store()
+    reopened.load()
+    assert reopened.index.ntotal == 3
+
+
+def test_chunk_keys_go_to_delta_runs_and_merge(tmp_path, monkeypatch):
+    monkeypatch.setattr(sorted_runs, "DELTA_MERGE_MIN", 8)
+    store = ChunkStore(tmp_path / "chunks")
+    store.reset()
+    for batch in range(6):
+        for n in range(4):
+            chunk = make_chunk(f"d{batch}.pdf", 1, n, f"text {batch} {n}")
+            store.append(chunk_key(chunk["metadata"]["chunk_id"]), chunk)
+        store.save()
+        runs = store._key_runs.runs
+        # Never more than the merge threshold in the delta
+        assert runs["delta"] is None or runs["delta"]["length"] <= 8
+
+    # Files of replaced runs are gone
+    names = {f.name for f in store.path.iterdir() if f.name.startswith("key_run")}
+    current = {run[part] for run in store._key_runs.runs.values() if run for part in ("values", "rows")}
+    assert names == current
+
+    reopened = ChunkStore(tmp_path / "chunks")
+    reopened.open()
+    assert len(reopened) == 24
+    assert reopened.get(chunk_key("d3.pdf_p1_c2"))["text"] == "text 3 2"
+
+
+def test_deleted_and_readded_keys_resolve_to_the_new_row(tmp_path):
+    store = ChunkStore(tmp_path / "chunks")
+    store.reset()
+    chunk = make_chunk("a.pdf", 1, 0, "first")
+    key = chunk_key("a.pdf_p1_c0")
+    store.append(key, chunk)
+    store.save()
+
+    store.remove(key)
+    store.save()
+    assert store.get(key) is None
+    store.append(key, make_chunk("a.pdf", 1, 0, "second"))
+    store.save()
+
+    reopened = ChunkStore(tmp_path / "chunks")
+    reopened.open()
+    assert reopened.get(key)["text"] == "second"
+    assert [k for k, _ in reopened.items()] == [key]
+
+
+def test_interrupted_save_is_ignored(tmp_path):
+    store = ChunkStore(tmp_path / "chunks")
+    store.reset()
+    store.append(1, make_chunk("a.pdf", 1, 0, "kept"))
+    store.save()
+
+    # A save that died after appending data but before committing meta.json
+    with open(store.path / "text.bin", "ab") as f:
+        f.write(b"garbage that was never committed")
+    with open(store.path / "keys.bin", "ab") as f:
+        f.write(np.array([2], dtype="int64").tobytes())
+
+    reopened = ChunkStore(tmp_path / "chunks")
+    reopened.open()
+    assert reopened.get(1)["text"] == "kept"
+    assert reopened.get(2) is None
+    reopened.append(3, make_chunk("a.pdf", 2, 0, "next"))
+    reopened.save()
+    reopened.open()
+    assert [m["text"] for _, m in reopened.items()] == ["kept", "next"]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "sq8"])
+def test_vectors_survive_incremental_saves(make_store, index_type):
+    store = make_store(index_type=index_type, index_options={}, recall_sample=0)
+    store.add(doc("a.pdf", pages=4))
+    store.save()
+    store.add(doc("b.pdf", pages=4))
+    store.delete("a.pdf")
+    store.save()
+
+    reopened = make_store(index_type=index_type, recall_sample=0)
+    reopened.load()
+    assert reopened.index.ntotal == 4
+    assert top_doc(reopened, "b.pdf page 3 talks about subject 3 of b.pdf") == "b.pdf"
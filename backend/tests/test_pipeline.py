@@ -0,0 +1,67 @@
+# tests/test_pipeline.py
+import pytest
+
+from src.ingestion.pipeline import checkpoint_path_for, stream_build
+
+TEXTS = [
+    "broken alpha bravo charlie delta echo",
+    "foxtrot golf hotel india juliet kilo",
+    "crash lima mike november oscar papa",
+    "broken quebec romeo sierra tango uniform",
+]
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i, text in enumerate(TEXTS):
+        path = tmp_path / "docs" / f"doc{i}.txt"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(text)
+        paths.append(path)
+    return paths
+
+
+def flaky_embeddings(store, crash: bool):
+    """
+    LM Studio "fails" for texts containing 'broken'; with crash, the build
+    dies on the text containing 'crash'.
+    """
+    embed_texts = store.embed_texts_with_failures
+
+    def embed(texts):
+        if crash and any("crash" in t for t in texts):
+            raise Interrupted()
+        embeddings, _ = embed_texts(texts)
+        return embeddings, [i for i, t in enumerate(texts) if "broken" in t]
+
+    store.embed_texts_with_failures = embed
+
+
+def build(store, files, **kwargs):
+    return stream_build(store, files, batch_size=1, checkpoint_every=1, extract_workers=1, **kwargs)
+
+
+def test_resumed_build_keeps_failed_chunk_ids(make_store, files):
+    reference = make_store("reference")
+    flaky_embeddings(reference, crash=False)
+    build(reference, files)
+    assert len(reference.failed_chunk_ids) == 2
+
+    store = make_store()
+    flaky_embeddings(store, crash=True)
+    with pytest.raises(Interrupted):
+        build(store, files)
+    assert checkpoint_path_for(store).exists()
+
+    resumed = make_store()
+    flaky_embeddings(resumed, crash=False)
+    stats = build(resumed, files)
+    assert stats["resumed"]
+    assert stats["chunks"] == 4
+    assert sorted(resumed.failed_chunk_ids) == sorted(reference.failed_chunk_ids)
+    assert not checkpoint_path_for(resumed).exists()
@@ -0,0 +1,162 @@
+# tests/test_retrieval.py
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from conftest import make_chunk
+from src.embeddings import sparse_index
+from src.embeddings.sparse_index import BM25Index, tokenize
+from src.retrieval.retriever_hybrid import Retriever
+
+WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima".split()
+
+
+def brute_force_bm25(docs: dict, query: str, k1: float = 1.2, b: float = 0.75) -> dict:
+    """
+    Exhaustive Okapi BM25 over {key: text}, the reference for the MaxScore search.
+    """
+    tokens = {key: Counter(tokenize(text)) for key, text in docs.items()}
+    n = len(docs)
+    avgdl = sum(sum(c.values()) for c in tokens.values()) / n
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(1 for c in tokens.values() if term in c)
+        if not df:
+            continue
+        idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        for key, counts in tokens.items():
+            tf = counts.get(term, 0)
+            if tf:
+                norm = k1 * (1.0 - b + b * sum(counts.values()) / avgdl)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+    return scores
+
+
+def random_docs(rng, start: int, n: int) -> dict:
+    return {
+        key: " ".join(rng.choice(WORDS, size=rng.integers(3, 12)))
+        for key in range(start, start + n)
+    }
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("See Art-5 of 2016/679") == ["see", "art-5", "art", "5", "of", "2016/679", "2016", "679"]
+
+
+def test_bm25_matches_exhaustive_scoring_across_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(sparse_index, "MAX_SEGMENTS", 3)
+    rng = np.random.default_rng(0)
+    index = BM25Index(tmp_path / "bm25")
+    index.reset()
+    docs = {}
+    for batch in range(6):
+        new = random_docs(rng, batch * 20, 20)
+        for key, text in new.items():
+            index.add(key, text)
+        docs.update(new)
+        for key in rng.choice(list(docs), size=4, replace=False).tolist():
+            index.remove(key)
+            del docs[key]
+        index.save()
+        assert len(index.segment_names) <= 3
+
+    reopened = BM25Index(tmp_path / "bm25")
+    reopened.open()
+    assert len(reopened) == len(docs)
+    for query in ("alpha", "golf hotel", "kilo lima alpha bravo", "missing words"):
+        expected = brute_force_bm25(docs, query)
+        hits = reopened.search(query, 5)
+        top = sorted(expected.values(), reverse=True)[:5]
+        assert [round(score, 4) for _, score in hits] == pytest.approx([round(s, 4) for s in top], abs=1e-3)
+        for key, score in hits:
+            assert expected[key] == pytest.approx(score, rel=1e-4)
+
+
+def test_bm25_readd_replaces_and_doc_mask_restricts(tmp_path):
+    index = BM25Index(tmp_path / "bm25")
+    index.reset()
+    index.add(1, "alpha bravo")
+    index.add(2, "alpha charlie")
+    index.save()
+    index.add(1, "delta echo")
+    assert [key for key, _ in index.search("alpha", 5)] == [2]
+    assert [key for key, _ in index.search("delta", 5)] == [1]
+
+    index.add(3, "alpha alpha")
+    mask = index.doc_mask(np.array([2]))
+    assert [key for key, _ in index.search("alpha", 5, doc_mask=mask)] == [2]
+
+
+def test_bm25_top_k_matches_exhaustive_scoring_with_a_mask(tmp_path):
+    rng = np.random.default_rng(1)
+    index = BM25Index(tmp_path / "bm25")
+    index.reset()
+    docs = random_docs(rng, 0, 300)
+    for key, text in docs.items():
+        index.add(key, text)
+    index.save()
+
+    allowed = np.array(sorted(rng.choice(list(docs), size=120, replace=False).tolist()))
+    mask = index.doc_mask(allowed)
+    for query in ("alpha bravo charlie delta echo", "kilo lima", "golf golf hotel india juliet"):
+        expected = brute_force_bm25(docs, query)
+        for k, keys in ((1, list(docs)), (7, list(docs)), (7, allowed.tolist())):
+            top = sorted((expected[key] for key in keys if key in expected), reverse=True)[:k]
+            hits = index.search(query, k, doc_mask=mask if len(keys) < len(docs) else None)
+            assert [score for _, score in hits] == pytest.approx(top, rel=1e-4)
+            assert all(expected[key] == pytest.approx(score, rel=1e-4) for key, score in hits)
+
+
+@pytest.fixture
+def fused_store(make_store):
+    store = make_store()
+    chunks = [make_chunk(f"doc{i}.pdf", 1, 0, f"{WORDS[i]} {WORDS[i + 1]} general notes on the topic") for i in range(8)]
+    chunks.append(make_chunk("iso.pdf", 1, 0, "controls listed in ISO-27001 annex general notes"))
+    store.add(chunks)
+    return store
+
+
+def test_rrf_sums_reciprocal_ranks_of_both_lists(fused_store):
+    retriever = Retriever(fused_store, fusion="rrf", rrf_k=60)
+    dense = [(1, 0.9), (2, 0.8), (3, 0.7)]
+    sparse = [(3, 12.0), (4, 11.0)]
+    fused = retriever._fuse(dense, sparse, 3)
+    assert [key for key, _ in fused] == [3, 1, 2]
+    assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_weighted_fusion_normalizes_each_list(fused_store):
+    retriever = Retriever(fused_store, fusion="weighted", sparse_weight=0.5)
+    fused = dict(retriever._fuse([(1, 0.9), (2, 0.1)], [(2, 40.0), (3, 20.0)], 3))
+    assert fused == {1: pytest.approx(0.5), 2: pytest.approx(0.5), 3: pytest.approx(0.0)}
+
+
+@pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+def test_fusion_surfaces_exact_identifier_match(fused_store, fusion):
+    retriever = Retriever(fused_store, top_k=3, fusion=fusion, fusion_candidates=9)
+    results = retriever.retrieve("what does 27001 require")
+    assert results[0]["metadata"]["doc_id"] == "iso.pdf"
+
+
+def test_query_with_a_failed_lm_half_is_not_cached(fused_store, monkeypatch):
+    retriever = Retriever(fused_store)
+    lm_embed = fused_store.get_lmstudio_embeddings_with_failures
+
+    def second_fails(texts):
+        embeddings, _ = lm_embed(texts)
+        return embeddings, [1]
+
+    monkeypatch.setattr(fused_store, "get_lmstudio_embeddings_with_failures", second_fails)
+    retriever.get_hybrid_query_embeddings(["alpha notes", "bravo notes"])
+    assert retriever.embedding_cache.get("alpha notes") is not None
+    assert retriever.embedding_cache.get("bravo notes") is None
+
+
+def test_warm_up_encodes_and_searches_once(fused_store):
+    retriever = Retriever(fused_store)
+    calls = fused_store.st_model.calls
+    retriever.warm_up()
+    assert fused_store.st_model.calls == calls + 1
+    assert retriever.embedding_cache.get("warm-up") is None
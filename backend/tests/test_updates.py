@@ -0,0 +1,59 @@
+# tests/test_updates.py
+import pytest
+
+from conftest import make_chunk
+from src.embeddings.embed_hybrid import chunk_key
+
+
+def doc(name: str, words: str, pages: int = 2):
+    return [make_chunk(name, p, 0, f"{words} page {p} of {name}") for p in range(1, pages + 1)]
+
+
+def top_doc(store, text: str) -> str:
+    _, keys = store.search(store.embed_texts([text]), 1)
+    return store.get_chunk(int(keys[0][0]))["doc_id"]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_readding_a_chunk_replaces_it(make_store, index_type):
+    store = make_store(index_type=index_type, recall_sample=0)
+    store.add(doc("a.pdf", "granite basalt quartz"))
+    store.add(doc("b.pdf", "violin cello viola"))
+    store.save()
+
+    store.add([make_chunk("a.pdf", 1, 0, "marble limestone chalk page 1 of a.pdf")])
+    page1, page2 = chunk_key("a.pdf_p1_c0"), chunk_key("a.pdf_p2_c0")
+    assert len(store.chunks) == 4
+    assert store.get_chunk(page1)["text"].startswith("marble")
+    assert [key for key, _ in store.sparse_search("granite", 5)] == [page2]
+    assert top_doc(store, "marble limestone chalk") == "a.pdf"
+    _, keys = store.search(store.embed_texts(["marble limestone chalk"]), 4)
+    assert sorted(keys[0].tolist()) == sorted(store.chunks.keys().tolist())  # no stale copy
+
+    store.save()
+    reopened = make_store(index_type=index_type, recall_sample=0)
+    reopened.load()
+    assert len(reopened.chunks) == 4
+    assert reopened.get_chunk(page1)["text"].startswith("marble")
+    assert [key for key, _ in reopened.sparse_search("granite", 5)] == [page2]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_delete_removes_a_document_everywhere(make_store, index_type):
+    store = make_store(index_type=index_type, recall_sample=0)
+    store.add(doc("a.pdf", "granite basalt quartz"))
+    store.add(doc("b.pdf", "violin cello viola"))
+    store.save()
+
+    assert store.delete("a.pdf") == 2
+    assert store.delete("a.pdf") == 0
+    assert store.chunks.keys_for_doc("a.pdf") == []
+    assert store.sparse_search("granite", 5) == []
+    _, keys = store.search(store.embed_texts(["granite basalt quartz"]), 4)
+    assert {store.get_chunk(int(k))["doc_id"] for k in keys[0] if k != -1} == {"b.pdf"}
+
+    store.save()
+    reopened = make_store(index_type=index_type, recall_sample=0)
+    reopened.load()
+    assert reopened.chunks.keys_for_doc("a.pdf") == []
+    assert top_doc(reopened, "granite basalt quartz") == "b.pdf"